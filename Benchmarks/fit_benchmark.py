@@ -0,0 +1,73 @@
+"""
+Timing of the detector transfer curve fits (Measurement/Calibration) and of the
+firmware LUT compilation on synthetic data.
+
+Usage (from the project folder):
+    python -m Benchmarks.fit_benchmark
+    python -m Benchmarks.fit_benchmark --frequencies 10000 --levels 41
+    python -m Benchmarks.fit_benchmark --results results.csv
+
+The synthetic detector is the square law/linear model of the simulator with
+a 0.2 % voltage noise.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from Measurement.Calibration.detector_fit import DetectorFit, DetectorModel
+from Measurement.Calibration.lut_compiler import LutCompiler
+from Measurement.Calibration.results import load_results, detector_level, group_by_frequency
+
+
+def synthetic_run(frequencies: int, levels: int, seed: int = 1) -> tuple:
+    rng = np.random.default_rng(seed)
+    freqs = np.linspace(100e6, 6e9, frequencies)
+    level = np.linspace(-25.0, 15.0, levels)[None, :] - np.linspace(0.0, 3.0, frequencies)[:, None]
+    power, transition = 10 ** (level / 10), 10 ** (-14.0 / 10)
+    volts = 0.5 * power / np.sqrt(1 + power / transition) * (1 + rng.normal(0.0, 0.002, level.shape))
+    return freqs, level, volts
+
+
+def time_fits(freqs: np.ndarray, level: np.ndarray, volts: np.ndarray, repeats: int = 3) -> None:
+    print(f"{'model':<16}{'frequencies':>12}{'best,ms':>10}{'rms (median)':>14}{'max error':>12}")
+    for model in DetectorModel.MODELS:
+        fit = DetectorFit(model)
+        elapsed = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fit.fit(freqs, level, volts)
+            elapsed.append(time.perf_counter() - start)
+        print(f"{model:<16}{len(freqs):>12}{min(elapsed) * 1e3:>10.1f}"
+              f"{np.median(result.rms):>14.4f}{np.max(result.max_error):>12.4f}")
+
+
+def time_luts(freqs: np.ndarray, level: np.ndarray, volts: np.ndarray, bins: int = 256) -> None:
+    model = DetectorFit("PCHIP").fit(freqs, level, volts)
+    print(f"{'LUT spacing':<16}{'frequencies':>12}{'ms':>10}{'bytes':>14}{'max error,dB':>14}")
+    for spacing in ("linear", "log"):
+        start = time.perf_counter()
+        lut = LutCompiler(bins, spacing).compile(model, level, volts)
+        elapsed = time.perf_counter() - start
+        print(f"{spacing:<16}{len(freqs):>12}{elapsed * 1e3:>10.1f}{lut.nbytes:>14}{lut.report['MAX_ERROR_DB_TOTAL']:>14.4f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Detector fit timing")
+    parser.add_argument("--frequencies", type=int, default=5000)
+    parser.add_argument("--levels", type=int, default=21)
+    parser.add_argument("--results", help="results file (CSV) instead of the synthetic data")
+    args = parser.parse_args()
+
+    if args.results:
+        results = load_results(args.results)
+        run = group_by_frequency(results["FREQUENCY"], detector_level(results), results["VOLTAGE"])
+    else:
+        run = synthetic_run(args.frequencies, args.levels)
+    time_fits(*run)
+    time_luts(*run)
+
+
+if __name__ == "__main__":
+    main()
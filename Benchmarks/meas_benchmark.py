@@ -0,0 +1,274 @@
+"""
+End-to-end throughput benchmark of the measurement loop on the simulated bench.
+
+Usage (from the project folder):
+    python -m Benchmarks.meas_benchmark --profile small
+    python -m Benchmarks.meas_benchmark --profile default --time-scale 0.1 --set LIST_SWEEP=true
+    python -m Benchmarks.meas_benchmark --compare Benchmarks/results/a.json Benchmarks/results/b.json
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+
+from Instruments.Simulator.sim_bench import SimBench
+from Measurement.MeasurementModel.meas_engine import MeasurementEngine
+from Measurement.MeasurementModel.meas_model import MeasurementModel
+
+from System.logger import get_logger
+from System.tracer import tracer
+
+logger = get_logger(__name__)
+
+
+PROFILES = {
+    "small": {"RF_FREQUENCIES": [2e9, 3e9, 2], "RF_LEVELS": [-5.0, 15.0, 5]},
+    "default": {},  # Settings/meas_settings.json as it is
+    "large": {"RF_FREQUENCIES": [2e9, 3e9, 50], "RF_LEVELS": [-5.0, 15.0, 100]},
+}
+
+RESULTS_FOLDER = os.path.join("Benchmarks", "results")
+AUTORANGE_COMMAND = re.compile(r"^:?CH\d:SCA(LE?)?$")  # vertical scale writes, counted inside the autorange
+
+
+class TimedResource:
+    """VISA resource proxy accumulating the time spent in the I/O calls"""
+
+    timed_calls = ("write", "query", "query_binary_values", "read_bytes", "read_into", "read")
+
+    def __init__(self, resource: object, stats: "BenchmarkStats") -> None:
+        self._resource = resource
+        self._stats = stats
+
+    def __getattr__(self, name: str) -> object:
+        attribute = getattr(self._resource, name)
+        if name not in self.timed_calls:
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self._stats.add_io(time.perf_counter() - start)
+
+        return timed
+
+    def __setattr__(self, name: str, value: object) -> None:
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._resource, name, value)
+
+    def __repr__(self) -> str:
+        return repr(self._resource)
+
+
+class BenchmarkStats:
+    """Time accounting of the measurement thread"""
+
+    def __init__(self) -> None:
+        self.io_time = 0.0
+        self.io_calls = 0
+        self.sleep_time = 0.0
+        self.sleep_calls = 0
+        self._lock = threading.Lock()
+
+    def add_io(self, duration: float) -> None:
+        with self._lock:
+            self.io_time += duration
+            self.io_calls += 1
+
+    def add_sleep(self, duration: float) -> None:
+        with self._lock:
+            self.sleep_time += duration
+            self.sleep_calls += 1
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_benchmark(profile: str, time_scale: float = 1.0, overrides: dict | None = None, seed: int = 0) -> dict:
+    """
+    Run one measurement on the simulated bench and collect the metrics.
+
+    Parameters:
+        profile (str): Sweep profile name of PROFILES
+        time_scale (float): Real duration of one simulated second
+        overrides (dict): Measurement settings replacing the profile values
+
+    Returns:
+        dict: Benchmark result
+    """
+    bench = SimBench(dict(SimBench.load_config(), TIME_SCALE=time_scale, SEED=seed))
+    SimBench._instance = bench
+
+    stats = BenchmarkStats()
+    model = MeasurementModel()
+    model.load_settings()
+    model.gen, model.sa, model.osc = bench.create_instruments()
+    for instr in (model.gen, model.sa, model.osc):
+        instr.instr = TimedResource(instr.instr, stats)
+
+    settings = dict(model.settings, **PROFILES[profile], **(overrides or {}))
+    model._settings = settings
+    counts_before = bench.command_counts()
+
+    sleep = time.sleep
+    measurement_thread = threading.get_ident()
+
+    def scale_write_count():
+        return sum(
+            count for command, count in bench.command_counts()["MDO34"].items() if AUTORANGE_COMMAND.match(command)
+        )
+
+    # only the scale writes of the autorange, not the ones of the oscilloscope setup
+    autorange = MeasurementEngine.osc_voltage_refinement
+    scale_writes = 0
+
+    def counted_autorange(engine, osc_data):
+        nonlocal scale_writes
+        before = scale_write_count()
+        try:
+            return autorange(engine, osc_data)
+        finally:
+            scale_writes += scale_write_count() - before
+
+    def timed_sleep(seconds):
+        if threading.get_ident() != measurement_thread:
+            return sleep(seconds)
+        start = time.perf_counter()
+        sleep(seconds)
+        stats.add_sleep(time.perf_counter() - start)
+
+    time.sleep = timed_sleep
+    MeasurementEngine.osc_voltage_refinement = counted_autorange
+    try:
+        start = time.perf_counter()
+        model.start_measurement_thread()
+        duration = time.perf_counter() - start
+    finally:
+        time.sleep = sleep
+        MeasurementEngine.osc_voltage_refinement = autorange
+
+    commands = {}
+    for instrument, counts in bench.command_counts().items():
+        before = counts_before.get(instrument, {})
+        commands[instrument] = {
+            command: count - before.get(command, 0)
+            for command, count in sorted(counts.items())
+            if count - before.get(command, 0)
+        }
+    points = len(model.meas_data)
+    per_point = max(points, 1)
+    return {
+        "profile": profile,
+        "git": git_revision(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "time_scale": time_scale,
+        "overrides": overrides or {},
+        "frequencies": settings["RF_FREQUENCIES"],
+        "levels": settings["RF_LEVELS"],
+        "points": points,
+        "duration": duration,
+        "points_per_s": points / duration if duration else 0.0,
+        "sleep_time": stats.sleep_time,
+        "sleep_calls": stats.sleep_calls,
+        "io_time": stats.io_time,
+        "io_calls": stats.io_calls,
+        "other_time": duration - stats.sleep_time - stats.io_time,
+        "commands_per_point": sum(sum(c.values()) for c in commands.values()) / per_point,
+        "autorange_retries_per_point": scale_writes / per_point,
+        "command_counts": commands,
+    }
+
+
+def save_result(result: dict, path: str | None = None) -> str:
+    if path is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        path = os.path.join(RESULTS_FOLDER, f"{result['profile']}_{result['git']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=4)
+    return path
+
+
+def print_result(result: dict) -> None:
+    print(f"Profile {result['profile']} at {result['git']} (time scale {result['time_scale']})")
+    print(f"  points:            {result['points']}")
+    print(f"  duration:          {result['duration']:.2f} s")
+    print(f"  points/s:          {result['points_per_s']:.3f}")
+    print(f"  sleep:             {result['sleep_time']:.2f} s ({result['sleep_calls']} calls)")
+    print(f"  I/O:               {result['io_time']:.2f} s ({result['io_calls']} calls)")
+    print(f"  other:             {result['other_time']:.2f} s")
+    print(f"  commands/point:    {result['commands_per_point']:.1f}")
+    print(f"  autorange/point:   {result['autorange_retries_per_point']:.2f}")
+
+
+def compare_results(base_path: str, new_path: str) -> None:
+    """Print the metrics of two benchmark results side by side"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{'metric':<28}{base['git']:>12}{new['git']:>12}{'ratio':>10}")
+    for key in (
+        "points", "duration", "points_per_s", "sleep_time", "io_time", "other_time",
+        "commands_per_point", "autorange_retries_per_point",
+    ):
+        ratio = new[key] / base[key] if base[key] else float("nan")
+        print(f"{key:<28}{base[key]:>12.3f}{new[key]:>12.3f}{ratio:>10.2f}")
+
+
+def parse_overrides(items: list) -> dict:
+    overrides = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key] = value
+    return overrides
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measurement loop benchmark on the simulated bench")
+    parser.add_argument("--profile", choices=PROFILES, default="small")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="real duration of one simulated second")
+    parser.add_argument("--set", nargs="*", default=[], metavar="KEY=VALUE", help="measurement settings overrides")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default Benchmarks/results/<profile>_<git>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--log", action="store_true", help="keep the INFO logging of the measurement")
+    parser.add_argument("--trace", metavar="PATH", help="save the SCPI command trace (Chrome trace JSON)")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        return
+
+    if not args.log:
+        logging.disable(logging.INFO)
+    if args.trace:
+        tracer.enable()
+    result = run_benchmark(args.profile, args.time_scale, parse_overrides(args.set), args.seed)
+    print_result(result)
+    print(f"Saved to {save_result(result, args.output)}")
+    if args.trace:
+        tracer.disable()
+        print(tracer.format_summary())
+        print(f"Trace saved to {tracer.export_chrome(args.trace)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Startup report of the GUI: time to the first window and the import times (python -X importtime).
+
+Usage (from the project folder):
+    python -m Benchmarks.startup_report
+    python -m Benchmarks.startup_report --top 30 --output Benchmarks/results/startup.json
+    python -m Benchmarks.startup_report --compare Benchmarks/results/startup_a.json Benchmarks/results/startup_b.json
+
+The application is started with the simulated instruments (--sim) and the
+offscreen Qt platform, prints its startup milestones and exits.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from Benchmarks.meas_benchmark import RESULTS_FOLDER, git_revision
+
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+MARK_LINE = re.compile(r"^\s*([\d.]+) ms  (.+)$")
+
+
+def run_startup(runs: int = 1) -> dict:
+    """
+    Start the application with -X importtime and collect the startup metrics.
+
+    Returns:
+        dict: Report with the milestones (ms, the best of the runs) and the imports
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    best_marks, imports = None, []
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "main.py", "--sim", "--startup-report"],
+            capture_output=True, text=True, env=env, timeout=120,
+        )
+        marks = {}
+        for line in process.stdout.splitlines():
+            match = MARK_LINE.match(line)
+            if match:
+                marks[match.group(2)] = float(match.group(1))
+        if "first window" not in marks:
+            raise RuntimeError(f"The application did not report its startup:\n{process.stderr[-2000:]}")
+        if best_marks is None or marks["first window"] < best_marks["first window"]:
+            best_marks = marks
+            imports = parse_importtime(process.stderr)
+
+    return {
+        "git": git_revision(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "runs": runs,
+        "marks": best_marks,
+        "first_window": best_marks["first window"],
+        "import_total": sum(item["self"] for item in imports) / 1e3,
+        "imports": imports,
+    }
+
+
+def parse_importtime(stderr: str) -> list:
+    """Import times (us) of the -X importtime output: module, self, cumulative, depth"""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            imports.append({
+                "module": match.group(4),
+                "self": int(match.group(1)),
+                "cumulative": int(match.group(2)),
+                "depth": len(match.group(3)) // 2,
+            })
+    return imports
+
+
+def package_times(imports: list) -> dict:
+    """Self import time (ms) of every top-level package"""
+    times = defaultdict(float)
+    for item in imports:
+        times[item["module"].split(".")[0]] += item["self"] / 1e3
+    return dict(sorted(times.items(), key=lambda item: item[1], reverse=True))
+
+
+def print_report(report: dict, top: int = 20) -> None:
+    print(f"Startup at {report['git']} (best of {report['runs']})")
+    for name, elapsed in report["marks"].items():
+        print(f"  {name:<24}{elapsed:>10.1f} ms")
+    print(f"  {'imports (all threads)':<24}{report['import_total']:>10.1f} ms")
+
+    print(f"\n{'package':<40}{'self,ms':>10}")
+    for package, elapsed in list(package_times(report["imports"]).items())[:top]:
+        print(f"{package:<40}{elapsed:>10.1f}")
+
+    print(f"\n{'module (project imports)':<60}{'cumulative,ms':>14}")
+    project = ("Instruments", "Measurement", "GUI", "System", "Documentations", "main_controller")
+    modules = [item for item in report["imports"] if item["module"].split(".")[0] in project]
+    for item in sorted(modules, key=lambda item: item["cumulative"], reverse=True)[:top]:
+        print(f"{item['module']:<60}{item['cumulative'] / 1e3:>14.1f}")
+
+
+def save_report(report: dict, path: str | None = None) -> str:
+    if path is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        path = os.path.join(RESULTS_FOLDER, f"startup_{report['git']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
+    return path
+
+
+def compare_reports(base_path: str, new_path: str) -> None:
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{'metric':<28}{base['git']:>12}{new['git']:>12}{'ratio':>10}")
+    for key in ("first_window", "import_total"):
+        ratio = new[key] / base[key] if base[key] else float("nan")
+        print(f"{key:<28}{base[key]:>12.1f}{new[key]:>12.1f}{ratio:>10.2f}")
+    base_packages, new_packages = package_times(base["imports"]), package_times(new["imports"])
+    for package in list(base_packages)[:10]:
+        print(f"  {package:<26}{base_packages[package]:>12.1f}{new_packages.get(package, 0.0):>12.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GUI startup report")
+    parser.add_argument("--runs", type=int, default=3, help="number of startups, the fastest is reported")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", help="report file (default Benchmarks/results/startup_<git>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two report files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    report = run_startup(args.runs)
+    print_report(report, args.top)
+    print(f"Saved to {save_report(report, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Latency benchmark of the LAN transports: VXI-11 (TCPIP::INSTR), raw socket by the
+VISA library (TCPIP::5025::SOCKET) and raw socket by SocketResource (RAW::).
+
+Usage (from the project folder):
+    python -m Benchmarks.transport_benchmark --ip 192.168.127.100 --model MDO34
+    python -m Benchmarks.transport_benchmark --sim --model RSA5065N --count 500
+
+With --sim the instrument is the socket server of the simulated bench (no
+instrument latency) and the RAW transport is compared with the in-process
+simulated resource, i.e. the cost of the socket round trip itself.
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from Instruments.Simulator.sim_bench import SimBench
+from Instruments.Simulator.sim_socket_server import SimSocketServer
+from Instruments.socket_resource import SocketResource
+from Instruments.visacom import VisaCom
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Binary transfer of every model: setup commands, command and query_binary_values arguments
+BINARY_QUERIES = {
+    "MDO34": (["DATA:WIDTH 2", "DATA:ENCDG RPBinary"], "CURVE?", {"datatype": "H", "is_big_endian": True}),
+    "RSA5065N": (
+        [":FORMat:TRACe:DATA REAL,32", ":FORMat:BORDer NORMal"],
+        ":TRACe:DATA? TRACE1",
+        {"datatype": "f", "is_big_endian": True},
+    ),
+    "DSG830": ([], None, {}),
+}
+
+
+def time_calls(call: object, count: int) -> np.ndarray:
+    durations = np.empty(count)
+    for i in range(count):
+        start = time.perf_counter()
+        call()
+        durations[i] = time.perf_counter() - start
+    return durations
+
+
+def benchmark_resource(resource: object, model: str, count: int) -> dict:
+    """
+    Query latency (*IDN?) and binary transfer rate of one open session.
+
+    Returns:
+        dict: {metric: value}, durations in s
+    """
+    resource.query("*IDN?")  # warm-up
+    latency = time_calls(lambda: resource.query("*IDN?"), count)
+    result = {
+        "query_mean": float(latency.mean()),
+        "query_p50": float(np.percentile(latency, 50)),
+        "query_p90": float(np.percentile(latency, 90)),
+    }
+
+    setup, command, kwargs = BINARY_QUERIES[model]
+    if command is not None:
+        for setup_command in setup:
+            resource.write(setup_command)
+        size = resource.query_binary_values(command, container=np.ndarray, **kwargs).nbytes
+        binary = time_calls(lambda: resource.query_binary_values(command, container=np.ndarray, **kwargs), max(count // 10, 1))
+        result.update({
+            "binary_bytes": size,
+            "binary_mean": float(binary.mean()),
+            "binary_rate": size / float(binary.mean()),
+        })
+    return result
+
+
+def run_hardware(ip: str, model: str, transports: list, count: int) -> dict:
+    results = {}
+    for transport in transports:
+        visa_string = VisaCom.get_visa_string_ip(ip, transport)
+        try:
+            resource, _ = VisaCom.get_visa_resource(visa_string)
+        except Exception as e:
+            logger.error(f"{transport}: failed to open {visa_string}: {e}")
+            continue
+        if resource is None:
+            continue
+        try:
+            results[transport] = benchmark_resource(resource, model, count)
+        finally:
+            resource.close()
+    return results
+
+
+def run_simulated(model: str, count: int, time_scale: float) -> dict:
+    bench = SimBench(dict(SimBench.load_config(), TIME_SCALE=time_scale))
+    results = {"IN-PROCESS": benchmark_resource(bench.open_resource(SimBench.visa_string(model)), model, count)}
+    with SimSocketServer(bench, model) as server:
+        resource = SocketResource(server.host, server.port)
+        try:
+            results["RAW"] = benchmark_resource(resource, model, count)
+        finally:
+            resource.close()
+    return results
+
+
+def print_results(results: dict) -> None:
+    print(f"{'transport':<12}{'query mean,ms':>15}{'p50,ms':>10}{'p90,ms':>10}{'binary,ms':>12}{'MB/s':>10}")
+    for transport, result in results.items():
+        binary = f"{result['binary_mean'] * 1e3:>12.2f}{result['binary_rate'] / 1e6:>10.1f}" if "binary_mean" in result else ""
+        print(
+            f"{transport:<12}{result['query_mean'] * 1e3:>15.3f}{result['query_p50'] * 1e3:>10.3f}"
+            f"{result['query_p90'] * 1e3:>10.3f}{binary}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SCPI transport latency benchmark")
+    parser.add_argument("--ip", help="instrument IP address")
+    parser.add_argument("--sim", action="store_true", help="socket server of the simulated bench instead of an instrument")
+    parser.add_argument("--model", choices=BINARY_QUERIES, default="MDO34")
+    parser.add_argument("--transports", nargs="*", choices=VisaCom.transports, default=list(VisaCom.transports))
+    parser.add_argument("--count", type=int, default=200, help="number of queries")
+    parser.add_argument("--time-scale", type=float, default=1e-6, help="simulated bench time scale (--sim)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.sim:
+        results = run_simulated(args.model, args.count, args.time_scale)
+    elif args.ip:
+        results = run_hardware(args.ip, args.model, args.transports, args.count)
+    else:
+        parser.error("--ip or --sim is required")
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
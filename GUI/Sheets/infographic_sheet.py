@@ -9,10 +9,6 @@ from PyQt6.QtCore import QMutex
 
 from GUI.palette import *
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.animation import FuncAnimation
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
 from PyQt6.QtWidgets import  QGroupBox
 
@@ -24,6 +20,8 @@ logger = get_logger(__name__)
 
 class InfographicSheet(Sheet):
 
+    plot_delay = 200  # ms after the window creation
+
     def __init__(self, main_layout):
         super().__init__(main_layout)
         
@@ -62,25 +60,50 @@ class InfographicSheet(Sheet):
         plot_container2.setLayout(plot_layout2)
         # Set geometry to ensure visibility
         plot_container2.setGeometry(QtCore.QRect(self.x_col[self.zero_col] + 350 + dx, 20, 380, 200))
-        self.figure2 = PlotFigure(plot_layout2)
-        self.figure2.ax.set_xlabel('SA input, dBm', fontsize=8)
+        self.figure2 = PlotFigure(plot_layout2, xlabel='SA input, dBm')
 
+        # matplotlib is loaded after the window is shown (and imported by the startup warm-up meanwhile)
+        QtCore.QTimer.singleShot(self.plot_delay, self.figure1.create)
+        QtCore.QTimer.singleShot(self.plot_delay, self.figure2.create)
 
-# Qt5Agg for PyQt6
-matplotlib.use('Qt5Agg')  # TODO: check without this
 
 class PlotFigure():
-    def __init__(self, layout):
+    """
+    Plot of the measured points
+
+    The matplotlib figure and canvas are created by create() (on the first
+    data or after the window is shown), the axis limits set before are kept.
+    """
+
+    def __init__(self, layout, xlabel='Gen output, dBm'):
         self.layout = layout
+        self.xlabel = xlabel
         self.meas_data = []
-   
-        self.figure, self.ax = plt.subplots()
+        self.figure = None
+        self.ax = None
+        self.canvas = None
+        self._xlim = None
+
+        self.max_points = 300  
+        self.x, self.y = [], []
+
+    def is_created(self):
+        return self.figure is not None
+
+    def create(self):
+        if self.is_created():
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+
+        self.figure = Figure()
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvas(self.figure)
         self.canvas.setStyleSheet("background-color: transparent; border: none;")
         self.layout.addWidget(self.canvas)
         
         self.figure.subplots_adjust(left=0.2, right=0.95, bottom=0.25, top=0.95)
-        self.ax.set_xlabel('Gen output, dBm', fontsize=8)
+        self.ax.set_xlabel(self.xlabel, fontsize=8)
         self.ax.set_ylabel('Voltage, mV', fontsize=8)
         self.figure.patch.set_alpha(0)
         self.ax.patch.set_alpha(0)
@@ -103,14 +126,23 @@ class PlotFigure():
         self.ax.spines['right'].set_color(BLUE)
         
 
-        self.max_points = 300  
-        self.x, self.y = [], []
-  
-        # Initialize with empty data
-        self.line, = self.ax.plot([], [], '-', color=YELLOW, linewidth=2)
-        
+        if self._xlim is not None:
+            self.ax.set_xlim(*self._xlim)
+
+        # Initialize with the data received before
+        self.line, = self.ax.plot(self.x, self.y, '-', color=YELLOW, linewidth=2)
+
+    def set_xlim(self, left, right):
+        self._xlim = (left, right)
+        if self.is_created():
+            self.ax.set_xlim(left, right)
+
+    def draw_idle(self):
+        if self.is_created():
+            self.canvas.draw_idle()
 
     def add_point(self, x, y, autoscale=False):
+        self.create()
         self.x = np.append(self.x, x)
         self.y = np.append(self.y, y)
         self.line.set_data(self.x, self.y)
@@ -122,6 +154,7 @@ class PlotFigure():
         self.canvas.draw_idle()
     
     def plot_line(self, x, y, autoscale=False):
+        self.create()
         self.x = np.asarray(x)
         self.y = np.asarray(y)
         self.line.set_data(self.x, self.y)
@@ -135,5 +168,7 @@ class PlotFigure():
     def clear_plot(self):
         self.x = []
         self.y = []
+        if not self.is_created():
+            return
         self.line.set_data(self.x, self.y)
         self.canvas.draw_idle()
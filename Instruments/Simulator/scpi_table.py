@@ -0,0 +1,89 @@
+import re
+
+
+class ScpiCommandTable:
+    """
+    Table of SCPI command headers of a simulated instrument.
+
+    Patterns are written in the canonical SCPI form: the upper case part of
+    a mnemonic is the short form (e.g. 'FREQuency' accepts FREQ..FREQUENCY),
+    optional nodes are in square brackets (e.g. '[:SENSe]:FREQuency:CENTer')
+    and a numeric suffix is marked by '<n>' (e.g. 'CH<n>:SCAle', 'MARKer<n>:X').
+    """
+
+    _optional = re.compile(r"\[([^\[\]]+)\]")
+    _suffix = re.compile(r"^(.*?)(\d+)$")
+
+    def __init__(self) -> None:
+        self._entries = []  # (tokens, value)
+
+    def add(self, pattern: str, value: object) -> None:
+        """
+        Register a command pattern.
+
+        Parameters:
+            pattern (str): Canonical command header (without '?')
+            value (object): Handler or value returned for the matching headers
+        """
+        for variant in self._expand(pattern):
+            tokens = [self._compile_token(token) for token in variant.strip(":").split(":")]
+            self._entries.append((tokens, value))
+
+    def match(self, header: str) -> tuple | None:
+        """
+        Find the registered value of a command header.
+
+        Parameters:
+            header (str): Command header as sent to the instrument, without '?'
+
+        Returns:
+            tuple: (value, suffixes) where suffixes are the numeric suffixes
+            of the '<n>' tokens, or None if the header is unknown.
+        """
+        header_tokens = header.strip(":").upper().split(":")
+        for tokens, value in self._entries:
+            if len(tokens) != len(header_tokens):
+                continue
+            suffixes = []
+            for (short, full, has_suffix), token in zip(tokens, header_tokens):
+                suffix = self._suffix.match(token)
+                if has_suffix:
+                    if suffix:
+                        token = suffix.group(1)
+                        suffixes.append(int(suffix.group(2)))
+                    else:
+                        suffixes.append(1)
+                if not (full.startswith(token) and token.startswith(short)):
+                    break
+            else:
+                return value, suffixes
+        return None
+
+    @classmethod
+    def _expand(cls, pattern: str) -> list:
+        optional = cls._optional.search(pattern)
+        if optional is None:
+            return [pattern]
+        with_node = pattern[: optional.start()] + optional.group(1) + pattern[optional.end():]
+        without_node = pattern[: optional.start()] + pattern[optional.end():]
+        return cls._expand(with_node) + cls._expand(without_node)
+
+    @staticmethod
+    def _compile_token(token: str) -> tuple:
+        has_suffix = token.endswith("<n>")
+        if has_suffix:
+            token = token[:-3]
+        short = "".join(char for char in token if not char.islower())
+        return short, token.upper(), has_suffix
+
+    @staticmethod
+    def split(command: str) -> tuple:
+        """
+        Split a command into the header, the arguments and the query flag.
+
+        Returns:
+            tuple: (header, args, is_query)
+        """
+        header, _, args = command.strip().partition(" ")
+        is_query = header.endswith("?")
+        return header.rstrip("?"), args.strip(), is_query
@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from Instruments.Simulator.sim_dsg830 import SimDSG830
+from Instruments.Simulator.sim_rsa5065n import SimRSA5065N
+from Instruments.Simulator.sim_mdo34 import SimMDO34
+from Instruments.Simulator.sim_resource import SimResource
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+_sleep = time.sleep  # not affected by patching time.sleep (e.g. benchmark sleep accounting)
+
+
+class SimBench:
+    """
+    Simulated calibration bench: DSG830 generator, RSA5065N spectrum analyzer and
+    MDO34 oscilloscope connected by the generator-SA and generator-detector lines.
+    S21_GEN_DET_CHANNELS gives the lines of the detectors on the other outputs
+    of a splitter by the oscilloscope channel, e.g. {"2": {"LOSS": 4.5}}.
+
+    The bench runs in a simulated time: time_scale is the real duration of one
+    simulated second (1.0 - real time, 0.1 - ten times faster). The instrument
+    latencies, sweep and record durations are simulated durations.
+    The instruments are opened by the VISA strings SIM::DSG830, SIM::RSA5065N
+    and SIM::MDO34.
+    """
+
+    PREFIX = "SIM::"
+    settings_folder = "Settings"
+    config_file = "sim_bench.json"
+    s21_folder = "S21files"
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, config: dict | None = None) -> None:
+        self.config = self.load_config() if config is None else config
+        self.time_scale = max(float(self.config.get("TIME_SCALE", 1.0)), 1e-6)
+        self.rng = np.random.default_rng(self.config.get("SEED"))
+        self._t0 = time.monotonic()
+
+        self.s21_gen_sa = self.load_s21(self.config.get("S21_GEN_SA", {}))
+        self.s21_gen_det = self.load_s21(self.config.get("S21_GEN_DET", {}))
+        self.s21_gen_det_channels = {
+            int(channel): self.load_s21(line) for channel, line in self.config.get("S21_GEN_DET_CHANNELS", {}).items()
+        }
+        self.detector = self.config.get("DETECTOR", {})
+
+        self.gen = SimDSG830(self, self.config.get("DSG830", {}))
+        self.sa = SimRSA5065N(self, self.config.get("RSA5065N", {}))
+        self.osc = SimMDO34(self, self.config.get("MDO34", {}))
+        self.devices = {"DSG830": self.gen, "RSA5065N": self.sa, "MDO34": self.osc}
+
+    @classmethod
+    def instance(cls) -> "SimBench":
+        """The bench shared by all simulated resources of the process"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def load_config(cls) -> dict:
+        path = os.path.join(cls.settings_folder, cls.config_file)
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to load simulator settings from {path}: {e}")
+            return {}
+
+    @classmethod
+    def is_sim_string(cls, visa_string: str) -> bool:
+        return isinstance(visa_string, str) and visa_string.startswith(cls.PREFIX)
+
+    @classmethod
+    def visa_string(cls, model: str) -> str:
+        return f"{cls.PREFIX}{model}"
+
+    # Simulated time
+    def now(self) -> float:
+        return (time.monotonic() - self._t0) / self.time_scale
+
+    def delay(self, duration: float) -> None:
+        """Wait for a duration of the simulated time"""
+        if duration > 0:
+            _sleep(duration * self.time_scale)
+
+    def wait_until(self, moment: float) -> None:
+        self.delay(moment - self.now())
+
+    # Lines and detector
+    def load_s21(self, line: dict) -> tuple:
+        """
+        S21 of a line as (frequency, magnitude_db) arrays.
+
+        The line is read from the .trs or .s2p file FILE of the S21 folder, or modelled
+        by LOSS (dB) and SLOPE (dB/GHz) if no file is given or it cannot be read.
+        """
+        filename = line.get("FILE")
+        if filename:
+            try:
+                from Instruments.touchstone import s21_parser
+
+                data = s21_parser(os.path.join(self.s21_folder, filename)).parse_file()
+                return np.asarray(data["FREQUENCY"], dtype=float), np.asarray(data["MAGNITUDE_DB"], dtype=float)
+            except Exception as e:
+                logger.warning(f"Simulator: failed to load S21 file {filename}: {e}")
+        frequency = np.array([0.0, 10e9])
+        loss = -abs(line.get("LOSS", 0.0)) - abs(line.get("SLOPE", 0.0)) * frequency / 1e9
+        return frequency, loss
+
+    def sa_power(self, frequency: float, level: float) -> float:
+        """Power at the spectrum analyzer input in dBm"""
+        return level + np.interp(frequency, *self.s21_gen_sa)
+
+    def detector_power(self, frequency: np.ndarray, level: np.ndarray, channel: int = None) -> np.ndarray:
+        """Power at the detector input of the channel in dBm"""
+        return level + np.interp(frequency, *self.s21_gen_det_channels.get(channel, self.s21_gen_det))
+
+    def detector_voltage(self, channel: int, frequency: np.ndarray, level: np.ndarray, rf_on: np.ndarray) -> np.ndarray:
+        """
+        Settled detector voltage on the oscilloscope channel.
+
+        The detector is square law (V = k * P) at low power and linear
+        (V = k * sqrt(P * Pt)) above the transition power Pt:
+        MODEL SQUARE_LINEAR: V = k * P / sqrt(1 + P / Pt), SQUARE_LAW, LINEAR.
+        """
+        frequency, level, rf_on = np.broadcast_arrays(frequency, level, rf_on)
+        if channel not in self.detector.get("CHANNELS", [1, 2, 3, 4]):
+            return np.zeros(frequency.shape)
+
+        power = np.where(rf_on, 10 ** (self.detector_power(frequency, level, channel) / 10), 0.0)  # mW
+        sensitivity = self.detector.get("SENSITIVITY", 0.5)  # V/mW
+        transition = 10 ** (self.detector.get("TRANSITION_LEVEL", -14.0) / 10)  # mW
+        model = self.detector.get("MODEL", "SQUARE_LINEAR")
+        if model == "SQUARE_LAW":
+            volts = sensitivity * power
+        elif model == "LINEAR":
+            volts = sensitivity * np.sqrt(power * transition)
+        else:
+            volts = sensitivity * power / np.sqrt(1 + power / transition)
+
+        saturation = self.detector.get("SATURATION")
+        if saturation:
+            volts = saturation * np.tanh(volts / saturation)
+        return volts + self.detector.get("OFFSET", 0.0)
+
+    def detector_time_constant(self) -> float:
+        return self.detector.get("TIME_CONSTANT", 0.0)
+
+    # Resources
+    def open_resource(self, visa_string: str) -> SimResource:
+        model = visa_string[len(self.PREFIX):].split("::")[0]
+        if model not in self.devices:
+            raise ValueError(f"Unknown simulated instrument: {visa_string}")
+        logger.info(f"Simulator: open {visa_string}")
+        return SimResource(self, self.devices[model], visa_string)
+
+    def command_counts(self) -> dict:
+        """Number of executed commands by instrument and command header"""
+        return {model: dict(device.command_counts) for model, device in self.devices.items()}
+
+    def create_instruments(self) -> tuple:
+        """
+        Create the drivers of the simulated instruments, connected synchronously.
+
+        Returns:
+            tuple: (gen, sa, osc) as DSG830, RSA5065N and MDO34 objects
+        """
+        from Instruments.dsg830 import DSG830
+        from Instruments.rsa5065n import RSA5065N
+        from Instruments.mdo34 import MDO34
+
+        instruments = []
+        for driver, model in ((DSG830, "DSG830"), (RSA5065N, "RSA5065N"), (MDO34, "MDO34")):
+            instr = driver(self.visa_string(model))
+            instr.instr = self.open_resource(instr.ip)
+            instr.initialized = True
+            instr.get_model()
+            instruments.append(instr)
+        return tuple(instruments)
@@ -0,0 +1,231 @@
+import threading
+import numpy as np
+
+from Instruments.Simulator.sim_instrument import SimInstrument
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SimDSG830(SimInstrument):
+    """
+    Simulated Rigol DSG830 RF generator.
+
+    Every change of the output (frequency, level, RF on/off, list sweep step)
+    is recorded in a timeline of events in the simulated time, so the
+    detector and the spectrum analyzer see the output of any moment.
+    A running AUTO list sweep is recorded in advance with its dwell time.
+    """
+
+    idn = "Rigol Technologies,DSG830,DSG8SIM000001,00.01.00"
+    max_events = 4096
+    min_level = -110.0
+    max_level = 20.0
+
+    def __init__(self, bench: object, config: dict) -> None:
+        self._lock = threading.Lock()
+        super().__init__(bench, config)
+
+        self.add(":SYSTem:PRESet:TYPE", lambda args, query, n: None)
+        self.add("[:SOURce]:FREQuency", self.frequency_handler)
+        self.add("[:SOURce]:LEVel", self.level_handler)
+        self.add(":OUTPut[:STATe]", self.output_handler)
+        self.add("[:SOURce]:MODulation:STATe", lambda args, query, n: "0" if query else None)
+        self.add(":SWEep:STATe", self.sweep_state_handler)
+        self.add(":SWEep:TYPE", self.setting("sweep_type", str.upper))
+        self.add(":SWEep:MODE", self.setting("sweep_mode", str.upper))
+        self.add(":SWEep:POINt:TRIGger:TYPE", self.setting("point_trigger", str.upper))
+        self.add(":SWEep:SWEep:TRIGger:TYPE", self.setting("sweep_trigger", str.upper))
+        self.add(":SWEep:LIST:DELete:ALL", self.list_delete_handler)
+        self.add(":SWEep:LIST:FREQuency", self.list_frequency_handler)
+        self.add(":SWEep:LIST:LEVel", self.list_level_handler)
+        self.add(":SWEep:LIST:DWELl", self.setting("list_dwell"))
+        self.add(":SWEep:LIST:CPOint", self.current_point_handler)
+        self.add(":SWEep:EXECute", self.execute_handler)
+        self.add(":SWEep:POINt:TRIGger", self.point_trigger_handler)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.frequency = 1e9
+            self.level = self.min_level
+            self.rf_on = False
+            self.sweep_state = "OFF"
+            self.sweep_type = "LIST"
+            self.sweep_mode = "CONT"
+            self.point_trigger = "AUTO"
+            self.sweep_trigger = "AUTO"
+            self.list_frequencies = np.array([])
+            self.list_levels = np.array([])
+            self.list_dwell = 0.01
+            self._sweep_start = None  # (time, row) of the running list sweep
+            self._times = []
+            self._outputs = []  # (frequency, level, rf_on)
+            self._point_triggers = []  # times of the list steps (trigger output)
+        self._update_output()
+
+    # Timeline of the output
+    def _update_output(self, rows: list | None = None) -> None:
+        """
+        Record the output from the current time.
+
+        Parameters:
+            rows (list): Future outputs [(time, frequency, level)] of a running list sweep
+        """
+        settling = self.config.get("SETTLING_TIME", 0.0)
+        now = self.bench.now() + settling
+        with self._lock:
+            index = np.searchsorted(self._times, now, side="right")
+            del self._times[index:], self._outputs[index:]
+            triggers = np.searchsorted(self._point_triggers, now - settling, side="right")
+            del self._point_triggers[triggers:]
+
+            if rows is None:
+                self._times.append(now)
+                self._outputs.append(self._cw_output())
+            else:
+                for time, frequency, level in rows:
+                    self._times.append(max(time + settling, now))
+                    self._outputs.append((frequency, level, self.rf_on))
+                    self._point_triggers.append(max(time, now - settling))
+
+            if len(self._times) > self.max_events:
+                del self._times[: -self.max_events], self._outputs[: -self.max_events]
+                del self._point_triggers[: -self.max_events]
+
+    def _cw_output(self) -> tuple:
+        return self.frequency, self.level, self.rf_on
+
+    def output_at(self, times: np.ndarray) -> tuple:
+        """
+        Output of the generator at the simulated times.
+
+        Returns:
+            tuple: (frequency, level, rf_on) arrays of the times
+        """
+        with self._lock:
+            event_times = np.array(self._times)
+            outputs = np.array(self._outputs, dtype=float).reshape(-1, 3)
+        index = np.clip(np.searchsorted(event_times, times, side="right") - 1, 0, None)
+        frequency, level, rf_on = outputs[index].T
+        return frequency, level, rf_on.astype(bool)
+
+    def events(self, start: float, stop: float) -> tuple:
+        """
+        Output changes in the time interval (start, stop] with the output before start.
+
+        Returns:
+            tuple: (times, frequency, level, rf_on) arrays, the first item is the
+            output at the time start
+        """
+        with self._lock:
+            event_times = np.array(self._times)
+            outputs = np.array(self._outputs, dtype=float).reshape(-1, 3)
+        first = max(np.searchsorted(event_times, start, side="right") - 1, 0)
+        last = np.searchsorted(event_times, stop, side="right")
+        times = np.concatenate(([start], event_times[first + 1 : last]))
+        frequency, level, rf_on = outputs[first:last].T
+        return times, frequency, level, rf_on.astype(bool)
+
+    def point_triggers(self, start: float, stop: float) -> list:
+        """Times of the list sweep steps in the interval (start, stop]"""
+        with self._lock:
+            return [t for t in self._point_triggers if start < t <= stop]
+
+    def current_output(self) -> tuple:
+        frequency, level, rf_on = self.output_at(np.array([self.bench.now()]))
+        return frequency[0], level[0], rf_on[0]
+
+    # List sweep
+    def _sweep_row(self) -> int:
+        """Current row of the running list sweep"""
+        if self._sweep_start is None:
+            return 0
+        start, row = self._sweep_start
+        if self.point_trigger == "AUTO" and self.list_dwell > 0:
+            row += int((self.bench.now() - start) / self.list_dwell)
+        points = len(self.list_frequencies)
+        if self.sweep_mode.startswith("CONT"):
+            return row % points
+        return min(row, points - 1)
+
+    def _list_rows(self, start: float, first_row: int) -> list:
+        points = min(len(self.list_frequencies), len(self.list_levels))
+        if self.point_trigger != "AUTO":
+            return [(start, self.list_frequencies[first_row], self.list_levels[first_row])]
+        rows = range(first_row, points)
+        if self.sweep_mode.startswith("CONT"):
+            repeats = max(self.max_events // max(points, 1), 1)
+            rows = [row % points for row in range(first_row, first_row + points * repeats)]
+        return [
+            (start + i * self.list_dwell, self.list_frequencies[row], self.list_levels[row])
+            for i, row in enumerate(rows)
+        ]
+
+    # Handlers
+    def frequency_handler(self, args, query, suffixes):
+        if query:
+            return f"{self.current_output()[0]:.1f}"
+        self.frequency = self.to_float(args)
+        if self._sweep_start is None:
+            self._update_output()
+
+    def level_handler(self, args, query, suffixes):
+        if query:
+            return f"{self.current_output()[1]:.2f}"
+        self.level = float(np.clip(self.to_float(args), self.min_level, self.max_level))
+        if self._sweep_start is None:
+            self._update_output()
+
+    def output_handler(self, args, query, suffixes):
+        if query:
+            return "1" if self.rf_on else "0"
+        self.rf_on = self.to_bool(args)
+        if self._sweep_start is None:
+            self._update_output()
+        else:
+            self._sweep_start = (self.bench.now(), self._sweep_row())
+            self._update_output(self._list_rows(*self._sweep_start))
+
+    def sweep_state_handler(self, args, query, suffixes):
+        if query:
+            return self.sweep_state
+        self.sweep_state = args.upper()
+        if self.sweep_state == "OFF" and self._sweep_start is not None:
+            self._sweep_start = None
+            self._update_output()
+
+    def list_delete_handler(self, args, query, suffixes):
+        self.list_frequencies = np.array([])
+        self.list_levels = np.array([])
+
+    def list_frequency_handler(self, args, query, suffixes):
+        if query:
+            return ",".join(f"{f:.0f}" for f in self.list_frequencies)
+        self.list_frequencies = self.to_list(args)
+
+    def list_level_handler(self, args, query, suffixes):
+        if query:
+            return ",".join(f"{l:.2f}" for l in self.list_levels)
+        self.list_levels = np.clip(self.to_list(args), self.min_level, self.max_level)
+
+    def current_point_handler(self, args, query, suffixes):
+        return str(self._sweep_row() + 1)
+
+    def execute_handler(self, args, query, suffixes):
+        if self.sweep_state == "OFF" or not len(self.list_frequencies):
+            logger.warning("SimDSG830: list sweep executed without list or sweep state")
+            return
+        self._sweep_start = (self.bench.now(), 0)
+        self._update_output(self._list_rows(*self._sweep_start))
+
+    def point_trigger_handler(self, args, query, suffixes):
+        if self._sweep_start is None:
+            return
+        row = self._sweep_row() + 1
+        if row >= len(self.list_frequencies):
+            if not self.sweep_mode.startswith("CONT"):
+                return
+            row = 0
+        self._sweep_start = (self.bench.now(), row)
+        self._update_output(self._list_rows(*self._sweep_start))
@@ -0,0 +1,108 @@
+import re
+import numpy as np
+
+from Instruments.Simulator.scpi_table import ScpiCommandTable
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class UnknownCommand(Exception):
+    """The command header is not supported by the simulated instrument"""
+
+
+class SimInstrument:
+    """
+    Base class of a simulated SCPI instrument.
+
+    A subclass registers the handlers of its command subset in the command table.
+    A handler is called as handler(args, is_query, suffixes) and returns the
+    response of a query: str for ASCII responses and bytes for binary blocks.
+    """
+
+    idn = "Simulator,SIM,SIM000000,00.00.00"
+
+    def __init__(self, bench: object, config: dict) -> None:
+        self.bench = bench
+        self.config = config
+        self.commands = ScpiCommandTable()
+        self.latencies = ScpiCommandTable()
+        for pattern, latency in config.get("COMMAND_LATENCY", {}).items():
+            self.latencies.add(pattern, float(latency))
+        self.command_counts = {}
+        self.add("*IDN", lambda args, query, n: self.idn)
+        self.add("*RST", lambda args, query, n: self.reset())
+        self.add("*OPC", lambda args, query, n: "1")
+        self.add("*CLS", lambda args, query, n: None)
+        self.reset()
+
+    def add(self, pattern: str, handler: object) -> None:
+        self.commands.add(pattern, handler)
+
+    def reset(self) -> None:
+        """Set the instrument state to the default values"""
+        pass
+
+    def execute(self, command: str) -> str | bytes | None:
+        """
+        Execute one SCPI command.
+
+        Returns:
+            str | bytes | None: Response of a query, None for a command
+
+        Raises:
+            UnknownCommand: If the command header is not supported.
+        """
+        header, args, is_query = ScpiCommandTable.split(command)
+        found = self.commands.match(header)
+        if found is None:
+            raise UnknownCommand(command)
+        handler, suffixes = found
+        key = f"{header.upper()}{'?' if is_query else ''}"
+        self.command_counts[key] = self.command_counts.get(key, 0) + 1
+        return handler(args, is_query, suffixes)
+
+    def latency(self, command: str, is_query: bool) -> float:
+        """Latency of the command in seconds of the simulated time"""
+        header, _, _ = ScpiCommandTable.split(command)
+        found = self.latencies.match(header)
+        if found is not None:
+            return found[0]
+        return self.config.get("QUERY_LATENCY" if is_query else "WRITE_LATENCY", 0.0)
+
+    def transfer_time(self, size: int) -> float:
+        """Duration of a binary transfer of size bytes in seconds of the simulated time"""
+        rate = self.config.get("TRANSFER_RATE", 0)
+        return size / rate if rate else 0.0
+
+    # Argument helpers
+    @staticmethod
+    def to_float(args: str) -> float:
+        """Numeric argument with an optional unit suffix, e.g. '15.0dBm'"""
+        number = re.match(r"\s*([-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?)", args)
+        if number is None:
+            raise ValueError(f"Invalid numeric argument: {args}")
+        return float(number.group(1))
+
+    @staticmethod
+    def to_bool(args: str) -> bool:
+        return args.strip().upper() in ("ON", "1", "RUN")
+
+    @staticmethod
+    def to_list(args: str) -> np.ndarray:
+        return np.array([SimInstrument.to_float(value) for value in args.split(",")], dtype=float)
+
+    @staticmethod
+    def block(data: bytes) -> bytes:
+        """IEEE 488.2 definite length block"""
+        length = str(len(data))
+        return f"#{len(length)}{length}".encode() + data
+
+    def setting(self, attribute: str, convert: object = float, formatter: object = str) -> object:
+        """Handler for a simple setting stored in an attribute"""
+        def handler(args, query, suffixes):
+            if query:
+                return formatter(getattr(self, attribute))
+            setattr(self, attribute, convert(args))
+        return handler
@@ -0,0 +1,321 @@
+import threading
+import numpy as np
+
+from Instruments.Simulator.sim_instrument import SimInstrument
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SimMDO34(SimInstrument):
+    """
+    Simulated Tektronix MDO34 oscilloscope.
+
+    The channels connected to the detector show the detector voltage of the
+    generator output with exponential settling and the channel noise. A record
+    is acquired around its trigger: a forced trigger, the edge of a channel
+    or the generator list steps on the AUX input. Single sequence, FastFrame
+    (one frame per trigger) and free running acquisition with CURVESTREAM?
+    are simulated. With several data sources (DATA:SOURCE CH1,CH2) CURVE?
+    returns one block per source separated by ';', the WFMOUTPRE preamble
+    describes the first source.
+    """
+
+    idn = "TEKTRONIX,MDO34,C0SIM01,CF:91.1CT FV:1.0"
+    channels = (1, 2, 3, 4)
+    divisions = 10
+
+    def __init__(self, bench: object, config: dict) -> None:
+        self._lock = threading.RLock()
+        super().__init__(bench, config)
+
+        self.add("SELect", self.select_handler)
+        self.add("SELect:CONTROl", lambda args, query, n: f"CH{self.control}")
+        self.add("SELect:CH<n>", self.select_channel_handler)
+        self.add("CH<n>", self.channel_handler)
+        self.add("CH<n>:COUPling", self.channel_setting("coupling", str.upper))
+        self.add("CH<n>:SCAle", self.channel_setting("scale", self.to_float))
+        self.add("CH<n>:OFFSet", self.channel_setting("offset", self.to_float))
+        self.add("CH<n>:BANdwidth", self.channel_setting("bandwidth", str.upper))
+        self.add("CH<n>:TERmination", self.termination_handler)
+        self.add("HORizontal:SCAle", self.setting("hor_scale"))
+        self.add("HORizontal:POSition", self.setting("hor_position"))
+        self.add("HORizontal:RECOrdlength", self.setting("record_length", lambda args: int(float(args))))
+        self.add("HORizontal:FASTframe:COUNt", self.setting("frame_count", lambda args: int(float(args))))
+        self.add("HORizontal:FASTframe:STATE", self.setting("fastframe", self.to_bool, lambda v: str(int(v))))
+        self.add("MEASUrement:IMMed:SOUrce<n>", lambda args, query, n: None)
+        self.add("MEASUrement:IMMed:TYPe", lambda args, query, n: None)
+        self.add("TRIGger", self.trigger_handler)
+        self.add("TRIGger:A:TYPe", self.setting("trigger_type", str.upper))
+        self.add("TRIGger:A:EDGE:SOUrce", self.setting("trigger_source", str.upper))
+        self.add("TRIGger:A:EDGE:SLOpe", self.setting("trigger_slope", str.upper))
+        self.add("TRIGger:A:LEVel", self.setting("trigger_level"))
+        self.add("ACQuire:MODe", self.setting("acquire_mode", str.upper))
+        self.add("ACQuire:STOPAfter", self.setting("stop_after", str.upper))
+        self.add("ACQuire:STATE", self.acquire_state_handler)
+        self.add("DATa:SOUrce", self.setting("data_source", lambda args: args.upper().replace(" ", "")))
+        self.add("DATa:STARt", self.setting("data_start", lambda args: int(float(args))))
+        self.add("DATa:STOP", self.setting("data_stop", lambda args: int(float(args))))
+        self.add("DATa:WIDth", self.setting("data_width", lambda args: int(float(args))))
+        self.add("DATa:ENCdg", self.setting("encoding", str.upper))
+        self.add("DATa:FRAMESTARt", self.setting("frame_start", lambda args: int(float(args))))
+        self.add("DATa:FRAMESTOP", self.setting("frame_stop", lambda args: int(float(args))))
+        self.add("WFMOutpre:YMUlt", lambda args, query, n: f"{self.encoding_parameters()[0]:.6e}")
+        self.add("WFMOutpre:YZEro", lambda args, query, n: f"{self.encoding_parameters()[1]:.6e}")
+        self.add("WFMOutpre:YOFf", lambda args, query, n: f"{self.encoding_parameters()[2]:.6e}")
+        self.add("WFMOutpre:XINcr", lambda args, query, n: f"{self.record_duration() / self.record_length:.6e}")
+        self.add("WFMOutpre:XZEro", lambda args, query, n: f"{-self.pre_trigger():.6e}")
+        self.add("CURVe", self.curve_handler)
+        self.add("CURVEStream", self.curve_stream_handler)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.channel_state = {
+                channel: {
+                    "on": channel == 1,
+                    "coupling": "DC",
+                    "scale": 0.1,
+                    "offset": 0.0,
+                    "bandwidth": "FULL",
+                    "termination": 1e6,
+                }
+                for channel in self.channels
+            }
+            self.control = 1
+            self.hor_scale = 4e-6
+            self.hor_position = 50.0
+            self.record_length = 10000
+            self.frame_count = 1
+            self.fastframe = False
+            self.trigger_type = "EDGE"
+            self.trigger_source = "CH1"
+            self.trigger_slope = "RISE"
+            self.trigger_level = 0.0
+            self.acquire_mode = "SAMPLE"
+            self.stop_after = "RUNSTOP"
+            self.data_source = "CH1"
+            self.data_start = 1
+            self.data_stop = 10000
+            self.data_width = 1
+            self.encoding = "RIBINARY"
+            self.frame_start = 1
+            self.frame_stop = 1
+            self._running = True
+            self._armed_at = None  # arming time of the single sequence
+            self._forced = []  # forced trigger times of the single sequence
+            self._record_triggers = None  # trigger times of the last acquisition
+            self.streaming = False
+            self._stream_end = 0.0
+
+    # Acquisition
+    def record_duration(self) -> float:
+        return self.divisions * self.hor_scale
+
+    def pre_trigger(self) -> float:
+        return self.hor_position / 100 * self.record_duration()
+
+    def frames_needed(self) -> int:
+        return self.frame_count if self.fastframe else 1
+
+    def _update_acquisition(self) -> None:
+        """Complete the single sequence if all its triggers and records are done"""
+        if self._armed_at is None:
+            return
+        now = self.bench.now()
+        triggers = self.find_triggers(self._armed_at + self.pre_trigger(), now)
+        needed = self.frames_needed()
+        post_trigger = self.record_duration() - self.pre_trigger()
+        if len(triggers) >= needed and now >= triggers[needed - 1] + post_trigger:
+            self._record_triggers = triggers[:needed]
+            self._armed_at = None
+            self._running = False
+
+    def find_triggers(self, start: float, stop: float) -> list:
+        """
+        Trigger times in the interval (start, stop], one per record.
+
+        A trigger is accepted only after the end of the previous record.
+        """
+        if self.trigger_source == "AUX":
+            candidates = self.bench.gen.point_triggers(start, stop)
+        elif self.trigger_source.startswith("CH"):
+            candidates = self.edge_times(int(self.trigger_source[2:]), start, stop)
+        else:
+            candidates = []
+        candidates = sorted(list(candidates) + [t for t in self._forced if start < t <= stop])
+
+        triggers = []
+        for t in candidates:
+            if not triggers or t >= triggers[-1] + self.record_duration():
+                triggers.append(t)
+        return triggers
+
+    def edge_times(self, channel: int, start: float, stop: float) -> list:
+        """Crossings of the trigger level by the settling detector voltage"""
+        times, frequency, level, rf_on = self.bench.gen.events(start, stop)
+        volts = self.bench.detector_voltage(channel, frequency, level, rf_on)
+        tau = self.bench.detector_time_constant()
+        threshold = self.trigger_level
+        rising = not self.trigger_slope.startswith("FALL")
+
+        edges = []
+        for k in range(1, len(times)):
+            before, after = volts[k - 1], volts[k]
+            if rising and before < threshold <= after:
+                fraction = (after - before) / max(after - threshold, 1e-12)
+            elif not rising and before > threshold >= after:
+                fraction = (before - after) / max(threshold - after, 1e-12)
+            else:
+                continue
+            edges.append(times[k] + tau * np.log(fraction))
+        return [t for t in edges if t <= stop]
+
+    def waveform(self, channel: int, trigger: float) -> np.ndarray:
+        """Channel voltage of the record triggered at the simulated time trigger"""
+        times = trigger - self.pre_trigger() + np.arange(self.record_length) * (
+            self.record_duration() / self.record_length
+        )
+        state = self.channel_state[channel]
+        tau = self.bench.detector_time_constant()
+
+        volts = np.zeros_like(times)
+        if state["coupling"] == "DC":
+            event_times, frequency, level, rf_on = self.bench.gen.events(times[0] - 10 * tau, times[-1])
+            targets = self.bench.detector_voltage(channel, frequency, level, rf_on)
+            index = np.searchsorted(event_times, times, side="right") - 1
+            volts = targets[index]
+            if tau > 0:
+                settling = index > 0
+                previous = targets[np.maximum(index - 1, 0)]
+                decay = np.exp(-(times - event_times[index]) / tau)
+                volts = np.where(settling, volts + (previous - volts) * decay, volts)
+
+        noise = self.config.get("NOISE", 0.0)
+        if self.acquire_mode.startswith("HIR"):
+            noise *= self.config.get("HIRES_NOISE_FACTOR", 1.0)
+        return volts + self.bench.rng.normal(0, noise, len(times))
+
+    def encoding_parameters(self, channel: int = None) -> tuple:
+        """(ymult, yzero, yoff, dtype, code_min, code_max) of the channel, the (first) data source by default"""
+        bits = 8 * self.data_width
+        levels = 2 ** bits
+        if channel is None:
+            channel = self._source_channels()[0]
+        state = self.channel_state.get(channel, self.channel_state[1])
+        ymult = self.divisions * state["scale"] / levels
+        unsigned = self.encoding.startswith("RP") or self.encoding.startswith("SRP")
+        yoff = levels / 2 if unsigned else 0.0
+        code_min = 0 if unsigned else -levels // 2
+        dtype = f">{'u' if unsigned else 'i'}{self.data_width}"
+        return ymult, state["offset"], yoff, dtype, code_min, code_min + levels - 1
+
+    def _source_channels(self) -> list:
+        channels = [int(source[2:]) for source in self.data_source.split(",") if source.startswith("CH")]
+        return channels or [1]
+
+    def encode(self, volts: np.ndarray, channel: int = None) -> bytes:
+        ymult, yzero, yoff, dtype, code_min, code_max = self.encoding_parameters(channel)
+        codes = np.clip(np.round((volts - yzero) / ymult + yoff), code_min, code_max)
+        return codes.astype(dtype).tobytes()
+
+    def record_data(self, triggers: list, channel: int = None) -> bytes:
+        """Encoded data of the records of the triggers (DATA:START..STOP of every frame) of the channel"""
+        if channel is None:
+            channel = self._source_channels()[0]
+        start = max(self.data_start, 1) - 1
+        stop = min(self.data_stop, self.record_length)
+        return b"".join(self.encode(self.waveform(channel, t)[start:stop], channel) for t in triggers)
+
+    def latest_trigger(self) -> float:
+        """Trigger of the latest complete free running record"""
+        return self.bench.now() - (self.record_duration() - self.pre_trigger())
+
+    # Curve streaming
+    def next_stream_block(self) -> bytes | None:
+        """Next record of the curve stream, available after its acquisition"""
+        if not self.streaming:
+            return None
+        end = max(self.bench.now(), self._stream_end + self.record_duration())
+        self.bench.wait_until(end)
+        self._stream_end = end
+        trigger = end - (self.record_duration() - self.pre_trigger())
+        return self.block(self.record_data([trigger])) + b"\n"
+
+    def device_clear(self) -> None:
+        self.streaming = False
+
+    # Handlers
+    def select_handler(self, args, query, suffixes):
+        states = [str(int(self.channel_state[channel]["on"])) for channel in self.channels]
+        return ";".join(states + ["0"] * 12 + [f"CH{self.control}"])
+
+    def select_channel_handler(self, args, query, suffixes):
+        channel = suffixes[0]
+        if query:
+            return str(int(self.channel_state[channel]["on"]))
+        if args:
+            self.channel_state[channel]["on"] = self.to_bool(args)
+        else:
+            self.control = channel
+            self.channel_state[channel]["on"] = True
+
+    def channel_handler(self, args, query, suffixes):
+        state = self.channel_state[suffixes[0]]
+        return (
+            f"{state['bandwidth']};{state['coupling']};0.0E+0;{state['offset']:.4E};"
+            f"{state['scale']:.4E};{state['termination']:.4E}"
+        )
+
+    def channel_setting(self, key: str, convert: object) -> object:
+        def handler(args, query, suffixes):
+            state = self.channel_state[suffixes[0]]
+            if query:
+                value = state[key]
+                return f"{value:.4E}" if isinstance(value, float) else value
+            state[key] = convert(args)
+        return handler
+
+    def termination_handler(self, args, query, suffixes):
+        state = self.channel_state[suffixes[0]]
+        if query:
+            return f"{state['termination']:.4E}"
+        state["termination"] = 50.0 if args.upper().startswith("FIF") or args.startswith("50") else 1e6
+
+    def trigger_handler(self, args, query, suffixes):
+        if query:
+            return "READY" if self._armed_at is not None else "SAVE"
+        if args.upper().startswith("FORC"):
+            with self._lock:
+                if self._armed_at is not None:  # the trigger waits for the pre-trigger record
+                    self._forced.append(max(self.bench.now(), self._armed_at + self.pre_trigger()))
+
+    def acquire_state_handler(self, args, query, suffixes):
+        with self._lock:
+            if query:
+                self._update_acquisition()
+                return "1" if self._running else "0"
+            run = self.to_bool(args)
+            self._running = run
+            if run and self.stop_after.startswith("SEQ"):
+                self._armed_at = self.bench.now()
+                self._forced = []
+            elif not run:
+                self._update_acquisition()
+                self._armed_at = None
+
+    def curve_handler(self, args, query, suffixes):
+        with self._lock:
+            self._update_acquisition()
+            triggers = self._record_triggers
+            if triggers is None or (self._running and self._armed_at is None):
+                triggers = [self.latest_trigger()]
+            elif self.fastframe:
+                triggers = triggers[max(self.frame_start, 1) - 1 : self.frame_stop]
+            else:
+                triggers = triggers[-1:]
+            return b";".join(self.block(self.record_data(triggers, channel)) for channel in self._source_channels())
+
+    def curve_stream_handler(self, args, query, suffixes):
+        self.streaming = True
+        self._stream_end = self.bench.now()
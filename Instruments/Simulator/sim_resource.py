@@ -0,0 +1,142 @@
+import threading
+import numpy as np
+import pyvisa
+from pyvisa.constants import StatusCode
+
+from Instruments.Simulator.sim_instrument import UnknownCommand
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SimResource:
+    """
+    VISA resource of a simulated instrument.
+
+    Implements the subset of the pyvisa MessageBasedResource interface used by
+    the instrument drivers. Every command is delayed by the latency of the
+    simulated instrument and binary responses by their transfer time.
+    A query sent by write() is answered by the next read.
+    """
+
+    def __init__(self, bench: object, device: object, resource_name: str) -> None:
+        self.bench = bench
+        self.device = device
+        self.resource_name = resource_name
+        self.timeout = 5000  # ms
+        self.read_termination = "\n"
+        self.write_termination = "\n"
+        self._output = bytearray()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<SimResource({self.resource_name!r})>"
+
+    def _execute(self, command: str) -> str | bytes | None:
+        is_query = "?" in command
+        self.bench.delay(self.device.latency(command, is_query))
+        try:
+            response = self.device.execute(command)
+        except UnknownCommand:
+            logger.warning(f"{self.resource_name}: unknown command {command}")
+            if is_query:
+                raise pyvisa.errors.VisaIOError(StatusCode.error_timeout)
+            return None
+        except ValueError as e:
+            logger.warning(f"{self.resource_name}: invalid command {command}: {e}")
+            return None
+        if isinstance(response, bytes):
+            self.bench.delay(self.device.transfer_time(len(response)))
+        return response
+
+    def write(self, command: str) -> int:
+        with self._lock:
+            response = self._execute(command)
+            if response is not None:
+                if isinstance(response, str):
+                    response = response.encode()
+                self._output += response + self.read_termination.encode()
+        return len(command) + len(self.write_termination)
+
+    def query(self, command: str) -> str:
+        with self._lock:
+            self._output.clear()
+            response = self._execute(command)
+        if response is None:
+            raise pyvisa.errors.VisaIOError(StatusCode.error_timeout)
+        if isinstance(response, bytes):
+            return response.decode(errors="replace")
+        return response
+
+    def query_binary_values(
+        self,
+        command: str,
+        datatype: str = "f",
+        is_big_endian: bool = False,
+        container: object = list,
+        expect_termination: bool = True,
+        **kwargs,
+    ) -> object:
+        with self._lock:
+            self._output.clear()
+            response = self._execute(command)
+        if not isinstance(response, bytes):
+            raise pyvisa.errors.VisaIOError(StatusCode.error_timeout)
+        digits = int(response[1:2])
+        length = int(response[2 : 2 + digits])
+        data = response[2 + digits : 2 + digits + length]
+        values = np.frombuffer(data, dtype=np.dtype(datatype).newbyteorder(">" if is_big_endian else "<"))
+        if container is np.ndarray:
+            return values
+        return container(values.tolist())
+
+    def _fill(self, count: int) -> None:
+        while len(self._output) < count:
+            block = getattr(self.device, "next_stream_block", lambda: None)()
+            if block is None:
+                raise pyvisa.errors.VisaIOError(StatusCode.error_timeout)
+            self.bench.delay(self.device.transfer_time(len(block)))
+            self._output += block
+
+    def read_bytes(self, count: int, **kwargs) -> bytes:
+        with self._lock:
+            self._fill(count)
+            data = bytes(self._output[:count])
+            del self._output[:count]
+        return data
+
+    def read_into(self, view: memoryview) -> int:
+        """Fill the buffer view with the next output bytes"""
+        count = len(view)
+        with self._lock:
+            self._fill(count)
+            with memoryview(self._output) as output:
+                view[:] = output[:count]
+            del self._output[:count]
+        return count
+
+    def read(self, **kwargs) -> str:
+        with self._lock:
+            end = self._output.find(self.read_termination.encode())
+            if end < 0:
+                raise pyvisa.errors.VisaIOError(StatusCode.error_timeout)
+            data = bytes(self._output[:end])
+            del self._output[: end + len(self.read_termination)]
+        return data.decode()
+
+    def read_available(self) -> bytes:
+        """All buffered output (socket server of the simulated instrument)"""
+        with self._lock:
+            data = bytes(self._output)
+            self._output.clear()
+        return data
+
+    def clear(self) -> None:
+        """Device clear: aborts the streaming and clears the output buffer"""
+        getattr(self.device, "device_clear", lambda: None)()
+        with self._lock:
+            self._output.clear()
+
+    def close(self) -> None:
+        pass
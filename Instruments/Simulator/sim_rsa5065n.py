@@ -0,0 +1,150 @@
+import numpy as np
+
+from Instruments.Simulator.sim_instrument import SimInstrument
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SimRSA5065N(SimInstrument):
+    """
+    Simulated Rigol RSA5065N spectrum analyzer (swept SA mode).
+
+    The sweep time follows the swept analyzer law t = k * span / (RBW * min(RBW, VBW))
+    plus a fixed overhead. A trace shows the generator tone through the
+    generator-SA line (Gaussian RBW filter shape) over the displayed noise level.
+    The trace is read after the end of the sweep: a trace query blocks until then.
+    """
+
+    idn = "Rigol Technologies,RSA5065N,RSA5SIM000001,00.01.00"
+
+    def __init__(self, bench: object, config: dict) -> None:
+        super().__init__(bench, config)
+
+        self.add("[:SENSe]:FREQuency:CENTer", self.setting("center"))
+        self.add("[:SENSe]:FREQuency:SPAN", self.setting("span"))
+        self.add("[:SENSe]:FREQuency:STARt", lambda args, query, n: str(self.center - self.span / 2))
+        self.add("[:SENSe]:FREQuency:STOP", lambda args, query, n: str(self.center + self.span / 2))
+        self.add(":DISPlay:WINDow:TRACe:Y[:SCALe]:RLEVel", self.setting("ref_level"))
+        self.add("[:SENSe]:BANDwidth[:RESolution]", self.setting("rbw"))
+        self.add("[:SENSe]:BANDwidth:VIDeo", self.setting("vbw"))
+        self.add(":FORMat[:TRACe][:DATA]", self.setting("trace_format", str.upper))
+        self.add(":FORMat:BORDer", self.setting("byte_order", str.upper))
+        self.add(":TRACe:CLEar:ALL", lambda args, query, n: self._clear())
+        self.add("[:SENSe]:SWEep:TIME", self.sweep_time_handler)
+        self.add("[:SENSe]:SWEep:POINts", self.setting("points", lambda args: int(float(args))))
+        self.add(":INITiate:CONTinuous", self.setting("continuous", self.to_bool, lambda v: str(int(v))))
+        self.add(":TRIGger[:SEQuence]:SOURce", self.setting("trigger_source", str.upper))
+        self.add(":INITiate[:IMMediate]", self.initiate_handler)
+        self.add(":CALCulate:MARKer<n>:MAXimum[:MAX]", self.marker_max_handler)
+        self.add(":CALCulate:MARKer<n>:X", self.marker_x_handler)
+        self.add(":CALCulate:MARKer<n>:Y", self.marker_y_handler)
+        self.add(":CONFigure", self.configure_handler)
+        self.add(":CONFigure:SANalyzer", lambda args, query, n: None)
+        self.add(":TRACe[:DATA]", self.trace_handler)
+
+    def reset(self) -> None:
+        self.center = 3.25e9
+        self.span = 6.5e9
+        self.ref_level = 0.0
+        self.rbw = 1e6
+        self.vbw = 1e6
+        self.trace_format = "ASCII"
+        self.byte_order = "NORMAL"
+        self.sweep_time = None  # None: auto sweep time
+        self.points = 801
+        self.continuous = True
+        self.trigger_source = "IMMEDIATE"
+        self.markers = {}
+        self._clear()
+
+    def _clear(self) -> None:
+        self._sweep = None  # (start, stop) of the last sweep in the simulated time
+        self._trace = None
+
+    def auto_sweep_time(self) -> float:
+        factor = self.config.get("SWEEP_FACTOR", 2.5)
+        return max(factor * self.span / (self.rbw * min(self.rbw, self.vbw)), 1e-3)
+
+    def get_sweep_time(self) -> float:
+        return self.auto_sweep_time() if self.sweep_time is None else self.sweep_time
+
+    def last_trace(self) -> np.ndarray:
+        """Trace of the last sweep (or of the running continuous sweep)"""
+        now = self.bench.now()
+        if self._sweep is None or self.continuous:
+            self._sweep = (now - self.get_sweep_time(), now)
+            self._trace = None
+        self.bench.wait_until(self._sweep[1])
+        if self._trace is None:
+            self._trace = self.compute_trace(*self._sweep)
+        return self._trace
+
+    def frequencies(self) -> np.ndarray:
+        return np.linspace(self.center - self.span / 2, self.center + self.span / 2, self.points)
+
+    def compute_trace(self, start: float, stop: float) -> np.ndarray:
+        """
+        Trace in dBm of the sweep between the simulated times start and stop.
+
+        The generator output is taken in the middle of the sweep.
+        """
+        frequencies = self.frequencies()
+        rng = self.bench.rng
+
+        noise_dbm = self.config.get("NOISE_DENSITY", -150.0) + 10 * np.log10(self.rbw)
+        noise_std = self.config.get("TRACE_NOISE", 2.0) * np.sqrt(min(self.vbw / self.rbw, 1))
+        noise_mw = 10 ** ((noise_dbm + rng.normal(0, noise_std, len(frequencies))) / 10)
+
+        gen_frequency, gen_level, rf_on = self.bench.gen.output_at(np.array([(start + stop) / 2]))
+        signal_mw = np.zeros_like(frequencies)
+        if rf_on[0]:
+            power = self.bench.sa_power(gen_frequency[0], gen_level[0])
+            power += rng.normal(0, self.config.get("LEVEL_NOISE", 0.02))
+            offset = (frequencies - gen_frequency[0]) / self.rbw
+            filter_db = -3.01 * (2 * offset) ** 2  # Gaussian RBW filter, 3 dB at RBW/2
+            signal_mw = 10 ** ((power + np.maximum(filter_db, -300)) / 10)
+
+        return (10 * np.log10(noise_mw + signal_mw)).astype(np.float32)
+
+    # Handlers
+    def sweep_time_handler(self, args, query, suffixes):
+        if query:
+            return f"{self.get_sweep_time():.6g}"
+        if args.upper().startswith("AUTO"):
+            if self.to_bool(args.split()[-1]):
+                self.sweep_time = None
+        else:
+            self.sweep_time = self.to_float(args)
+
+    def initiate_handler(self, args, query, suffixes):
+        start = self.bench.now()
+        stop = start + self.get_sweep_time() + self.config.get("SWEEP_OVERHEAD", 0.0)
+        self._sweep = (start, stop)
+        self._trace = None
+
+    def marker_max_handler(self, args, query, suffixes):
+        trace = self.last_trace()
+        index = int(np.argmax(trace))
+        self.markers[suffixes[0]] = (self.frequencies()[index], float(trace[index]))
+
+    def marker_x_handler(self, args, query, suffixes):
+        if suffixes[0] not in self.markers:
+            self.marker_max_handler(args, query, suffixes)
+        return f"{self.markers[suffixes[0]][0]:.6e}"
+
+    def marker_y_handler(self, args, query, suffixes):
+        if suffixes[0] not in self.markers:
+            self.marker_max_handler(args, query, suffixes)
+        return f"{self.markers[suffixes[0]][1]:.4f}"
+
+    def configure_handler(self, args, query, suffixes):
+        return "SAN"
+
+    def trace_handler(self, args, query, suffixes):
+        trace = self.last_trace()
+        if self.trace_format.startswith("REAL"):
+            dtype = ">f4" if self.byte_order.startswith("NORM") else "<f4"
+            return self.block(trace.astype(dtype).tobytes())
+        return ",".join(f"{value:.4f}" for value in trace)
@@ -0,0 +1,111 @@
+import select
+import socket
+import socketserver
+import threading
+
+from Instruments.Simulator.sim_bench import SimBench
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SimSocketServer:
+    """
+    Raw SCPI socket server (port 5025 protocol) of a simulated bench instrument.
+
+    Stand-in of the instrument socket server for the SocketResource transport:
+    every received line is executed by a SimResource of the instrument (with the
+    simulated latency) and its output is sent back, binary responses as IEEE 488.2
+    blocks followed by the termination. A CURVESTREAM? query streams the curves
+    until the device clear command (!d) is received.
+
+    Usage:
+        with SimSocketServer(bench, "MDO34") as server:
+            resource = SocketResource("127.0.0.1", server.port)
+    """
+
+    clear_command = b"!d"
+
+    def __init__(self, bench: SimBench, model: str, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.bench = bench
+        self.model = model
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.serve_connection(self.request)
+
+        self._server = _TCPServer((host, port), Handler)
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def __enter__(self) -> "SimSocketServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"SimSocketServer {self.model}", daemon=True)
+        self._thread.start()
+        logger.info(f"{self.model} socket server listening on {self.host}:{self.port}")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def read_line(connection: socket.socket, buffer: bytearray) -> bytes | None:
+        """Next received line, None if the connection is closed"""
+        while b"\n" not in buffer:
+            data = connection.recv(1 << 16)
+            if not data:
+                return None
+            buffer += data
+        end = buffer.index(b"\n")
+        line = bytes(buffer[:end])
+        del buffer[: end + 1]
+        return line.strip()
+
+    def serve_connection(self, connection: socket.socket) -> None:
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        resource = self.bench.open_resource(SimBench.visa_string(self.model))
+        buffer = bytearray()
+        try:
+            while (command := self.read_line(connection, buffer)) is not None:
+                if not command:
+                    continue
+                if command == self.clear_command:
+                    resource.clear()
+                    continue
+                resource.write(command.decode(errors="replace"))
+                output = resource.read_available()
+                if output:
+                    connection.sendall(output)
+                if getattr(resource.device, "streaming", False):
+                    self.stream(connection, buffer, resource)
+        except OSError as e:
+            logger.debug(f"{self.model} socket server: connection closed: {e}")
+
+    def stream(self, connection: socket.socket, buffer: bytearray, resource: object) -> None:
+        """Send the streamed curves until a device clear is received"""
+        while True:
+            readable, _, _ = select.select([connection], [], [], 0)
+            if readable or b"\n" in buffer:
+                command = self.read_line(connection, buffer)
+                if command is None or command == self.clear_command:
+                    resource.clear()
+                    return
+                logger.warning(f"{self.model} socket server: command {command!r} ignored while streaming")
+                continue
+            connection.sendall(resource.read_bytes(1) + resource.read_available())  # next curve block
@@ -0,0 +1,116 @@
+import numpy as np
+import pyvisa
+
+
+class BinaryBlockReader:
+    """
+    Reader of IEEE 488.2 definite length blocks (#<digits><length><data>) into reusable buffers
+
+    The block data is received into a preallocated bytearray (read_into of the
+    resource, recv_into for SocketResource) and viewed with np.frombuffer in
+    the dtype of the reader, the scaling is done in place in a reusable float array.
+    A block is only copied for the VISA library resources, which have no read_into.
+
+    The returned arrays are views of the reader buffers: they are valid until
+    the next read (or scale) of the same reader and must be copied to be kept.
+    """
+
+    def __init__(self, dtype):
+        self.dtype = np.dtype(dtype)  # with the byte order, e.g. '>u2', '>f4'
+        self._raw = bytearray()
+        self._values = np.empty(0)
+
+    def _raw_view(self, size):
+        if len(self._raw) < size:
+            self._raw = bytearray(size)
+        return memoryview(self._raw)[:size]
+
+    @staticmethod
+    def read_into(resource, view):
+        """Fill the memoryview with the next bytes of the resource"""
+        read_into = getattr(resource, "read_into", None)
+        if read_into is not None:
+            read_into(view)
+        else:
+            view[:] = resource.read_bytes(len(view))
+
+    @staticmethod
+    def read_length(resource):
+        """
+        Read the header #<digits><length> of a definite length block
+
+        Leading whitespace and a stray termination before '#' are skipped,
+        as SocketResource.read_binary_block does.
+
+        Returns: the block length in bytes
+        """
+        while True:
+            header = resource.read_bytes(1)
+            if header == b"#":
+                break
+            if not header.isspace():
+                raise pyvisa.errors.InvalidBinaryFormat(f"Expected '#' of a binary block, received {header!r}")
+        digits = resource.read_bytes(1)
+        if digits == b"0":
+            raise pyvisa.errors.InvalidBinaryFormat("Expected a definite length block, received #0")
+        return int(resource.read_bytes(int(digits)))
+
+    def read_block(self, resource, expect_termination=True):
+        """
+        Read the next block of the resource
+
+        Returns: the block data as ndarray view of the reader buffer
+        """
+        length = self.read_length(resource)
+        self.read_into(resource, self._raw_view(length))
+        if expect_termination:
+            resource.read_bytes(len(resource.read_termination or "\n"))
+        return np.frombuffer(self._raw, dtype=self.dtype, count=length // self.dtype.itemsize)
+
+    def read_blocks(self, resource, count, expect_termination=True):
+        """
+        Read count blocks of equal length separated by ';' (e.g. CURVE? of several sources)
+
+        Returns: the blocks data as ndarray (count, points) view of the reader buffer
+        """
+        length = None
+        for i in range(count):
+            if i:
+                separator = resource.read_bytes(1)
+                if separator != b";":
+                    raise pyvisa.errors.InvalidBinaryFormat(f"Expected ';' between blocks, received {separator!r}")
+            block_length = self.read_length(resource)
+            if length is None:
+                length = block_length
+                view = self._raw_view(count * length)
+            elif block_length != length:
+                raise pyvisa.errors.InvalidBinaryFormat(f"Blocks of different lengths: {length} and {block_length}")
+            self.read_into(resource, view[i * length:(i + 1) * length])
+        if expect_termination:
+            resource.read_bytes(len(resource.read_termination or "\n"))
+        points = length // self.dtype.itemsize
+        return np.frombuffer(self._raw, dtype=self.dtype, count=count * points).reshape(count, points)
+
+    def query(self, resource, command, expect_termination=True, blocks=1):
+        """Send the query and read its block response (blocks > 1: read_blocks)"""
+        resource.write(command)
+        if blocks > 1:
+            return self.read_blocks(resource, blocks, expect_termination)
+        return self.read_block(resource, expect_termination)
+
+    def scale(self, data, multiplier, offset=0.0, zero=0.0, out=None):
+        """
+        (data - offset) * multiplier + zero computed in place
+
+        The parameters are broadcast, e.g. (rows, 1) arrays scale every row of the data by its own values.
+
+        Returns: the reader float array (or out) with the scaled data
+        """
+        if out is None:
+            if self._values.shape != data.shape:
+                self._values = np.empty(data.shape)
+            out = self._values
+        np.subtract(data, offset, out=out)
+        np.multiply(out, multiplier, out=out)
+        np.add(out, zero, out=out)
+        return out
@@ -11,11 +11,15 @@ class DSG830(Instrument):
 
     max_level = 20
     min_level = -110
+    max_list_points = 4001
      
     def __init__(self, ip):
         super().__init__(ip)
         self.type = 'Microwave Generator'
 
+        self._sweep_table = []  # uploaded (frequency, level) rows of the list sweep
+        self._sweep_index = None  # current row of the list sweep, None if not running
+
 
     @Instrument.device_checking
     def factory_preset(self):
@@ -86,3 +90,148 @@ class DSG830(Instrument):
             'rf_state': self.get_output_state(),
             'mod_state': self.get_modulation_state()
             })
+
+    # List sweep (Sweep)
+    @Instrument.device_checking
+    def set_sweep_state(self, state='LEV,FREQ'):
+        """
+        Select the swept parameters: OFF|FREQ|LEV|LEV,FREQ
+        """
+        self.send(f":SWEep:STATe {state}")
+        self.state_changed.emit({'SWEEP_STATE': state})
+
+    @Instrument.device_checking
+    def set_sweep_type(self, sweep_type='LIST'):
+        """
+        LIST|STEP
+        """
+        self.send(f":SWEep:TYPE {sweep_type}")
+
+    @Instrument.device_checking
+    def set_sweep_mode(self, mode='SINGle'):
+        """
+        SINGle|CONTinue
+        """
+        self.send(f":SWEep:MODE {mode}")
+
+    @Instrument.device_checking
+    def set_point_trigger(self, source='BUS'):
+        """
+        Trigger source advancing the sweep by one point: AUTO|KEY|BUS|EXTernal
+        """
+        self.send(f":SWEep:POINt:TRIGger:TYPE {source}")
+
+    @Instrument.device_checking
+    def set_sweep_trigger(self, source='AUTO'):
+        """
+        Trigger source starting the sweep: AUTO|KEY|BUS|EXTernal
+        """
+        self.send(f":SWEep:SWEep:TRIGger:TYPE {source}")
+
+    @Instrument.device_checking
+    def upload_sweep_list(self, frequencies, levels, dwell=0.01):
+        """
+        Upload the frequency/level table of the list sweep
+
+        Rows are executed in the given order. The dwell time (s) is used
+        only when the points are advanced by the AUTO trigger.
+        """
+        frequencies = np.asarray(frequencies, dtype=float)
+        levels = np.asarray(levels, dtype=float)
+        if frequencies.shape != levels.shape or frequencies.size == 0:
+            raise ValueError("Sweep list requires equal non-empty frequency and level columns")
+        if frequencies.size > self.max_list_points:
+            raise ValueError(f"Sweep list is limited to {self.max_list_points} points")
+        if levels.max() > self.max_level or levels.min() < self.min_level:
+            raise ValueError("Sweep list level out of range")
+
+        self.send(":SWEep:LIST:DELete:ALL")
+        self.send(f":SWEep:LIST:FREQuency {','.join(f'{f:.0f}' for f in frequencies)}")
+        self.send(f":SWEep:LIST:LEVel {','.join(f'{l:.2f}' for l in levels)}")
+        self.send(f":SWEep:LIST:DWELl {dwell}")
+
+        self._sweep_table = list(zip(frequencies.tolist(), levels.tolist()))
+        self._sweep_index = None
+        self.state_changed.emit({'SWEEP_POINTS': len(self._sweep_table)})
+
+    @Instrument.device_checking
+    def setup_list_sweep(self, frequencies, levels, trigger='BUS', dwell=0.01):
+        """
+        Configure a single list sweep over the table, stepped by the point trigger
+        """
+        self.set_sweep_state('LEV,FREQ')
+        self.set_sweep_type('LIST')
+        self.set_sweep_mode('SINGle')
+        self.set_sweep_trigger('AUTO')
+        self.set_point_trigger(trigger)
+        self.upload_sweep_list(frequencies, levels, dwell)
+
+    @Instrument.device_checking
+    def start_list_sweep(self):
+        """
+        Execute the uploaded list sweep, the output is set to the first row
+        """
+        self.send(":SWEep:EXECute")
+        self._set_sweep_index(0)
+
+    @Instrument.device_checking
+    def trigger_next_point(self):
+        """
+        Advance the running list sweep by one row (BUS point trigger)
+        """
+        if not self.is_list_sweep_running():
+            logger.warning("List sweep is not running")
+            return
+        if self._sweep_index + 1 >= len(self._sweep_table):
+            logger.warning("List sweep is already at the last point")
+            return
+        self.send(":SWEep:POINt:TRIGger")
+        self._set_sweep_index(self._sweep_index + 1)
+
+    @Instrument.device_checking
+    def stop_list_sweep(self):
+        self.send(":SWEep:STATe OFF")
+        self._sweep_index = None
+        self.state_changed.emit({'SWEEP_STATE': 'OFF'})
+
+    @Instrument.device_checking
+    def get_list_point(self):
+        """
+        Query the current row of the list sweep (0-based)
+        """
+        return int(self.send(":SWEep:LIST:CPOint?")) - 1
+
+    def is_list_sweep_running(self):
+        return self._sweep_index is not None and bool(self._sweep_table)
+
+    def step_to(self, frequency, level):
+        """
+        Move the output to (frequency, level)
+
+        When a list sweep is running and the requested point is the current
+        or the next row of the table, the hardware is stepped by trigger
+        instead of sending the frequency and level.
+        """
+        if self.is_list_sweep_running():
+            index = self._sweep_index
+            if self._is_sweep_row(index, frequency, level):
+                return
+            if self._is_sweep_row(index + 1, frequency, level):
+                self.trigger_next_point()
+                return
+            logger.warning(f"Point ({frequency} Hz, {level} dBm) is not the next row of the list sweep")
+            self.stop_list_sweep()
+
+        self.set_frequency(frequency)
+        self.set_level(level)
+
+    def _is_sweep_row(self, index, frequency, level):
+        if index >= len(self._sweep_table):
+            return False
+        row_frequency, row_level = self._sweep_table[index]
+        return abs(row_frequency - frequency) < 1 and abs(row_level - level) < 1e-3
+
+    def _set_sweep_index(self, index):
+        self._sweep_index = index
+        frequency, level = self._sweep_table[index]
+        self.state_changed.emit({'FREQUENCY': frequency, 'LEVEL': level})
@@ -1,12 +1,43 @@
 from Instruments.scpi_instr import Instrument
+from Instruments.block_reader import BinaryBlockReader
+from PyQt6.QtCore import QThread
+from collections import deque
+import threading
 import numpy as np
 import logging
 import time
 import pyvisa
 
 from System.logger import get_logger
+from System.tracer import tracer
 logger = get_logger(__name__)
 
+
+class CurveStreamThread(QThread):
+    """
+    Background reader of the CURVESTREAM? waveforms into the ring buffer
+
+    The reader ends on the first read error (the stream is no longer aligned
+    on the blocks) and marks the stream failed.
+    """
+
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            try:
+                data = self.parent.read_curve_block()
+            except pyvisa.errors.Error as e:
+                if not self.isInterruptionRequested():
+                    logger.error(f"Curve stream read error: {e}")
+                    self.parent.fail_stream()
+                break
+            self.parent.push_stream_frame(data)
+        logger.debug(f"{self.__class__.__name__}: stream reader finished")
+
+
 class MDO34(Instrument):
 
     channel_map = {
@@ -24,6 +55,25 @@ class MDO34(Instrument):
         self._selected_channel = 1
         self.type = 'Oscilloscope'
 
+        self._data_sources = [1]  # channels transferred by CURVE?
+        self._channel_parameters = {}  # channel: waveform parameters, read on the first multi-channel transfer
+
+        self._stream_thread = None
+        self._stream_frames = deque(maxlen=8)  # ring buffer of (timestamp, voltage_data)
+        self._stream_condition = threading.Condition()
+        self._stream_parameters = None  # waveform parameters of the streamed curves
+        self._stream_scale = None  # vertical scale while streaming
+        self._stream_record_time = 0  # duration of one streamed record, s
+        self._stream_failed = False  # the reader thread ended on a read error
+
+        # Reusable buffers of the curve transfers (RPBinary, 2 bytes per point, MSB first)
+        self._curve_reader = BinaryBlockReader('>u2')
+        self._stream_reader = BinaryBlockReader('>u2')  # used by the stream reader thread
+        self._stream_buffers = []  # voltage_data of the streamed frames, reused in turn
+        self._stream_buffer_index = 0
+        self._time_axis = np.empty(0)
+        self._time_axis_key = None
+
 
     @property
     def selected_channel(self):
@@ -100,10 +150,19 @@ class MDO34(Instrument):
         self.state_changed.emit({'COUPLING': coupling})
 
     @Instrument.device_checking
-    def set_vertical_scale(self, scale=1):
-        """Vertical scale in voltages"""
-        self.send(f'CH{self._selected_channel}:SCALE {scale}')
-        self.state_changed.emit({'VERT_SCALE' : scale})
+    def set_vertical_scale(self, scale=1, channel=None):
+        """Vertical scale in voltages of the channel, the selected one by default (the curve stream is restarted)"""
+        if channel is None:
+            channel = self._selected_channel
+        streaming = self.is_streaming()
+        if streaming and not self.stop_curve_stream():
+            return
+        self.send(f'CH{channel}:SCALE {scale}')
+        self._channel_parameters.pop(channel, None)
+        if channel == self._selected_channel:
+            self.state_changed.emit({'VERT_SCALE' : scale})
+        if streaming:
+            self.start_curve_stream(self._stream_frames.maxlen)
 
     @Instrument.device_checking
     def get_channel_parameters(self):
@@ -111,13 +170,18 @@ class MDO34(Instrument):
          return self.send(f'CH{self._selected_channel}?')
 
     @Instrument.device_checking
-    def get_vertical_scale(self):
-        return float(self.send(f'CH{self._selected_channel}:SCALE?'))
+    def get_vertical_scale(self, channel=None):
+        if channel is None:
+            channel = self._selected_channel
+        if self.is_streaming() and channel == self._selected_channel:
+            return self._stream_scale
+        return float(self.send(f'CH{channel}:SCALE?'))
 
     @Instrument.device_checking
     def set_vertical_position(self, offset=0):
         """Vertical offset in voltages"""
         self.send(f'CH{self._selected_channel}:OFFSET {offset}')
+        self._channel_parameters.pop(self._selected_channel, None)
         self.state_changed.emit({'VERT_POS' : offset})
 
     @Instrument.device_checking
@@ -133,6 +197,7 @@ class MDO34(Instrument):
     def set_horizontal_scale(self, scale='1s'):
         """Horizontal scale in seconds"""
         self.send(f'HORIZONTAL:SCALE {scale}')
+        self._channel_parameters.clear()
         self.state_changed.emit({'HOR_SCALE' : scale})
 
     @Instrument.device_checking
@@ -142,6 +207,7 @@ class MDO34(Instrument):
     @Instrument.device_checking
     def set_horizontal_position(self, position=0):
         self.send(f'HORIZONTAL:POSITION {position}')
+        self._channel_parameters.clear()
         self.state_changed.emit({'HOR_POS' : position})
 
     @Instrument.device_checking
@@ -168,6 +234,15 @@ class MDO34(Instrument):
             source=self._selected_channel
         self.send(f'TRIGGER:A:EDGE:SOURCE {source}')
 
+    @Instrument.device_checking
+    def set_trigger_slope(self, slope='RISe'):
+        """RISe|FALL"""
+        self.send(f'TRIGGER:A:EDGE:SLOPE {slope}')
+
+    @Instrument.device_checking
+    def get_trigger_slope(self):
+        return self.send('TRIGGER:A:EDGE:SLOPE?')
+
     @Instrument.device_checking
     def set_trigger_level(self, level=0):
         self.send(f'TRIGGER:A:LEVEL {level}')
@@ -217,16 +292,29 @@ class MDO34(Instrument):
         if source is None:
             source=self._selected_channel
         self.send(f'DATA:SOURCE CH{source}')
+        self._data_sources = [source]
+
+    @Instrument.device_checking
+    def set_data_sources(self, channels):
+        """Channels transferred together by one CURVE? (get_channels_data)"""
+        self.send('DATA:SOURCE ' + ','.join(f'CH{channel}' for channel in channels))
+        self._data_sources = list(channels)
 
     @Instrument.device_checking
     def set_data_points(self,points=1000):
         self.send('DATA:START 1')
         self.send(f'DATA:STOP {points}')
+        self._channel_parameters.clear()
+
+    @Instrument.device_checking
+    def get_data_points(self):
+        return int(self.send('DATA:STOP?'))
 
     @Instrument.device_checking
     def set_binary_data_format(self):
         self.send('DATA:WIDTH 2') # 2 bytes per point
         self.send('DATA:ENCDG RPBinary') # Signed integer binary
+        self._channel_parameters.clear()
 
     @Instrument.device_checking
     def get_waveform_parameters(self):
@@ -253,23 +341,208 @@ class MDO34(Instrument):
     def get_waveform_data(self):
         """
         Returns: waveform data as numpy ndarray: time_data, voltage_data
+        (buffers reused by the next read, copy them to keep the data)
         """
         
-        data = self.instr.query_binary_values('CURVE?', 
-                                      datatype='H',  # 'H' for unsigned 16-bit integers
-                                      container=np.ndarray,
-                                      is_big_endian=True,  # MSB first from preamble
-                                      expect_termination=True)
+        data = self.query_binary_block('CURVE?', self._curve_reader)
         
         ymult, yzero, yoff, xincr, xzero = self.get_waveform_parameters()
         
-        # Convert data to voltage
-        voltage_data = (data - yoff) * ymult + yzero
+        # Convert data to voltage (in place, in the reader buffer)
+        voltage_data = self._curve_reader.scale(data, ymult, yoff, yzero)
         # Create time array
-        time_data = xzero + np.arange(len(voltage_data)) * xincr
+        time_data = self.get_time_axis(len(voltage_data), xincr, xzero)
+
+        return time_data, voltage_data
+
+    @Instrument.device_checking
+    def get_channels_data(self, channels=None):
+        """
+        Read the waveforms of several channels with one CURVE? transfer
+
+        The data sources are set to the channels if they differ. The waveform
+        parameters of every channel are read once (the preamble describes only
+        one source) and kept until its vertical or the horizontal settings change.
+
+        Returns: time_data and voltage_data as ndarray (channels, points)
+        (buffers reused by the next read, copy them to keep the data)
+        """
+        if channels is None:
+            channels = self._data_sources
+        if list(channels) != self._data_sources:
+            self.set_data_sources(channels)
+
+        data = self.query_binary_block('CURVE?', self._curve_reader, blocks=len(channels))
+
+        parameters = np.array(self.get_channels_parameters(channels))  # (channels, 5)
+        ymult, yzero, yoff = (parameters[:, [i]] for i in range(3))
+        voltage_data = self._curve_reader.scale(data, ymult, yoff, yzero)
+        time_data = self.get_time_axis(voltage_data.shape[1], parameters[0, 3], parameters[0, 4])
 
         return time_data, voltage_data
+
+    def get_channels_parameters(self, channels):
+        """Waveform parameters (get_waveform_parameters) of the channels, the unknown ones are read from the device"""
+        missing = [channel for channel in channels if channel not in self._channel_parameters]
+        if missing:
+            for channel in missing:
+                self.send(f'DATA:SOURCE CH{channel}')
+                self._channel_parameters[channel] = self.get_waveform_parameters()
+            self.set_data_sources(self._data_sources)
+        return [self._channel_parameters[channel] for channel in channels]
+
+    def get_time_axis(self, points, xincr, xzero):
+        """Time of the record points, reused while the horizontal settings do not change"""
+        key = (points, xincr, xzero)
+        if key != self._time_axis_key:
+            self._time_axis = xzero + np.arange(points) * xincr
+            self._time_axis_key = key
+        return self._time_axis
     
+    @Instrument.device_checking
+    def set_record_length(self, points=10000):
+        self.send(f'HORIZONTAL:RECORDLENGTH {points}')
+        self.state_changed.emit({'RECORD_LENGTH': points})
+
+    @Instrument.device_checking
+    def get_record_length(self):
+        return int(self.send('HORIZONTAL:RECORDLENGTH?'))
+
+    @Instrument.device_checking
+    def set_fastframe(self, count):
+        """
+        Segmented acquisition: every trigger acquires one of the count frames
+        """
+        self.send(f'HORIZONTAL:FASTFRAME:COUNT {count}')
+        self.send('HORIZONTAL:FASTFRAME:STATE ON')
+        self.state_changed.emit({'FASTFRAME': count})
+
+    @Instrument.device_checking
+    def fastframe_off(self):
+        self.send('HORIZONTAL:FASTFRAME:STATE OFF')
+        self.state_changed.emit({'FASTFRAME': 0})
+
+    @Instrument.device_checking
+    def set_data_frames(self, start=1, stop=1):
+        """Frames transferred by CURVE? in FastFrame mode"""
+        self.send(f'DATA:FRAMESTART {start}')
+        self.send(f'DATA:FRAMESTOP {stop}')
+
+    @Instrument.device_checking
+    def get_frames_data(self, frames):
+        """
+        Read all FastFrame frames with one CURVE? transfer
+
+        Returns: time_data of one frame and voltage_data as ndarray (frames, points)
+        """
+        data = self.query_binary_block('CURVE?', self._curve_reader)
+
+        ymult, yzero, yoff, xincr, xzero = self.get_waveform_parameters()
+
+        voltage_data = self._curve_reader.scale(data, ymult, yoff, yzero).reshape(frames, -1)
+        time_data = self.get_time_axis(voltage_data.shape[1], xincr, xzero)
+
+        return time_data, voltage_data
+
+    # Continuous curve streaming (CURVESTREAM)
+    @Instrument.device_checking
+    def start_curve_stream(self, ring_size=8):
+        """
+        Put the scope in continuous acquisition and curve streaming
+
+        The curves are read by a background thread into a ring buffer of
+        ring_size frames. No other command can be sent while streaming
+        (except the vertical scale, which restarts the stream).
+        """
+        if self.is_streaming():
+            return
+
+        self.send('ACQUIRE:STOPAFTER RUNSTOP')
+        self.send('ACQUIRE:STATE RUN')
+        self._stream_scale = self.get_vertical_scale()
+        self._stream_record_time = 10 * self.get_horizontal_scale()
+        self._stream_parameters = self.get_waveform_parameters()
+
+        with self._stream_condition:
+            self._stream_frames = deque(maxlen=ring_size)
+            self._stream_buffers = [None] * (ring_size + 2)  # the ring, the frame in use and the frame being read
+            self._stream_failed = False
+        self.instr.write('CURVESTREAM?')
+        self._stream_thread = CurveStreamThread(self)
+        self._stream_thread.start()
+        self.state_changed.emit({'CURVE_STREAM': True})
+
+    def stop_curve_stream(self):
+        """
+        Stop the curve streaming and return to the single sequence acquisition
+
+        Returns False if the reader thread did not finish, the session is then
+        left untouched and the stream is kept.
+        """
+        if not self.is_streaming():
+            return True
+
+        self._stream_thread.requestInterruption()
+        if not self._stream_thread.wait(int(self._stream_record_time * 2e3) + self.instr.timeout):
+            logger.error("Curve stream reader did not finish")
+            return False
+        self._stream_thread = None
+        self.instr.clear()  # device clear terminates the streaming
+        self.stop_after_sequence()
+        self.state_changed.emit({'CURVE_STREAM': False})
+        return True
+
+    def is_streaming(self):
+        return self._stream_thread is not None
+
+    def read_curve_block(self):
+        """
+        Read one streamed curve (IEEE 488.2 definite length block)
+
+        Returns: raw waveform data as numpy ndarray
+        """
+        start = time.perf_counter()
+        data = self._stream_reader.read_block(self.instr)
+        tracer.command(self.__class__.__name__, 'READ', 'CURVESTREAM', data.nbytes, start, time.perf_counter() - start)
+        return data
+
+    def fail_stream(self):
+        """Mark the stream failed, the waiting get_stream_frame returns None"""
+        with self._stream_condition:
+            self._stream_failed = True
+            self._stream_condition.notify_all()
+
+    def push_stream_frame(self, data):
+        ymult, yzero, yoff, _, _ = self._stream_parameters
+        index = self._stream_buffer_index
+        self._stream_buffer_index = (index + 1) % len(self._stream_buffers)
+        buffer = self._stream_buffers[index]
+        if buffer is None or buffer.shape != data.shape:
+            buffer = self._stream_buffers[index] = np.empty(data.shape)
+        voltage_data = self._stream_reader.scale(data, ymult, yoff, yzero, out=buffer)
+        with self._stream_condition:
+            self._stream_frames.append((time.time(), voltage_data))
+            self._stream_condition.notify_all()
+
+    def get_stream_frame(self, since=None, timeout=5):
+        """
+        Returns the latest streamed voltage_data acquired after the time since
+
+        A frame is taken as settled if it was received at least one record
+        duration after since, so its acquisition started after since.
+        Returns None on timeout or if the stream failed.
+        """
+        settled = 0 if since is None else since + self._stream_record_time
+        deadline = time.time() + timeout
+        with self._stream_condition:
+            while not self._stream_frames or self._stream_frames[-1][0] < settled:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.is_streaming() or self._stream_failed:
+                    logger.warning("No settled frame in the curve stream")
+                    return None
+                self._stream_condition.wait(remaining)
+            return self._stream_frames[-1][1]
+
     @Instrument.device_checking
     def set_high_res_mode(self):
         self.send('ACQuire:MODe HIRes')
@@ -1,99 +1,177 @@
-import configparser
+import json
+import os
 import numpy as np
-import matplotlib.pyplot as plt
 from typing import Tuple, Dict, Any
 
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
 class RSA506N_S21_Parser:
-    def __init__(self, filename: str):
+    """
+    Parser of the RSA5000 VNA trace files (.trs, INI-like format)
+
+    The file is read in one pass: the ampy/ampz pairs of the [Trace] section
+    (real and imaginary parts, keys in text order 1, 10, 100, ...) are written
+    into preallocated arrays by their point index, the sweep parameters are taken
+    from the [General] and [VNAGloble] ([VNA] in older files) sections.
+
+    The parsed trace is cached in a sidecar file <filename>.npz, which is used
+    while the path, modification time and size of the trace file are unchanged.
+    """
+
+    cache_suffix = ".npz"
+    parameter_sections = ("General", "VNA", "VNAGloble")
+
+    def __init__(self, filename: str, cache: bool = True):
         self.filename = filename
-        self.config = configparser.ConfigParser()
+        self.cache = cache  # False: always parse the file, no sidecar
+        self.parameters = None
         self.frequency = None
         self.s21_complex = None
         self.magnitude_db = None
         self.phase_degrees = None
-        
+
     def parse_file(self) -> Dict[str, Any]:
         """Parse the RSA506N VNA trace file"""
-        # Read the file
-        with open(self.filename, 'r') as file:
-            content = file.read()
-        
-        # Parse the INI-like format
-        self.config.read_string(content)
-        
-        # Extract measurement parameters
-        params = self._extract_parameters()
-        
-        # Extract trace data
-        self._extract_trace_data()
-        
+        if not (self.cache and self._load_cache()):
+            sections, real_parts, imag_parts, size = self._read_file()
+            self.parameters = self._extract_parameters(sections)
+            self.s21_complex = real_parts + 1j * imag_parts
+            self.frequency = np.linspace(self.parameters['start_freq'], self.parameters['stop_freq'], size)
+            if self.cache:
+                self._save_cache()
+
+        # Calculate magnitude in dB and phase in degrees
+        self.magnitude_db = 20 * np.log10(np.abs(self.s21_complex))
+        self.phase_degrees = np.angle(self.s21_complex, deg=True)
+
         return {
-            'PARAMETERS': params,
+            'PARAMETERS': self.parameters,
             'FREQUENCY': self.frequency,
             'S21_COMPLEX': self.s21_complex,
             'MAGNITUDE_DB': self.magnitude_db,
             'PHASE_DEGREES': self.phase_degrees
         }
-    
-    def _extract_parameters(self) -> Dict[str, Any]:
-        """Extract measurement parameters from the file"""
+
+    def _read_file(self) -> Tuple[Dict[str, Dict[str, str]], np.ndarray, np.ndarray, int]:
+        """
+        Read the trace points and the parameter sections in one pass
+
+        Returns: (parameter sections, real parts, imaginary parts, trace size)
+        """
+        sections = {name: {} for name in self.parameter_sections}
+        real_parts = imag_parts = None
+        section = None
+        size = None
+
+        with open(self.filename, 'r') as file:
+            for line in file:
+                if line.startswith('['):
+                    section = line.strip()[1:-1]
+                    if section == 'Trace' and real_parts is None:
+                        points = int(sections['General'].get('PointsNums', '1001'))
+                        real_parts, imag_parts = np.full(points, np.nan), np.full(points, np.nan)
+                    continue
+                key, separator, value = line.partition('=')
+                if not separator:
+                    continue
+
+                if section == 'Trace':
+                    index, _, name = key.partition('\\')
+                    if name in ('ampy', 'ampz') and index.isdigit():
+                        i = int(index) - 1
+                        if i >= len(real_parts):
+                            real_parts, imag_parts = self._grow(real_parts, i), self._grow(imag_parts, i)
+                        (real_parts if name == 'ampy' else imag_parts)[i] = float(value)
+                    elif key == 'size':
+                        size = int(value)
+                elif section in sections:
+                    sections[section][key] = value.strip()
+
+        if real_parts is None:
+            raise ValueError("No trace data found in file")
+        if size is None:
+            size = 1001
+        real_parts, imag_parts = real_parts[:size], imag_parts[:size]
+        present = ~(np.isnan(real_parts) | np.isnan(imag_parts))
+        if not present.all():  # only the points with both parts
+            real_parts, imag_parts = real_parts[present], imag_parts[present]
+        return sections, real_parts, imag_parts, size
+
+    @staticmethod
+    def _grow(values: np.ndarray, index: int) -> np.ndarray:
+        grown = np.full(max(index + 1, 2 * len(values)), np.nan)
+        grown[:len(values)] = values
+        return grown
+
+    @staticmethod
+    def _extract_parameters(sections: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+        """Extract measurement parameters from the parameter sections"""
         params = {}
-        
+
         # General parameters
-        if 'General' in self.config:
-            general = self.config['General']
-            params['measurement_mode'] = general.get('MeasMode', 'S21')
-            params['points'] = int(general.get('PointsNums', '1001'))
-            params['trace_format'] = general.get('TraceFormat', 'LogMag')
-        
+        general = sections['General']
+        params['measurement_mode'] = general.get('MeasMode', 'S21')
+        params['points'] = int(general.get('PointsNums', '1001'))
+        params['trace_format'] = general.get('TraceFormat', 'LogMag')
+
         # VNA parameters
-        if 'VNA' in self.config:
-            vna = self.config['VNA']
-            params['start_freq'] = float(vna.get('m_f64StartFreq', '100000'))  # 100 kHz
-            params['stop_freq'] = float(vna.get('m_f64StopFreq', '6500000000'))  # 6.5 GHz
-            params['center_freq'] = float(vna.get('m_f64CentFreq', '3250050000'))  # 3.25 GHz
-            params['span'] = float(vna.get('m_f64Span', '6499900000'))  # 6.5 GHz
-            params['sweep_points'] = int(vna.get('m_s32SweepPoints', '1001'))
-        
+        vna = {**sections['VNA'], **sections['VNAGloble']}
+        params['start_freq'] = float(vna.get('m_f64StartFreq', '100000'))  # 100 kHz
+        params['stop_freq'] = float(vna.get('m_f64StopFreq', '6500000000'))  # 6.5 GHz
+        params['center_freq'] = float(vna.get('m_f64CentFreq', '3250050000'))  # 3.25 GHz
+        params['span'] = float(vna.get('m_f64Span', '6499900000'))  # 6.5 GHz
+        params['sweep_points'] = int(vna.get('m_s32SweepPoints', '1001'))
+
         return params
-    
-    def _extract_trace_data(self):
-        """Extract S21 trace data from the file"""
-        if 'Trace' not in self.config:
-            raise ValueError("No trace data found in file")
-        
-        trace_section = self.config['Trace']
-        size = int(trace_section.get('size', '1001'))
-        
-        # Extract real and imaginary parts
-        real_parts = []
-        imag_parts = []
-        
-        for i in range(1, size + 1):
-            ampy_key = f"{i}\\ampy"
-            ampz_key = f"{i}\\ampz"
-            
-            if ampy_key in trace_section and ampz_key in trace_section:
-                real_parts.append(float(trace_section[ampy_key]))
-                imag_parts.append(float(trace_section[ampz_key]))
-        
-        # Convert to numpy arrays
-        real_parts = np.array(real_parts)
-        imag_parts = np.array(imag_parts)
-        
-        # Create complex S21 data
-        self.s21_complex = real_parts + 1j * imag_parts
-        
-        # Calculate magnitude in dB and phase in degrees
-        self.magnitude_db = 20 * np.log10(np.abs(self.s21_complex))
-        self.phase_degrees = np.angle(self.s21_complex, deg=True)
-        
-        # Create frequency array
-        params = self._extract_parameters()
-        self.frequency = np.linspace(params['start_freq'], params['stop_freq'], size)
-    
+
+    def _source_key(self) -> Tuple[str, int, int]:
+        stat = os.stat(self.filename)
+        return os.path.abspath(self.filename), stat.st_mtime_ns, stat.st_size
+
+    def _load_cache(self) -> bool:
+        """Load the trace from the sidecar file, if it belongs to the current trace file"""
+        path = self.filename + self.cache_suffix
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as cache:
+                source = (str(cache['source']), int(cache['mtime_ns']), int(cache['size']))
+                if source != self._source_key():
+                    return False
+                self.parameters = json.loads(str(cache['parameters']))
+                self.frequency = cache['frequency']
+                self.s21_complex = cache['s21_complex']
+            return True
+        except Exception as e:
+            logger.debug(f"S21 cache {path} is not used: {e}")
+            return False
+
+    def _save_cache(self) -> None:
+        path = self.filename + self.cache_suffix
+        source, mtime_ns, size = self._source_key()
+        try:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as file:
+                np.savez(
+                    file,
+                    source=source,
+                    mtime_ns=mtime_ns,
+                    size=size,
+                    parameters=json.dumps(self.parameters),
+                    frequency=self.frequency,
+                    s21_complex=self.s21_complex,
+                )
+            os.replace(temp_path, path)  # a concurrent reader never sees a partial file
+        except OSError as e:
+            logger.debug(f"S21 cache {path} is not saved: {e}")
+
     def plot_results(self, save_path: str = None):
         """Plot the S21 measurement results"""
+        import matplotlib.pyplot as plt  # only for the plots, slow to import
+
         if self.frequency is None:
             self.parse_file()
         
@@ -182,18 +260,24 @@ class RSA506N_S21_Parser:
             'center_frequency': max_gain_freq
         }
     
-    def save_to_touchstone(self, filename: str):
-        """Save data to Touchstone format (.s2p)"""
+    def save_to_touchstone(self, filename: str, data_format: str = "RI"):
+        """
+        Save data to Touchstone format (.s2p)
+
+        The trace is the S21 of a passive line: S12 is written equal to S21,
+        S11 and S22 as zero (not measured).
+        """
+        from Instruments.touchstone import write_touchstone
+
         if self.frequency is None:
             self.parse_file()
-        
-        with open(filename, 'w') as f:
-            # Write header
-            f.write("! RSA506N VNA S21 Measurement\n")
-            f.write("! Converted from gen_det.txt\n")
-            f.write("# Hz S DB R 50\n")
-            
-            # Write data points
-            for i, freq in enumerate(self.frequency):
-                s21 = self.s21_complex[i]
-                f.write(f"{freq:.0f} {np.real(s21):.6e} {np.imag(s21):.6e}\n")
\ No newline at end of file
+
+        s_parameters = np.zeros((len(self.s21_complex), 2, 2), dtype=complex)
+        s_parameters[:, 1, 0] = s_parameters[:, 0, 1] = self.s21_complex
+        write_touchstone(
+            filename,
+            self.frequency[:len(self.s21_complex)],
+            s_parameters,
+            data_format=data_format,
+            comments=("RSA506N VNA S21 Measurement", f"Converted from {os.path.basename(self.filename)}"),
+        )
@@ -1,5 +1,5 @@
 from Instruments.scpi_instr import Instrument
-import numpy as np
+from Instruments.block_reader import BinaryBlockReader
 import time
 
 
@@ -12,15 +12,13 @@ class RSA5065N(Instrument):
     def __init__(self, ip):
         super().__init__(ip)
         self.type = 'Spectrum Analyzer'
+        self._trace_reader = BinaryBlockReader('>f4')  # REAL,32 with the NORMal byte order
 
 
     @Instrument.device_checking
     def get_trace_data(self):
         try:
-            return self.instr.query_binary_values(":TRACe:DATA? TRACE1", 
-                               datatype='f', 
-                               container=np.ndarray,
-                               is_big_endian=True)
+            return self.query_binary_block(":TRACe:DATA? TRACE1", self._trace_reader)
         except Exception as e:
             logger.error(f"Error reading trace data: {e}")
 
@@ -1,4 +1,5 @@
 from Instruments.visacom import VisaCom
+from Instruments.session_pool import SessionPool
 from functools import wraps
 import numpy as np
 import pyvisa
@@ -25,12 +26,12 @@ class ConnectThread(QThread):
     def run(self):
         self.parent.progress_changed.emit(10)
         try:
-            self.parent.instr = VisaCom.get_visa_resource(VisaCom.get_visa_string_ip(self.parent.ip))
+            self.parent.instr, idn = SessionPool.session(VisaCom.get_visa_string_ip(self.parent.ip, self.parent.transport), self.parent.timeout)
             self.parent.progress_changed.emit(50)
             if self.parent.instr is None:
                 return
             self.parent.initialized = True
-            self.parent.get_model()
+            self.parent.set_idn(idn)  # *IDN? of the session check, not queried again
             logger.info(f"Connected to instrument at {self.parent.ip}")
             self.parent.progress_changed.emit(60)
             
@@ -63,13 +64,16 @@ class Instrument(VisaCom, QObject):
         self.connect_thread = None
         self.ip = None
         self.model = 'None'
+        self.idn = None # *IDN? response of the connected instrument
         self.type = 'No Instrument'
+        self.timeout = SessionPool.default_timeout # ms
+        self.transport = "VXI11" # VisaCom.transports
 
         self.set_ip(ip)
         # TODO: block access to instrument sheet if instrument is not from mylist
 
     def __del__(self):
-        if self.instr is not None:
+        if self.instr is not None and not SessionPool.is_pooled(self.instr): # pooled sessions stay open for reuse
             self.instr.close()
             logger.info(f"Disconnected from {self.model} at {self.ip}")
 
@@ -103,8 +107,12 @@ class Instrument(VisaCom, QObject):
         self.state_changed.emit({'reset': True})
     
     def get_model(self):
-        idn = self.get_idn()
+        self.set_idn(self.get_idn())
+
+    def set_idn(self, idn):
+        """Set the model from the *IDN? response"""
         _, self.model, _, _ = idn.split(',')
+        self.idn = idn
     
     def get_type(self):
         return self.type
@@ -114,6 +122,19 @@ class Instrument(VisaCom, QObject):
             self.ip = ip
             self.state_changed.emit({'ip': self.ip})
 
+    def set_timeout(self, timeout):
+        """I/O timeout in ms"""
+        self.timeout = timeout
+        if self.instr is not None:
+            self.instr.timeout = timeout
+
+    def set_transport(self, transport):
+        """LAN transport of the next connect (VisaCom.transports)"""
+        if transport not in self.transports:
+            logger.error(f"Unknown transport {transport}, expected one of {self.transports}")
+            return
+        self.transport = transport
+
     def get_ip(self):
         if self.is_initialized():
             return self.ip
@@ -129,6 +150,22 @@ class Instrument(VisaCom, QObject):
         self.connect_thread = ConnectThread(self)
         logger.debug(f"{self.__class__.__name__}: connect thread created")
         self.connect_thread.start()
+
+    def connect_blocking(self):
+        """
+        Connect in the calling thread, without the Qt event loop (headless runs).
+
+        Returns: True if the instrument is initialized
+        """
+        if self.connect_thread is not None:
+            logger.debug(f"{self.__class__.__name__}: connect already running")
+            return False
+        self.connect_thread = ConnectThread(self)
+        try:
+            self.connect_thread.run()
+        finally:
+            self.connect_thread = None
+        return self.is_initialized()
         
         
     
\ No newline at end of file
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import pyvisa
+
+from System.logger import get_logger
+logger = get_logger(__name__)
+
+
+class SessionPool:
+    """
+    Process-wide pool of the open VISA sessions
+
+    One pyvisa ResourceManager is shared by the process. A session is opened
+    once per VISA string and reused by the reconnects and the measurement runs.
+    A reused session is checked by one *IDN? round trip and reopened if it is stale,
+    the *IDN? response is returned with the session so a connect costs one round trip.
+    """
+
+    default_timeout = 5000  # ms
+
+    _resource_manager = None
+    _sessions = {}
+    _locks = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def resource_manager(cls):
+        with cls._lock:
+            if cls._resource_manager is None:
+                cls._resource_manager = pyvisa.ResourceManager()
+            return cls._resource_manager
+
+    @classmethod
+    def _session_lock(cls, visa_string):
+        with cls._lock:
+            return cls._locks.setdefault(visa_string, threading.Lock())
+
+    @classmethod
+    def session(cls, visa_string, timeout=None, alternative=False):
+        """
+        Returns the open session of the VISA string and its *IDN? response, opens it if needed
+
+        Parameters:
+            visa_string (str): VISA resource string
+            timeout (int): I/O timeout of the session in ms
+            alternative (bool): Try the alternative terminations on open
+
+        Returns:
+            tuple: (session, *IDN? response), (None, None) if the instrument does not respond
+
+        Raises:
+            pyvisa.errors.VisaIOError: If the instrument does not respond
+        """
+        from Instruments.visacom import VisaCom
+
+        timeout = cls.default_timeout if timeout is None else timeout
+        with cls._session_lock(visa_string):
+            session = cls._sessions.get(visa_string)
+            if session is not None:
+                try:
+                    session.timeout = timeout
+                    idn = session.query('*IDN?').strip()
+                    logger.debug(f"SessionPool: reuse {visa_string}")
+                    return session, idn
+                except pyvisa.errors.VisaIOError as e:
+                    logger.warning(f"SessionPool: stale session {visa_string} ({e}), reopening")
+                    cls._close(visa_string)
+
+            session, idn = VisaCom.get_visa_resource(visa_string, alternative, timeout)
+            if session is not None:
+                cls._sessions[visa_string] = session
+            return session, idn
+
+    @classmethod
+    def open_all(cls, visa_strings, timeouts=None):
+        """
+        Open the sessions of several instruments in parallel
+
+        Parameters:
+            visa_strings (dict): {name: VISA string}
+            timeouts (dict): {name: timeout in ms}
+
+        Returns:
+            dict: {name: session or None if the instrument is not reachable}
+        """
+        timeouts = timeouts or {}
+        sessions = {}
+        with ThreadPoolExecutor(max_workers=max(len(visa_strings), 1)) as executor:
+            futures = {
+                name: executor.submit(cls.session, visa_string, timeouts.get(name))
+                for name, visa_string in visa_strings.items()
+            }
+            for name, future in futures.items():
+                try:
+                    sessions[name], _ = future.result()
+                except Exception as e:
+                    logger.error(f"SessionPool: failed to open {name} at {visa_strings[name]}: {e}")
+                    sessions[name] = None
+        return sessions
+
+    @classmethod
+    def is_pooled(cls, session):
+        return any(pooled is session for pooled in list(cls._sessions.values()))
+
+    @classmethod
+    def _close(cls, visa_string):
+        session = cls._sessions.pop(visa_string, None)
+        if session is not None:
+            try:
+                session.close()
+            except Exception as e:
+                logger.debug(f"SessionPool: close {visa_string}: {e}")
+
+    @classmethod
+    def discard(cls, visa_string):
+        """Close the session of the VISA string"""
+        with cls._session_lock(visa_string):
+            cls._close(visa_string)
+
+    @classmethod
+    def close_all(cls):
+        for visa_string in list(cls._sessions):
+            cls.discard(visa_string)
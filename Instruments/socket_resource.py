@@ -0,0 +1,189 @@
+import socket
+import numpy as np
+import pyvisa
+from pyvisa.constants import StatusCode
+
+from System.logger import get_logger
+logger = get_logger(__name__)
+
+
+class SocketResource:
+    """
+    SCPI session over a raw TCP socket (port 5025) without a VISA library
+
+    Implements the subset of the pyvisa MessageBasedResource interface used by
+    the instrument drivers, including the IEEE 488.2 binary blocks of
+    query_binary_values (e.g. :TRACe:DATA?, CURVE?). There is no RPC per call
+    as with VXI-11 (TCPIP::INSTR), a query is one write and one read of the socket.
+
+    The sessions are opened by the VISA strings RAW::<ip>::<port>.
+    The socket errors and timeouts are raised as pyvisa VisaIOError.
+    """
+
+    PREFIX = "RAW::"
+    default_port = 5025
+    chunk_size = 1 << 16
+    clear_command = "!d"  # device clear of the socket server (Tektronix), no DCL message on a raw socket
+    clear_quiet_time = 0.05  # s
+
+    def __init__(self, host, port=default_port, timeout=5000):
+        self.resource_name = f"{self.PREFIX}{host}::{port}"
+        self.read_termination = "\n"
+        self.write_termination = "\n"
+        self._buffer = bytearray()
+        try:
+            self._socket = socket.create_connection((host, port), timeout / 1000)
+        except OSError as e:
+            raise pyvisa.errors.VisaIOError(StatusCode.error_resource_not_found) from e
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"<SocketResource({self.resource_name!r})>"
+
+    @classmethod
+    def is_socket_string(cls, visa_string):
+        return isinstance(visa_string, str) and visa_string.startswith(cls.PREFIX)
+
+    @classmethod
+    def visa_string(cls, ip, port=default_port):
+        return f"{cls.PREFIX}{ip}::{port}"
+
+    @classmethod
+    def open(cls, visa_string, timeout=5000):
+        """Open the session of a RAW::<ip>::<port> string"""
+        fields = visa_string[len(cls.PREFIX):].split("::")
+        port = int(fields[1]) if len(fields) > 1 and fields[1] else cls.default_port
+        return cls(fields[0], port, timeout)
+
+    @property
+    def timeout(self):
+        """I/O timeout in ms"""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self._timeout = timeout
+        self._socket.settimeout(None if timeout is None else timeout / 1000)
+
+    # Socket I/O
+    def _receive(self):
+        try:
+            data = self._socket.recv(self.chunk_size)
+        except socket.timeout as e:
+            raise pyvisa.errors.VisaIOError(StatusCode.error_timeout) from e
+        except OSError as e:
+            raise pyvisa.errors.VisaIOError(StatusCode.error_connection_lost) from e
+        if not data:
+            raise pyvisa.errors.VisaIOError(StatusCode.error_connection_lost)
+        self._buffer += data
+
+    def _take(self, count):
+        data = bytes(self._buffer[:count])
+        del self._buffer[:count]
+        return data
+
+    def write_raw(self, message):
+        try:
+            self._socket.sendall(message)
+        except socket.timeout as e:
+            raise pyvisa.errors.VisaIOError(StatusCode.error_timeout) from e
+        except OSError as e:
+            raise pyvisa.errors.VisaIOError(StatusCode.error_connection_lost) from e
+        return len(message)
+
+    def write(self, command):
+        return self.write_raw((command + self.write_termination).encode())
+
+    def read_bytes(self, count, **kwargs):
+        while len(self._buffer) < count:
+            self._receive()
+        return self._take(count)
+
+    def read_into(self, view):
+        """Fill the buffer view with the next received bytes (no intermediate copy)"""
+        count = len(view)
+        buffered = min(len(self._buffer), count)
+        view[:buffered] = self._buffer[:buffered]
+        del self._buffer[:buffered]
+        received = buffered
+        while received < count:
+            try:
+                size = self._socket.recv_into(view[received:])
+            except socket.timeout as e:
+                raise pyvisa.errors.VisaIOError(StatusCode.error_timeout) from e
+            except OSError as e:
+                raise pyvisa.errors.VisaIOError(StatusCode.error_connection_lost) from e
+            if not size:
+                raise pyvisa.errors.VisaIOError(StatusCode.error_connection_lost)
+            received += size
+        return count
+
+    def read_raw(self):
+        """Read up to and including the read termination"""
+        termination = self.read_termination.encode()
+        start = 0
+        while True:
+            end = self._buffer.find(termination, start)
+            if end >= 0:
+                return self._take(end + len(termination))
+            start = max(len(self._buffer) - len(termination) + 1, 0)
+            self._receive()
+
+    def read(self, **kwargs):
+        return self.read_raw()[: -len(self.read_termination)].decode(errors="replace")
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def read_binary_block(self, expect_termination=True):
+        """
+        Read an IEEE 488.2 block: #<digits><length><data> (definite length)
+        or #0<data><termination> (indefinite length)
+
+        Returns: the block data as bytes
+        """
+        while True:
+            header = self.read_bytes(1)
+            if header == b"#":
+                break
+            if not header.isspace():  # leading whitespace of some instruments
+                raise pyvisa.errors.InvalidBinaryFormat(f"Expected '#' of a binary block, received {header!r}")
+        digits = int(self.read_bytes(1))
+        if digits == 0:
+            return self.read_raw()[: -len(self.read_termination)]
+        length = int(self.read_bytes(digits))
+        data = self.read_bytes(length)
+        if expect_termination:
+            self.read_raw()
+        return data
+
+    def query_binary_values(self, command, datatype="f", is_big_endian=False, container=list,
+                            expect_termination=True, **kwargs):
+        self.write(command)
+        data = self.read_binary_block(expect_termination)
+        values = np.frombuffer(data, dtype=np.dtype(datatype).newbyteorder(">" if is_big_endian else "<"))
+        if container is np.ndarray:
+            return values
+        return container(values.tolist())
+
+    def clear(self):
+        """Device clear: sends clear_command and discards the input until the line is quiet"""
+        if self.clear_command:
+            self.write(self.clear_command)
+        self._buffer.clear()
+        self._socket.settimeout(self.clear_quiet_time)
+        try:
+            while self._socket.recv(self.chunk_size):
+                pass
+        except OSError:  # includes the timeout of the quiet line
+            pass
+        finally:
+            self.timeout = self._timeout
+
+    def close(self):
+        try:
+            self._socket.close()
+        except OSError as e:
+            logger.debug(f"{self.resource_name}: close: {e}")
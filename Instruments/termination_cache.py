@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+
+from System.logger import get_logger
+logger = get_logger(__name__)
+
+
+class TerminationCache:
+    """
+    Cache of the working VISA connection parameters of every instrument
+
+    The entries are keyed by the instrument serial number (*IDN? field 3) and hold
+    the VISA string, the interface and the read/write terminations that answered.
+    The cache is stored in the settings folder and tried first on connect.
+    """
+
+    settings_folder = "Settings"
+    cache_file = "visa_cache.json"
+
+    _entries = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _path(cls):
+        return os.path.join(cls.settings_folder, cls.cache_file)
+
+    @classmethod
+    def _load(cls):
+        if cls._entries is None:
+            try:
+                with open(cls._path(), "r") as f:
+                    cls._entries = json.load(f)
+            except FileNotFoundError:
+                cls._entries = {}
+            except Exception as e:
+                logger.warning(f"Failed to load VISA cache {cls._path()}: {e}")
+                cls._entries = {}
+        return cls._entries
+
+    @classmethod
+    def _save(cls):
+        try:
+            os.makedirs(cls.settings_folder, exist_ok=True)
+            with open(cls._path(), "w") as f:
+                json.dump(cls._entries, f, indent=4)
+        except Exception as e:
+            logger.warning(f"Failed to save VISA cache {cls._path()}: {e}")
+
+    @classmethod
+    def lookup(cls, visa_string):
+        """
+        Returns the cached (read_termination, write_termination) of the VISA string or None
+        """
+        with cls._lock:
+            for entry in cls._load().values():
+                if entry.get("visa_string") == visa_string:
+                    return entry["read_termination"], entry["write_termination"]
+        return None
+
+    @classmethod
+    def store(cls, visa_string, idn, read_termination, write_termination):
+        """
+        Store the working terminations of the instrument identified by idn (*IDN? response)
+        """
+        fields = [field.strip() for field in idn.split(',')]
+        serial = fields[2] if len(fields) > 2 else visa_string
+        entry = {
+            "visa_string": visa_string,
+            "interface": visa_string.split('::')[0],
+            "read_termination": read_termination,
+            "write_termination": write_termination,
+            "model": fields[1] if len(fields) > 1 else "",
+            "idn": idn,
+        }
+        with cls._lock:
+            entries = cls._load()
+            if entries.get(serial) == entry:
+                return
+            for key in [key for key, value in entries.items() if value.get("visa_string") == visa_string]:
+                del entries[key]  # another instrument was at this address
+            entries[serial] = entry
+            cls._save()
+
+    @classmethod
+    def forget(cls, visa_string):
+        with cls._lock:
+            entries = cls._load()
+            for key in [key for key, value in entries.items() if value.get("visa_string") == visa_string]:
+                del entries[key]
+            cls._save()
@@ -0,0 +1,296 @@
+import os
+import re
+import numpy as np
+from typing import Dict, Any, Sequence
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+FREQUENCY_UNITS = {"HZ": 1.0, "KHZ": 1e3, "MHZ": 1e6, "GHZ": 1e9}
+DATA_FORMATS = ("RI", "MA", "DB")
+TOUCHSTONE_EXTENSION = re.compile(r"\.s(\d+)p$", re.IGNORECASE)
+DB_FLOOR = 1e-20  # |S| written as -400 dB instead of -inf
+
+
+def is_touchstone(path: str) -> bool:
+    """True for the Touchstone file extensions .s1p, .s2p, ... .sNp"""
+    return TOUCHSTONE_EXTENSION.search(path) is not None
+
+
+def ports_from_extension(path: str) -> int | None:
+    match = TOUCHSTONE_EXTENSION.search(path)
+    return int(match.group(1)) if match else None
+
+
+def to_complex(first: np.ndarray, second: np.ndarray, data_format: str) -> np.ndarray:
+    """Complex values of the Touchstone pairs (RI: real, imag; MA: mag, deg; DB: dB, deg)"""
+    if data_format == "RI":
+        return first + 1j * second
+    magnitude = first if data_format == "MA" else 10 ** (first / 20)
+    return magnitude * np.exp(1j * np.deg2rad(second))
+
+
+def from_complex(values: np.ndarray, data_format: str) -> tuple[np.ndarray, np.ndarray]:
+    """Touchstone pairs of the complex values"""
+    if data_format == "RI":
+        return values.real, values.imag
+    magnitude = np.abs(values)
+    if data_format == "DB":
+        magnitude = 20 * np.log10(np.maximum(magnitude, DB_FLOOR))
+    return magnitude, np.angle(values, deg=True)
+
+
+class TouchstoneParser:
+    """
+    Parser of Touchstone 1.x and 2.0 files (.sNp), S-parameters of any number of ports
+
+    The comments and keywords are separated from the data lines, the data is
+    converted with one numpy call and reshaped to (frequencies, ports, ports),
+    so the parsing time hardly depends on the number of points.
+
+    parse_file returns the keys of RSA506N_S21_Parser (FREQUENCY in Hz,
+    S21_COMPLEX, MAGNITUDE_DB, PHASE_DEGREES of S21, S11 for one port files)
+    and S_PARAMETERS with the full matrices. The noise parameters of two-port
+    files are returned as NOISE_DATA rows (frequency in Hz, NFmin dB, |Gopt|,
+    angle Gopt, Rn), None if the file has none.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.parameters = None
+        self.frequency = None
+        self.s_parameters = None
+        self.s21_complex = None
+        self.magnitude_db = None
+        self.phase_degrees = None
+        self.noise_data = None
+
+    def parse_file(self) -> Dict[str, Any]:
+        """Parse the Touchstone file"""
+        with open(self.filename, "r") as file:
+            content = file.read()
+
+        params = {
+            "version": 1.0,
+            "ports": ports_from_extension(self.filename),
+            "unit": "GHZ",  # Touchstone defaults of the option line
+            "parameter": "S",
+            "format": "MA",
+            "z0": 50.0,
+            "two_port_order": "21_12",
+            "matrix_format": "FULL",
+            "comments": [],
+        }
+        data_lines, noise_lines = [], []
+        keyword = None
+        for line in content.splitlines():
+            line, _, comment = line.partition("!")
+            if comment.strip() and not data_lines:
+                params["comments"].append(comment.strip())
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                self._parse_option_line(line, params)
+            elif line.startswith("["):
+                keyword, _, value = line[1:].partition("]")
+                keyword = keyword.strip().upper()
+                self._parse_keyword(keyword, value.strip(), params)
+            elif keyword in (None, "NETWORK DATA"):
+                data_lines.append(line)
+            elif keyword == "NOISE DATA":
+                noise_lines.append(line)
+            elif keyword == "REFERENCE":  # [Reference] values may continue on the next lines
+                params["z0"] = np.atleast_1d(params["z0"]).tolist() + [float(x) for x in line.split()]
+
+        if params["parameter"] != "S":
+            raise ValueError(f"Only S-parameters are supported, the file has {params['parameter']}-parameters")
+        if not params["ports"]:
+            raise ValueError(f"Unknown number of ports of {self.filename}")
+
+        if params["version"] < 2 and params["ports"] == 2:
+            data_lines, noise_lines = self._split_noise_lines(data_lines)
+
+        self.parameters = params
+        self.frequency, self.s_parameters = self._parse_data(" ".join(data_lines), params)
+        self.noise_data = self._parse_noise(" ".join(noise_lines), params) if noise_lines else None
+        self.s21_complex = self.s_parameters[:, 1, 0] if params["ports"] > 1 else self.s_parameters[:, 0, 0]
+        self.magnitude_db = 20 * np.log10(np.abs(self.s21_complex))
+        self.phase_degrees = np.angle(self.s21_complex, deg=True)
+
+        return {
+            "PARAMETERS": self.parameters,
+            "FREQUENCY": self.frequency,
+            "S_PARAMETERS": self.s_parameters,
+            "S21_COMPLEX": self.s21_complex,
+            "MAGNITUDE_DB": self.magnitude_db,
+            "PHASE_DEGREES": self.phase_degrees,
+            "NOISE_DATA": self.noise_data,
+        }
+
+    @staticmethod
+    def _split_noise_lines(lines: list) -> tuple[list, list]:
+        """
+        Network and noise lines of a Touchstone 1.x two-port file
+
+        The noise parameters follow the network data without a keyword,
+        they start at the first frequency not greater than the previous one.
+        """
+        frequency = np.array([line.split(None, 1)[0] for line in lines], dtype=float)
+        restart = np.flatnonzero(np.diff(frequency) <= 0)
+        if not restart.size:
+            return lines, []
+        return lines[: restart[0] + 1], lines[restart[0] + 1 :]
+
+    @staticmethod
+    def _parse_noise(text: str, params: dict) -> np.ndarray:
+        """Noise parameter rows (frequency in Hz, NFmin dB, |Gopt|, angle Gopt, Rn)"""
+        values = np.array(text.split(), dtype=float)
+        if values.size % 5:
+            raise ValueError(f"{values.size} noise values are not a multiple of 5")
+        values = values.reshape(-1, 5)
+        values[:, 0] *= FREQUENCY_UNITS[params["unit"]]
+        return values
+
+    @staticmethod
+    def _parse_option_line(line: str, params: dict) -> None:
+        """# <frequency unit> <parameter> <format> R <reference resistance>"""
+        tokens = line[1:].upper().split()
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in FREQUENCY_UNITS:
+                params["unit"] = token
+            elif token in DATA_FORMATS:
+                params["format"] = token
+            elif token in ("S", "Y", "Z", "H", "G"):
+                params["parameter"] = token
+            elif token == "R" and i + 1 < len(tokens):
+                params["z0"] = float(tokens[i + 1])
+                i += 1
+            i += 1
+
+    @staticmethod
+    def _parse_keyword(keyword: str, value: str, params: dict) -> None:
+        """Keywords of Touchstone 2.0"""
+        if keyword == "VERSION":
+            params["version"] = float(value)
+        elif keyword == "NUMBER OF PORTS":
+            params["ports"] = int(value)
+        elif keyword == "TWO-PORT DATA ORDER":
+            params["two_port_order"] = value
+        elif keyword == "MATRIX FORMAT":
+            params["matrix_format"] = value.upper()
+        elif keyword == "REFERENCE" and value:
+            params["z0"] = [float(x) for x in value.split()]
+        elif keyword == "NUMBER OF FREQUENCIES":
+            params["frequencies"] = int(value)
+
+    @staticmethod
+    def _parse_data(text: str, params: dict) -> tuple[np.ndarray, np.ndarray]:
+        """Frequencies (Hz) and the S-matrices (frequencies, ports, ports) of the data text"""
+        ports = params["ports"]
+        matrix_format = params["matrix_format"]
+        if matrix_format == "FULL":
+            rows, cols = np.divmod(np.arange(ports * ports), ports)
+        else:  # LOWER or UPPER triangle, row by row
+            rows, cols = np.tril_indices(ports) if matrix_format == "LOWER" else np.triu_indices(ports)
+        if ports == 2 and matrix_format == "FULL" and params["two_port_order"] == "21_12":  # S11 S21 S12 S22
+            rows, cols = cols, rows
+
+        values = np.array(text.split(), dtype=float)
+        columns = 1 + 2 * len(rows)
+        if values.size % columns:
+            raise ValueError(
+                f"{values.size} data values are not a multiple of {columns} "
+                f"(frequency and {len(rows)} pairs of a {ports}-port file)"
+            )
+        values = values.reshape(-1, columns)
+        frequency = values[:, 0] * FREQUENCY_UNITS[params["unit"]]
+        pairs = to_complex(values[:, 1::2], values[:, 2::2], params["format"])
+
+        s_parameters = np.zeros((len(frequency), ports, ports), dtype=complex)
+        s_parameters[:, rows, cols] = pairs
+        if matrix_format != "FULL":
+            s_parameters[:, cols, rows] = pairs
+        return frequency, s_parameters
+
+
+def write_touchstone(
+    filename: str,
+    frequency: np.ndarray,
+    s_parameters: np.ndarray,
+    data_format: str = "RI",
+    unit: str = "Hz",
+    z0: float = 50.0,
+    comments: Sequence[str] = (),
+    version: int = 1,
+) -> None:
+    """
+    Write S-parameters to a Touchstone file.
+
+    Parameters:
+        filename (str): The .sNp file name
+        frequency (np.ndarray): Frequencies in Hz
+        s_parameters (np.ndarray): Complex S-matrices (frequencies, ports, ports)
+        data_format (str): RI, MA or DB
+        unit (str): Frequency unit of the file: Hz, kHz, MHz or GHz
+        z0 (float): Reference resistance
+        comments (Sequence[str]): Header comment lines
+        version (int): 1 - Touchstone 1.1, 2 - Touchstone 2.0 keywords
+    """
+    data_format = data_format.upper()
+    if data_format not in DATA_FORMATS:
+        raise ValueError(f"Unknown Touchstone format {data_format}, expected one of {DATA_FORMATS}")
+    frequency = np.asarray(frequency, dtype=float)
+    s_parameters = np.asarray(s_parameters, dtype=complex)
+    if s_parameters.ndim == 1:
+        s_parameters = s_parameters.reshape(-1, 1, 1)
+    ports = s_parameters.shape[1]
+    if s_parameters.shape != (len(frequency), ports, ports):
+        raise ValueError(f"S-parameters shape {s_parameters.shape} does not match {len(frequency)} frequencies")
+
+    if ports == 2:  # S11 S21 S12 S22 (Touchstone 1 order, 21_12 of Touchstone 2)
+        s_parameters = s_parameters.transpose(0, 2, 1)
+    first, second = from_complex(s_parameters.reshape(len(frequency), -1), data_format)
+    pairs = np.empty((len(frequency), 2 * ports * ports))
+    pairs[:, 0::2], pairs[:, 1::2] = first, second
+    scaled_frequency = frequency / FREQUENCY_UNITS[unit.upper()]
+
+    with open(filename, "w") as f:
+        for comment in comments:
+            f.write(f"! {comment}\n")
+        if version == 2:
+            f.write("[Version] 2.0\n")
+        f.write(f"# {unit} S {data_format} R {z0:g}\n")
+        if version == 2:
+            f.write(f"[Number of Ports] {ports}\n")
+            if ports == 2:
+                f.write("[Two-Port Data Order] 21_12\n")
+            f.write(f"[Number of Frequencies] {len(frequency)}\n")
+            f.write("[Network Data]\n")
+
+        if ports <= 2:  # one line per frequency
+            np.savetxt(f, np.column_stack((scaled_frequency, pairs)), fmt="%.12g", delimiter=" ")
+        else:  # a line per matrix row, at most 4 pairs per line (Touchstone 1)
+            row_chunks = [(row * 2 * ports + start, row * 2 * ports + min(start + 8, 2 * ports))
+                          for row in range(ports) for start in range(0, 2 * ports, 8)]
+            for i, freq in enumerate(scaled_frequency):
+                for j, (start, stop) in enumerate(row_chunks):
+                    prefix = f"{freq:.12g} " if j == 0 else "    "
+                    f.write(prefix + " ".join(f"{value:.12g}" for value in pairs[i, start:stop]) + "\n")
+
+        if version == 2:
+            f.write("[End]\n")
+    logger.debug(f"Touchstone file {os.path.basename(filename)} saved: {len(frequency)} points, {ports} ports")
+
+
+def s21_parser(path: str) -> object:
+    """Parser of an S21 file: TouchstoneParser for .sNp, RSA506N_S21_Parser for the RSA5000 .trs files"""
+    if is_touchstone(path):
+        return TouchstoneParser(path)
+    from Instruments.rsa5000vna_parcer import RSA506N_S21_Parser
+
+    return RSA506N_S21_Parser(path)
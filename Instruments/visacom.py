@@ -2,8 +2,15 @@ import logging
 import time
 import pyvisa
 
-from System.logger import get_logger
+from Instruments.Simulator.sim_bench import SimBench
+from Instruments.session_pool import SessionPool
+from Instruments.termination_cache import TerminationCache
+from Instruments.socket_resource import SocketResource
+
+from System.logger import get_logger, scpi_history
+from System.tracer import tracer
 logger = get_logger(__name__)
+scpi_logger = get_logger("Instruments.scpi")  # SCPI traffic, off by default (log_settings.json LEVELS)
 
 class VisaCom():
     def __init__(self):
@@ -18,83 +25,143 @@ class VisaCom():
         """
 
         try:     
+            start = time.perf_counter()
             if "?" in command:
                 response = self.instr.query(command).strip() # return ASCII string
                 command_type = 'QUERY'        
+                size = len(response)
             else:
-                response = f"bytes written: {self.instr.write(command)}" # return INT (number of bytes written)
+                size = self.instr.write(command)
+                response = f"bytes written: {size}" # return INT (number of bytes written)
                 command_type = 'WRITE'
-            
-            logger.info(f"{self.instr} sending {command_type} command >> {command} -> {response}")
+            tracer.command(self.__class__.__name__, command_type, command, size, start, time.perf_counter() - start)
+            scpi_history.record(self.__class__.__name__, command_type, command, response)
+
+            scpi_logger.debug("%s sending %s command >> %s -> %s", self.instr, command_type, command, response)
             return response
             
         except pyvisa.errors.VisaIOError as e:
             logger.error(f"Error communicating with instrument: {e}")
+            scpi_history.record(self.__class__.__name__, 'ERROR', command, e)
+            scpi_history.dump(logger, f"{self.__class__.__name__} {command}")
             return
 
+    def query_binary_values(self, command, **kwargs):
+        """
+            Send SCPI query with the response in a binary block
+
+            The keyword arguments are passed to pyvisa query_binary_values
+        """
+        start = time.perf_counter()
+        data = self.instr.query_binary_values(command, **kwargs)
+        size = getattr(data, 'nbytes', len(data))
+        tracer.command(self.__class__.__name__, 'BINARY', command, size, start, time.perf_counter() - start)
+        scpi_history.record(self.__class__.__name__, 'BINARY', command, size)
+
+        scpi_logger.debug("%s sending BINARY command >> %s -> %d bytes", self.instr, command, size)
+        return data
+
+    def query_binary_block(self, command, reader, expect_termination=True, blocks=1):
+        """
+            Send SCPI query with the response in a binary block read by the BinaryBlockReader
+
+            With blocks > 1 the response is read as that many blocks separated by ';'
+            into one (blocks, points) array.
+            Returns the data as a view of the reader buffer (valid until its next read)
+        """
+        start = time.perf_counter()
+        data = reader.query(self.instr, command, expect_termination, blocks)
+        tracer.command(self.__class__.__name__, 'BINARY', command, data.nbytes, start, time.perf_counter() - start)
+        scpi_history.record(self.__class__.__name__, 'BINARY', command, data.nbytes)
+
+        scpi_logger.debug("%s sending BINARY command >> %s -> %d bytes", self.instr, command, data.nbytes)
+        return data
+
+    # LAN transports: VXI11 - VXI-11 RPC (TCPIP::INSTR), SOCKET - raw socket by the VISA library,
+    # RAW - raw socket by SocketResource (no VISA library)
+    transports = ("VXI11", "SOCKET", "RAW")
+
     @staticmethod
-    def get_visa_string_ip(ip):
+    def get_visa_string_ip(ip, transport="VXI11"):
         """
             Create VISA string for LAN connection
+
+            The simulated instruments keep their SIM:: VISA string
         """
+        if SimBench.is_sim_string(ip):
+            return ip
+        if transport == "SOCKET":
+            return f'TCPIP0::{ip}::{SocketResource.default_port}::SOCKET'
+        if transport == "RAW":
+            return SocketResource.visa_string(ip)
         return f'TCPIP0::{ip}::INSTR'
 
     @staticmethod
-    def get_visa_resource(visa_string, alternative=False):
+    def get_visa_resource(visa_string, alternative=False, timeout=5000):
         """
         Check connect to remote instrument
+
+        The session is opened by the process-wide resource manager,
+        use SessionPool.session to reuse the open sessions
+
+        Returns: session and *IDN? response, (None, None) if the instrument does not respond
         """
+        if SimBench.is_sim_string(visa_string):
+            inst = SimBench.instance().open_resource(visa_string)
+            return inst, inst.query('*IDN?').strip()
+
+        if SocketResource.is_socket_string(visa_string):
+            try:
+                inst = SocketResource.open(visa_string, timeout)
+                idn = inst.query('*IDN?').strip()
+                logger.info(f"Instrument identified as: {idn}")
+                return inst, idn
+            except pyvisa.errors.VisaIOError as e:
+                logger.error(f"Error communicating with {visa_string}: {e}")
+                if alternative:
+                    raise
+                return None, None
+
         if 'TCPIP' or 'USB' in visa_string:
             interface = visa_string.split('::')[0]
         else:
             logger.error("Invalid VISA string format")
-            return
+            return None, None
 
         try:
-            # Create a resource manager
-            rm = pyvisa.ResourceManager()
-            
+            # Shared resource manager
+            rm = SessionPool.resource_manager()
+
+            # Cached terminations: one *IDN? round trip
+            cached = TerminationCache.lookup(visa_string)
+            if cached is not None:
+                try:
+                    inst, idn = VisaCom.open_session(rm, visa_string, timeout, *cached)
+                    logger.info(f"Instrument identified as: {idn} (cached termination {cached[0]!r}/{cached[1]!r})")
+                    TerminationCache.store(visa_string, idn, *cached)
+                    return inst, idn
+                except pyvisa.errors.VisaIOError as e:
+                    logger.warning(f"Cached termination failed for {interface}: {e}")
+                    TerminationCache.forget(visa_string)
+
+            terminations = [('\n', '\n')]  # Common termination characters
+            if alternative:
+                terminations += [('\r\n', '\r\n'), ('\r', '\r')] # \r\n - Windows standard, \r - old \n - modern instruments
+
             try:
                 logger.info(f"Trying to connect to: {interface}")
-                
-                inst = rm.open_resource(visa_string)
-                logger.info(f'{inst}')
-                inst.timeout = 5000  # 5-second timeout
-                inst.read_termination = '\n'  # Common termination characters
-                inst.write_termination = '\n'
-                
-                time.sleep(0.1)
-                
-                idn = inst.query('*IDN?').strip()
-                logger.info(f"Instrument identified as: {idn}")
-                
-                return inst
-                
+                inst, idn, (read_term, write_term) = VisaCom.probe_terminations(rm, visa_string, timeout, terminations)
+                logger.info(f"Instrument identified as: {idn} (termination {read_term!r}/{write_term!r})")
+                TerminationCache.store(visa_string, idn, read_term, write_term)
+                return inst, idn
+
             except pyvisa.errors.VisaIOError as e:
                 logger.error(f"Error communicating with {interface}: {e}")
                 if alternative:
-                    logger.info("Trying alternative termination characters...")
-                    
-                    # Try different termination characters
-                    for read_term, write_term in [('\r\n', '\r\n'), ('\r', '\r'), ('\n', '\n')]: # \r\n - Windows standard, \r - old \n - modern instruments
-                        try:
-                            if 'inst' in locals():
-                                inst.close()
-                            
-                            inst = rm.open_resource(visa_string)
-                            inst.timeout = 5000
-                            inst.read_termination = read_term
-                            inst.write_termination = write_term
-                            
-                            time.sleep(0.1)
-                            idn = inst.query('*IDN?').strip()
-                            logger.info(f"Success with termination {repr(read_term)}/{repr(write_term)}: {idn}")
-                            return inst
-                            
-                        except pyvisa.errors.VisaIOError:
-                            logger.error(f"All termination character combinations failed for {interface}")
-                            raise
-                        
+                    logger.error(f"All termination character combinations failed for {interface}")
+                    raise
+                return None, None
+
             except Exception as e:
                 logger.error(f"Unexpected error with {interface}: {e}")
                 raise
@@ -102,4 +169,42 @@ class VisaCom():
         except Exception as e:
             logger.error(f"Failed to initialize resource manager: {e}") 
             logger.warning("Could not identify any instruments")
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def open_session(rm, visa_string, timeout, read_termination, write_termination, settle=0):
+        """
+        Open a session with the terminations and identify the instrument
+
+        Returns: session and *IDN? response
+        """
+        inst = rm.open_resource(visa_string)
+        try:
+            inst.timeout = timeout  # ms
+            inst.read_termination = read_termination
+            inst.write_termination = write_termination
+            time.sleep(settle)
+            return inst, inst.query('*IDN?').strip()
+        except Exception:
+            inst.close()
+            raise
+
+    @staticmethod
+    def probe_terminations(rm, visa_string, timeout, terminations):
+        """
+        Try the terminations one after another, the first answering session is kept
+
+        The probes are not concurrent: a second session could read the responses
+        of the first one, and many LAN instruments accept only one connection.
+
+        Returns: session, *IDN? response and (read_termination, write_termination)
+        """
+        error = None
+        for termination in terminations:
+            try:
+                inst, idn = VisaCom.open_session(rm, visa_string, timeout, *termination, settle=0.1)
+                return inst, idn, termination
+            except pyvisa.errors.VisaIOError as e:
+                logger.debug(f"Termination {termination[0]!r}/{termination[1]!r} failed: {e}")
+                error = e
+        raise error
\ No newline at end of file
@@ -0,0 +1,292 @@
+import numpy as np
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+KNOT_STEP = 1e-6  # dB between the padding knots after the last measured knot of a row
+
+
+def dbm_to_mw(level):
+    return 10 ** (np.asarray(level, dtype=float) / 10)
+
+
+def row_intervals(xp: np.ndarray, x: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Flat index (row * N + i) of the interval xp[row, i] <= x < xp[row, i + 1] of every x
+
+    The nondecreasing rows of xp (R, N) are searched at once, shifted apart by the
+    row index. x is clamped to the ends of its row, the index to the first and the
+    last interval. rows is the row of every x, broadcast with x.
+    """
+    knots = xp.shape[1]
+    first, last = xp[rows, 0], xp[rows, -1]
+    span = np.nanmax(xp) - np.nanmin(xp) + 1.0
+    shifted = (xp - xp[:, :1] + np.arange(len(xp))[:, None] * span).ravel()
+    start = rows * knots
+    flat = np.searchsorted(shifted, np.clip(x, first, last) - first + rows * span, side="right") - 1
+    return np.clip(flat, start, start + knots - 2)
+
+
+def pad_knots(knots: np.ndarray, count: np.ndarray, width: int) -> np.ndarray:
+    """
+    PCHIP knots (R, N, 3) with count measured knots per row padded to width knots
+
+    The padding knots follow the last measured knot KNOT_STEP dB apart on its
+    extrapolation line (same slope), so the curve of the row is unchanged.
+    """
+    rows, end = np.arange(len(knots)), np.asarray(count) - 1
+    index = np.arange(width)
+    padded = (index > end[:, None])[..., None]
+    x_end, y_end, d_end = (value[:, None] for value in np.moveaxis(knots[rows, end], -1, 0))
+    x = x_end + (index - end[:, None]) * KNOT_STEP
+    padding = np.stack((x, y_end + d_end * (x - x_end), np.broadcast_to(d_end, x.shape)), axis=-1)
+    extended = np.concatenate((knots, padding[:, knots.shape[1]:]), axis=1)
+    return np.where(padded, padding, extended)
+
+
+class DetectorModel:
+    """
+    Fitted detector transfer curves V(P) of a set of frequencies
+
+    SQUARE_LINEAR - piecewise model continuous at the transition power Pt (mW),
+    COEFFICIENTS (F, 4) = (offset, k, c, Pt):
+        V = offset + k * min(P, Pt) + c * max(sqrt(P) - sqrt(Pt), 0)
+    square law (V ~ P) below Pt, linear (V ~ sqrt(P), i.e. the RF amplitude) above.
+
+    PCHIP - monotone cubic Hermite spline of V over the power in dBm,
+    KNOTS (F, L, 3) = (level dBm, V, dV/dlevel) of every knot.
+
+    RMS and MAX_ERROR are the relative voltage errors of the fit at the measured points,
+    LEVEL_RANGE (F, 2) the lowest and the highest measured level of every frequency.
+    """
+
+    MODELS = ("SQUARE_LINEAR", "PCHIP")
+
+    def __init__(self, model: str, frequencies: np.ndarray, parameters: np.ndarray,
+                 rms: np.ndarray = None, max_error: np.ndarray = None, level_range: np.ndarray = None) -> None:
+        if model not in self.MODELS:
+            raise ValueError(f"Unknown detector model {model}, expected one of {self.MODELS}")
+        self.model = model
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.parameters = np.asarray(parameters, dtype=float)  # COEFFICIENTS or KNOTS
+        nan = np.full(len(self.frequencies), np.nan)
+        self.rms = nan if rms is None else np.asarray(rms, dtype=float)
+        self.max_error = nan if max_error is None else np.asarray(max_error, dtype=float)
+        self.level_range = np.stack((nan, nan), axis=1) if level_range is None else np.asarray(level_range, dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.frequencies)
+
+    def voltage(self, level, rows=None) -> np.ndarray:
+        """
+        Detector voltage at the input power level (dBm).
+
+        Parameters:
+            level (array_like): Power levels, dBm
+            rows (array_like): Frequency indexes of the levels, broadcast with level.
+                None: level of shape (F, ...) or broadcastable to it, row i for frequency i
+
+        Returns:
+            np.ndarray: The voltages, shape of the broadcast level and rows
+        """
+        level = np.asarray(level, dtype=float)
+        if rows is None:
+            rows = np.arange(len(self)).reshape((-1,) + (1,) * max(level.ndim - 1, 0))
+        level, rows = np.broadcast_arrays(level, np.asarray(rows))
+        if self.model == "SQUARE_LINEAR":
+            return self._square_linear(self.parameters[rows], dbm_to_mw(level))
+        return self._pchip(level, rows)
+
+    @staticmethod
+    def _square_linear(coefficients: np.ndarray, power: np.ndarray) -> np.ndarray:
+        offset, k, c, transition = np.moveaxis(coefficients, -1, 0)
+        return offset + k * np.minimum(power, transition) + c * np.maximum(np.sqrt(power) - np.sqrt(transition), 0.0)
+
+    def _pchip(self, level: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        x, y, d = np.moveaxis(self.parameters, -1, 0)  # (F, L)
+        knots = x.shape[1]
+        first, last = x[:, 0][rows], x[:, -1][rows]
+        clipped = np.clip(level, first, last)
+        start = rows * knots
+        flat = row_intervals(x, clipped, rows)
+
+        # the knots are gathered by the flat index, much faster than by (rows, i) on large grids
+        x, y, d = x.ravel(), y.ravel(), d.ravel()
+        x0 = x[flat]
+        h = x[flat + 1] - x0
+        t = (clipped - x0) / h
+        h00, h10 = (1 + 2 * t) * (1 - t) ** 2, t * (1 - t) ** 2
+        h01, h11 = t ** 2 * (3 - 2 * t), t ** 2 * (t - 1)
+        volts = h00 * y[flat] + h10 * h * d[flat] + h01 * y[flat + 1] + h11 * h * d[flat + 1]
+        # linear extrapolation with the end slopes
+        end = start + knots - 1
+        volts = np.where(level < first, y[start] + d[start] * (level - first), volts)
+        return np.where(level > last, y[end] + d[end] * (level - last), volts)
+
+    def save(self, path: str) -> None:
+        """Save the model as .npz"""
+        np.savez(
+            path,
+            model=self.model,
+            frequencies=self.frequencies,
+            parameters=self.parameters,
+            rms=self.rms,
+            max_error=self.max_error,
+            level_range=self.level_range,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "DetectorModel":
+        with np.load(path, allow_pickle=False) as data:
+            # models saved before the level range was recorded get NaN (unknown range)
+            level_range = data["level_range"] if "level_range" in data.files else None
+            return cls(
+                str(data["model"]), data["frequencies"], data["parameters"],
+                data["rms"], data["max_error"], level_range,
+            )
+
+
+class DetectorFit:
+    """
+    Fitting of the detector transfer curves V(P) of all frequencies at once
+
+    SQUARE_LINEAR: for every candidate transition power the model is linear in
+    (offset, k, c), the weighted normal equations of all frequencies are solved
+    in one batched call, the candidate with the least squared error is kept
+    per frequency and refined on a finer grid around it. PCHIP: the Fritsch-Carlson derivatives of all frequencies
+    are computed as array operations, the voltages are made monotone first.
+
+    The errors are weighted relative to the voltage (weighting="relative"),
+    so the square law region of a few mV counts as much as the linear region.
+    """
+
+    def __init__(self, model: str = "SQUARE_LINEAR", transitions=None, weighting: str = "relative",
+                 voltage_floor: float = 1e-3) -> None:
+        if model not in DetectorModel.MODELS:
+            raise ValueError(f"Unknown detector model {model}, expected one of {DetectorModel.MODELS}")
+        self.model = model
+        # candidate transition levels (dBm), refined by refine_offsets around the best candidate
+        self.transitions = np.arange(-30.0, 10.5, 2.0) if transitions is None else np.asarray(transitions, dtype=float)
+        self.refine_offsets = np.arange(-1.5, 1.6, 0.5)
+        self.weighting = weighting
+        self.voltage_floor = voltage_floor  # V, limit of the relative weights
+
+    def fit(self, frequencies: np.ndarray, level: np.ndarray, volts: np.ndarray) -> DetectorModel:
+        """
+        Fit the transfer curves.
+
+        Parameters:
+            frequencies (np.ndarray): Frequencies (F,), Hz
+            level (np.ndarray): Detector input power (F, L), dBm, NaN - no point
+            volts (np.ndarray): Detector voltages (F, L), V
+
+        Returns:
+            DetectorModel: The fitted model
+        """
+        level = np.atleast_2d(np.asarray(level, dtype=float))
+        volts = np.atleast_2d(np.asarray(volts, dtype=float))
+        valid = ~(np.isnan(level) | np.isnan(volts))
+        if self.model == "SQUARE_LINEAR":
+            parameters = self._fit_square_linear(level, volts, valid)
+        else:
+            parameters = self._fit_pchip(level, volts, valid)
+
+        model = DetectorModel(self.model, frequencies, parameters)
+        fitted = model.voltage(np.where(valid, level, 0.0))
+        errors = np.where(valid, np.abs(fitted - volts) / np.maximum(np.abs(volts), self.voltage_floor), np.nan)
+        model.rms = np.sqrt(np.nanmean(errors ** 2, axis=1))
+        model.max_error = np.nanmax(errors, axis=1)
+        model.level_range = np.stack((np.nanmin(level, axis=1), np.nanmax(level, axis=1)), axis=1)
+        logger.debug(
+            f"DetectorFit: {self.model} of {len(model)} frequencies, max relative error {np.nanmax(model.max_error):.3g}"
+        )
+        return model
+
+    def _weights(self, volts: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        if self.weighting == "relative":
+            weights = 1 / np.maximum(np.abs(np.nan_to_num(volts)), self.voltage_floor)
+        else:
+            weights = np.ones(volts.shape)
+        return np.where(valid, weights, 0.0)
+
+    def _fit_square_linear(self, level: np.ndarray, volts: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        power = np.where(valid, dbm_to_mw(np.nan_to_num(level)), 0.0)
+        weights = self._weights(volts, valid)
+        target = np.nan_to_num(volts) * weights
+
+        # the candidate transitions, then a finer search around the best one of every frequency
+        best_error = np.full(len(power), np.inf)
+        best = np.zeros((len(power), 4))
+        best_level = np.zeros(len(power))
+        searches = [np.broadcast_to(transition, len(power)) for transition in self.transitions]
+        for searched in range(2):
+            for transition_level in searches:
+                transition = dbm_to_mw(transition_level)
+                coefficients, error = self._solve_square_linear(power, weights, target, transition)
+                better = error < best_error
+                best_error[better] = error[better]
+                best[better, :3] = coefficients[better]
+                best[better, 3] = transition[better]
+                best_level[better] = transition_level[better]
+            searches = [best_level + offset for offset in self.refine_offsets]
+        return best
+
+    @staticmethod
+    def _solve_square_linear(power: np.ndarray, weights: np.ndarray, target: np.ndarray, transition: np.ndarray) -> tuple:
+        """Weighted least squares of (offset, k, c) for the transitions (F,) of the frequencies"""
+        transition = transition[:, None]
+        basis = np.stack(
+            (weights, np.minimum(power, transition) * weights, np.maximum(np.sqrt(power) - np.sqrt(transition), 0.0) * weights),
+            axis=1,
+        )  # (F, 3, L)
+        normal = basis @ basis.transpose(0, 2, 1)
+        normal += np.eye(3) * (1e-12 * np.trace(normal, axis1=1, axis2=2))[:, None, None]  # no points above Pt
+        coefficients = np.linalg.solve(normal, basis @ target[..., None])[..., 0]
+        residual = (coefficients[:, None, :] @ basis)[:, 0, :] - target
+        return coefficients, np.sum(residual ** 2, axis=1)
+
+    def _fit_pchip(self, level: np.ndarray, volts: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        complete = valid.all(axis=1)
+        if not complete.all():
+            logger.warning(f"DetectorFit: {np.count_nonzero(~complete)} frequencies with missing points, fitted by the points they have")
+        # the missing points are padded after the last measured point (pad_knots), so every row has L knots;
+        # the derivatives are taken on the measured knots and the padding lies on the extrapolation line
+        order = np.argsort(np.where(valid, level, np.inf), axis=1)
+        x = np.take_along_axis(np.where(valid, level, np.nan), order, axis=1)
+        y = np.take_along_axis(np.where(valid, volts, np.nan), order, axis=1)
+        count = valid.sum(axis=1)
+        if (count < 2).any():
+            raise ValueError("PCHIP fit needs at least two points at every frequency")
+        x, y, _ = np.moveaxis(pad_knots(np.stack((x, y, np.zeros(x.shape)), axis=-1), count, x.shape[1]), -1, 0)
+        y = np.maximum.accumulate(y, axis=1)  # monotone voltages
+
+        h = np.diff(x, axis=1)
+        delta = np.diff(y, axis=1) / h
+        d = np.zeros(x.shape)
+        rows, end = np.arange(len(x)), count - 1
+        if x.shape[1] > 2:
+            w1 = 2 * h[:, 1:] + h[:, :-1]
+            w2 = h[:, 1:] + 2 * h[:, :-1]
+            same_sign = delta[:, :-1] * delta[:, 1:] > 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                harmonic = (w1 + w2) / (w1 / delta[:, :-1] + w2 / delta[:, 1:])
+            d[:, 1:-1] = np.where(same_sign, harmonic, 0.0)
+            d[:, 0] = self._pchip_end(h[:, 0], h[:, 1], delta[:, 0], delta[:, 1])
+            last_interval = np.maximum(end, 2) - 1
+            d[rows, end] = self._pchip_end(h[rows, last_interval], h[rows, last_interval - 1],
+                                           delta[rows, last_interval], delta[rows, last_interval - 1])
+            two_points = count == 2
+            d[two_points] = delta[two_points, :1]  # linear
+        else:
+            d[:, 0] = d[:, 1] = delta[:, 0]
+        return pad_knots(np.stack((x, y, d), axis=-1), count, x.shape[1])
+
+    @staticmethod
+    def _pchip_end(h0: np.ndarray, h1: np.ndarray, delta0: np.ndarray, delta1: np.ndarray) -> np.ndarray:
+        """Shape preserving three-point end derivative"""
+        d = ((2 * h0 + h1) * delta0 - h0 * delta1) / (h0 + h1)
+        d = np.where(np.sign(d) != np.sign(delta0), 0.0, d)
+        limit = (np.sign(delta0) != np.sign(delta1)) & (np.abs(d) > 3 * np.abs(delta0))
+        return np.where(limit, 3 * delta0, d)
@@ -0,0 +1,213 @@
+import bisect
+import math
+
+import numpy as np
+
+from .detector_fit import DetectorFit, DetectorModel, row_intervals
+from .results import load_results, detector_level, group_by_frequency
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def interp_rows(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> np.ndarray:
+    """
+    np.interp of every row: x (R, M) in the nondecreasing xp (R, N) with the values fp (R, N)
+
+    The rows are searched at once (row_intervals of the detector fit).
+    The values outside a row are clamped to its ends, as np.interp does.
+    """
+    rows = np.arange(len(xp))[:, None]
+    x = np.clip(x, xp[:, :1], xp[:, -1:])
+    i = row_intervals(xp, x, rows) - rows * xp.shape[1]
+
+    x0, x1 = np.take_along_axis(xp, i, axis=1), np.take_along_axis(xp, i + 1, axis=1)
+    f0, f1 = np.take_along_axis(fp, i, axis=1), np.take_along_axis(fp, i + 1, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(x1 > x0, (x - x0) / (x1 - x0), 0.0)
+    return f0 + t * (f1 - f0)
+
+
+class CalibrationLookup:
+    """
+    Inverse detector calibration: input power (dBm) of a detector voltage at a frequency
+
+    The table holds the power on a frequency x voltage grid: the frequencies of
+    the calibration run and a linear or logarithmic voltage axis. The power is
+    interpolated bilinearly in frequency and voltage, the values outside the grid
+    are clamped to its edges. The voltage index is computed arithmetically, only
+    the frequency axis is searched, so power() handles millions of samples per call.
+
+    power_at() is the scalar path for single lookups without numpy overhead.
+    """
+
+    def __init__(self, frequencies: np.ndarray, volts: np.ndarray, table: np.ndarray, spacing: str = "log") -> None:
+        """
+        Parameters:
+            frequencies (np.ndarray): Increasing frequencies of the table rows (F,), Hz
+            volts (np.ndarray): Evenly spaced (spacing linear or log) voltages of the columns (V,), V
+            table (np.ndarray): Input power (F, V), dBm
+            spacing (str): linear or log, spacing of the voltage axis
+        """
+        if spacing not in ("linear", "log"):
+            raise ValueError(f"Unknown voltage spacing {spacing}, expected linear or log")
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.volts = np.asarray(volts, dtype=float)
+        self.table = np.asarray(table, dtype=float)
+        self.spacing = spacing
+        if self.table.shape != (len(self.frequencies), len(self.volts)):
+            raise ValueError(f"Table shape {self.table.shape} does not match the axes")
+
+        axis = np.log(self.volts) if spacing == "log" else self.volts
+        self._volt_min = float(self.volts[0])
+        self._axis_start = float(axis[0])
+        self._axis_step = float(axis[1] - axis[0])
+        # the scalar path works on Python lists
+        self._frequency_list = self.frequencies.tolist()
+        self._rows = self.table.tolist()
+
+    @classmethod
+    def from_model(cls, model: DetectorModel, points: int = 1024, spacing: str = "log",
+                   volt_range: tuple = None, level_range: tuple = None, oversampling: int = 4) -> "CalibrationLookup":
+        """
+        Tabulate the inverse of a fitted detector model.
+
+        The voltage of every frequency is evaluated on a dense power grid, made
+        monotone and inverted by interpolation at the voltages of the table.
+
+        Parameters:
+            model (DetectorModel): The fitted transfer curves
+            points (int): Number of voltages of the table
+            spacing (str): linear or log voltage axis
+            volt_range (tuple): (min, max) voltage of the table, V. Default: the range of the model
+            level_range (tuple): (min, max) power of the inversion, dBm. Default: the calibrated range
+            oversampling (int): Points of the dense power grid per table voltage
+        """
+        levels, curves = cls.inverse_curves(model, level_range, points * oversampling)
+        if volt_range is None:
+            volt_range = cls.curves_volt_range(curves, spacing)
+        if spacing == "log":
+            volts = np.geomspace(*volt_range, points)
+        else:
+            volts = np.linspace(*volt_range, points)
+
+        table = interp_rows(np.broadcast_to(volts, (len(model), points)), curves, np.broadcast_to(levels, curves.shape))
+        order = np.argsort(model.frequencies)
+        return cls(model.frequencies[order], volts, table[order], spacing)
+
+    @classmethod
+    def inverse_curves(cls, model: DetectorModel, level_range: tuple = None, levels: int = 4096) -> tuple:
+        """
+        Monotone voltages of every model row on a dense power grid.
+
+        Returns:
+            tuple: (power grid (levels,), dBm, voltages (F, levels), V) in the order of the model rows
+        """
+        if level_range is None:
+            level_range = cls._model_level_range(model)
+        grid = np.linspace(*level_range, levels)
+        curves = np.maximum.accumulate(model.voltage(np.broadcast_to(grid, (len(model), levels))), axis=1)
+        return grid, curves
+
+    @staticmethod
+    def curves_volt_range(curves: np.ndarray, spacing: str = "log") -> tuple:
+        """(min, max) voltage of the curves, the lowest positive one for the log spacing"""
+        low = curves[:, 0].min()
+        if spacing == "log":
+            positive = curves[curves > 0]
+            low = max(low, positive.min() if positive.size else 1e-6)
+        return float(low), float(curves[:, -1].max())
+
+    @staticmethod
+    def _model_level_range(model: DetectorModel) -> tuple:
+        """The measured levels of all frequencies, the knots of a PCHIP model without them"""
+        if np.isfinite(model.level_range).all():
+            levels = model.level_range
+        elif model.model == "PCHIP":
+            levels = model.parameters[..., 0]
+        else:
+            raise ValueError("The level range of the inversion is not known, set level_range")
+        return float(np.nanmin(levels)), float(np.nanmax(levels))
+
+    @classmethod
+    def from_results(cls, path: str, model: str = "PCHIP", s21_gen_sa: tuple = None, s21_gen_det: tuple = None,
+                     channel: int = None, **grid) -> "CalibrationLookup":
+        """
+        Fit the results file (see DetectorFit) and tabulate the inverse, grid - from_model options
+
+        channel - the detector of a multi-channel results file, the first one by default
+        """
+        results = load_results(path, channel)
+        frequencies, level, volts = group_by_frequency(
+            results["FREQUENCY"], detector_level(results, s21_gen_sa, s21_gen_det), results["VOLTAGE"]
+        )
+        return cls.from_model(DetectorFit(model).fit(frequencies, level, volts), **grid)
+
+    def power(self, frequencies, volts) -> np.ndarray:
+        """
+        Input power (dBm) of the detector voltages at the frequencies.
+
+        Parameters:
+            frequencies (array_like): Frequencies, Hz
+            volts (array_like): Detector voltages, V, broadcast with the frequencies
+
+        Returns:
+            np.ndarray: The input power, dBm, shape of the broadcast arguments
+        """
+        frequencies, volts = np.broadcast_arrays(np.asarray(frequencies, dtype=float), np.asarray(volts, dtype=float))
+        last_row, last_column = len(self.frequencies) - 1, len(self.volts) - 1
+
+        if last_row > 0:
+            row = np.clip(np.searchsorted(self.frequencies, frequencies, side="right") - 1, 0, last_row - 1)
+            f0 = self.frequencies[row]
+            u = np.clip((frequencies - f0) / (self.frequencies[row + 1] - f0), 0.0, 1.0)
+        else:
+            row, u = np.zeros(frequencies.shape, dtype=int), np.zeros(frequencies.shape)
+
+        if self.spacing == "log":
+            axis = np.log(np.maximum(volts, self._volt_min))
+        else:
+            axis = volts
+        position = np.clip((axis - self._axis_start) / self._axis_step, 0.0, last_column)
+        column = np.minimum(position.astype(int), last_column - 1)
+        t = position - column
+
+        table = self.table
+        low = table[row, column] * (1 - t) + table[row, column + 1] * t
+        if last_row == 0:
+            return low
+        high = table[row + 1, column] * (1 - t) + table[row + 1, column + 1] * t
+        return low * (1 - u) + high * u
+
+    def power_at(self, frequency: float, volt: float) -> float:
+        """Input power (dBm) of a single detector voltage at the frequency"""
+        frequencies = self._frequency_list
+        last_column = len(self.volts) - 1
+        if self.spacing == "log":
+            axis = math.log(max(volt, self._volt_min))
+        else:
+            axis = volt
+        position = min(max((axis - self._axis_start) / self._axis_step, 0.0), last_column)
+        column = min(int(position), last_column - 1)
+        t = position - column
+
+        row = bisect.bisect_right(frequencies, frequency) - 1
+        if len(frequencies) == 1:
+            values = self._rows[0]
+            return values[column] * (1 - t) + values[column + 1] * t
+        row = min(max(row, 0), len(frequencies) - 2)
+        u = min(max((frequency - frequencies[row]) / (frequencies[row + 1] - frequencies[row]), 0.0), 1.0)
+        low, high = self._rows[row], self._rows[row + 1]
+        p_low = low[column] * (1 - t) + low[column + 1] * t
+        p_high = high[column] * (1 - t) + high[column + 1] * t
+        return p_low * (1 - u) + p_high * u
+
+    def save(self, path: str) -> None:
+        """Save the lookup table as .npz"""
+        np.savez(path, frequencies=self.frequencies, volts=self.volts, table=self.table, spacing=self.spacing)
+
+    @classmethod
+    def load(cls, path: str) -> "CalibrationLookup":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["frequencies"], data["volts"], data["table"], str(data["spacing"]))
@@ -0,0 +1,260 @@
+import os
+
+import numpy as np
+
+from .detector_fit import DetectorFit, DetectorModel, pad_knots
+from .lookup import CalibrationLookup, interp_rows
+from .results import load_results, detector_level, detector_results, group_by_frequency, result_channels
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+CODE_TYPES = {"int16": np.int16, "uint16": np.uint16}
+
+
+class FirmwareLut:
+    """
+    Fixed-point lookup table of a detector for the firmware
+
+    For every frequency row the power of the voltage bin b is
+        power_dBm = offset[row] + scale[row] * codes[row, b]
+    between the bins the codes are interpolated linearly. The voltage of
+    the bin b is volts[b], evenly spaced on a linear or log axis.
+    """
+
+    def __init__(self, frequencies: np.ndarray, volts: np.ndarray, codes: np.ndarray,
+                 offset: np.ndarray, scale: np.ndarray, spacing: str = "linear", name: str = "detector") -> None:
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.volts = np.asarray(volts, dtype=float)
+        self.codes = np.asarray(codes)
+        self.offset = np.asarray(offset, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.spacing = spacing
+        self.name = name
+        self.report = {}  # interpolation errors against the measured points, see LutCompiler
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.offset.nbytes + self.scale.nbytes
+
+    def power(self, rows, volts) -> np.ndarray:
+        """Power (dBm) decoded from the table for the voltages at the frequency rows, as the firmware does"""
+        rows, volts = np.broadcast_arrays(np.asarray(rows), np.asarray(volts, dtype=float))
+        if self.spacing == "log":
+            axis, values = np.log(self.volts), np.log(np.maximum(volts, self.volts[0]))
+        else:
+            axis, values = self.volts, volts
+        last = len(self.volts) - 1
+        position = np.clip((values - axis[0]) / (axis[1] - axis[0]), 0.0, last)
+        column = np.minimum(position.astype(int), last - 1)
+        t = position - column
+        codes = self.codes[rows, column] * (1 - t) + self.codes[rows, column + 1] * t
+        return self.offset[rows] + self.scale[rows] * codes
+
+    def save(self, path: str) -> None:
+        """Save the table as .npz"""
+        np.savez(
+            path, name=self.name, frequencies=self.frequencies, volts=self.volts, codes=self.codes,
+            offset=self.offset, scale=self.scale, spacing=self.spacing,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "FirmwareLut":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["frequencies"], data["volts"], data["codes"], data["offset"], data["scale"],
+                str(data["spacing"]), str(data["name"]),
+            )
+
+    def write_c_header(self, path: str) -> None:
+        """Write the table as C arrays"""
+        name = "".join(char if char.isalnum() else "_" for char in self.name).upper()
+        c_type = f"{self.codes.dtype.name}_t"
+        rows, bins = self.codes.shape
+        lines = [
+            f"/* Detector calibration LUT {self.name}: {rows} frequencies x {bins} voltage bins ({self.spacing}) */",
+            "/* power_dBm = OFFSET[f] + SCALE[f] * CODES[f][bin] */",
+            "#include <stdint.h>",
+            "",
+            f"#define {name}_FREQUENCIES {rows}",
+            f"#define {name}_BINS {bins}",
+            f"#define {name}_VOLT_MIN {self.volts[0]:.9g}f",
+            f"#define {name}_VOLT_MAX {self.volts[-1]:.9g}f",
+            f"#define {name}_LOG_SPACING {int(self.spacing == 'log')}",
+            "",
+            f"static const float {name}_FREQUENCY_HZ[{rows}] = {{{', '.join(f'{f:.9g}f' for f in self.frequencies)}}};",
+            f"static const float {name}_OFFSET[{rows}] = {{{', '.join(f'{x:.9g}f' for x in self.offset)}}};",
+            f"static const float {name}_SCALE[{rows}] = {{{', '.join(f'{x:.9g}f' for x in self.scale)}}};",
+            f"static const {c_type} {name}_CODES[{rows}][{bins}] = {{",
+        ]
+        lines += ["    {" + ", ".join(map(str, row)) + "}," for row in self.codes.tolist()]
+        lines.append("};")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+class LutCompiler:
+    """
+    Compiler of detector calibrations to fixed-point lookup tables
+
+    The fitted transfer curves are inverted on the voltage bins (uniform or log
+    spaced), the power of every frequency is quantized to int16/uint16 codes
+    with its own offset and scale, and the decoded table is compared with the
+    measured points. All frequencies of all detectors are tabulated and
+    quantized as one array, so a lot of detectors is compiled in one call.
+    """
+
+    def __init__(self, bins: int = 256, spacing: str = "linear", code_type: str = "int16",
+                 volt_range: tuple = None, model: str = "PCHIP", oversampling: int = 4) -> None:
+        if code_type not in CODE_TYPES:
+            raise ValueError(f"Unknown code type {code_type}, expected one of {tuple(CODE_TYPES)}")
+        if spacing not in ("linear", "log"):
+            raise ValueError(f"Unknown voltage spacing {spacing}, expected linear or log")
+        self.bins = bins
+        self.spacing = spacing
+        self.code_type = code_type
+        self.volt_range = volt_range  # (min, max) V of the bins, None - the range of the detectors
+        self.model = model  # DetectorFit model of the results
+        self.oversampling = oversampling  # points of the dense power grid per voltage bin, see CalibrationLookup
+
+    def compile(self, model: DetectorModel, level: np.ndarray = None, volts: np.ndarray = None,
+                name: str = "detector") -> FirmwareLut:
+        """
+        Compile the table of a detector.
+
+        Parameters:
+            model (DetectorModel): The fitted transfer curves of the detector
+            level, volts (np.ndarray): Measured points (F, L) of the model rows for the error report
+            name (str): Name of the table
+        """
+        return self.compile_batch([model], [level], [volts], [name])[0]
+
+    def compile_batch(self, models: list, levels: list = None, volts: list = None, names: list = None) -> list:
+        """
+        Compile the tables of a lot of detectors in one pass.
+
+        Parameters:
+            models (list): DetectorModel of every detector
+            levels, volts (list): Measured points (F, L) of every detector (or None) for the error report
+            names (list): Names of the tables
+
+        Returns:
+            list: FirmwareLut of every detector
+        """
+        count = len(models)
+        levels = levels or [None] * count
+        volts = volts or [None] * count
+        names = names or [f"detector_{i + 1}" for i in range(count)]
+        model_kind = {model.model for model in models}
+        if len(model_kind) != 1:
+            raise ValueError(f"The detectors of a batch must have the same model, got {sorted(model_kind)}")
+
+        # all frequency rows of all detectors as one model
+        width = max(model.parameters.shape[1] for model in models) if model_kind == {"PCHIP"} else None
+        combined = DetectorModel(
+            model_kind.pop(),
+            np.concatenate([model.frequencies for model in models]),
+            np.concatenate([self._pad_knots(model.parameters, width) for model in models]),
+            level_range=np.concatenate([model.level_range for model in models]),
+        )
+        grid, curves = CalibrationLookup.inverse_curves(combined, levels=self.bins * self.oversampling)
+        volt_range = self.volt_range or CalibrationLookup.curves_volt_range(curves, self.spacing)
+        if self.spacing == "log":
+            bin_volts = np.geomspace(*volt_range, self.bins)
+        else:
+            bin_volts = np.linspace(*volt_range, self.bins)
+        table = interp_rows(np.broadcast_to(bin_volts, (len(combined), self.bins)), curves, np.broadcast_to(grid, curves.shape))
+        codes, offset, scale = self.quantize(table)
+
+        luts, start = [], 0
+        for model, level, volt, name in zip(models, levels, volts, names):
+            rows = slice(start, start + len(model))
+            start += len(model)
+            lut = FirmwareLut(model.frequencies, bin_volts, codes[rows], offset[rows], scale[rows], self.spacing, name)
+            if level is not None and volt is not None:
+                lut.report = self.error_report(lut, level, volt)
+            luts.append(lut)
+        return luts
+
+    @staticmethod
+    def _pad_knots(parameters: np.ndarray, width: int | None) -> np.ndarray:
+        """PCHIP knots padded to the width of the batch (pad_knots of the detector fit)"""
+        if width is None or parameters.shape[1] == width:
+            return parameters
+        return pad_knots(parameters, np.full(len(parameters), parameters.shape[1]), width)
+
+    def quantize(self, table: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Codes of the power table with the offset and scale of every row
+
+        Returns:
+            tuple: (codes (R, bins), offset (R,), scale (R,)), power = offset + scale * code
+        """
+        info = np.iinfo(CODE_TYPES[self.code_type])
+        low, high = table.min(axis=1), table.max(axis=1)
+        scale = np.maximum(high - low, 1e-9) / (info.max - info.min)
+        offset = low - scale * info.min
+        codes = np.rint((table - offset[:, None]) / scale[:, None])
+        codes = np.clip(codes, info.min, info.max).astype(CODE_TYPES[self.code_type])
+        return codes, offset.astype(np.float32), scale.astype(np.float32)
+
+    @staticmethod
+    def error_report(lut: FirmwareLut, level: np.ndarray, volts: np.ndarray) -> dict:
+        """
+        Errors of the decoded table at the measured points (F, L) of the table rows.
+
+        Returns:
+            dict: MAX_ERROR_DB (F,), RMS_ERROR_DB (F,) and MAX_ERROR_DB_TOTAL, the NaN points are skipped
+        """
+        level = np.atleast_2d(np.asarray(level, dtype=float))
+        volts = np.atleast_2d(np.asarray(volts, dtype=float))
+        valid = ~(np.isnan(level) | np.isnan(volts))
+        decoded = lut.power(np.arange(len(level))[:, None], np.where(valid, volts, 0.0))
+        errors = np.where(valid, np.abs(decoded - level), np.nan)
+        return {
+            "MAX_ERROR_DB": np.nanmax(errors, axis=1),
+            "RMS_ERROR_DB": np.sqrt(np.nanmean(errors ** 2, axis=1)),
+            "MAX_ERROR_DB_TOTAL": float(np.nanmax(errors)),
+        }
+
+    def compile_results(self, paths: list) -> list:
+        """
+        Fit and compile the results files of a lot, one detector per file.
+
+        A multi-channel file gives a LUT of every detector channel (<file>_ch<n>).
+        The rows of all files are fitted in one DetectorFit call.
+        """
+        grouped, names = [], []
+        for path in paths:
+            results = load_results(path)
+            name = os.path.splitext(os.path.basename(path))[0]
+            channels = result_channels(results)
+            for channel in channels or [None]:
+                if channel is not None:
+                    results.update(detector_results(results, channel))
+                grouped.append(group_by_frequency(results["FREQUENCY"], detector_level(results), results["VOLTAGE"]))
+                names.append(name if channel is None else f"{name}_ch{channel}")
+
+        width = max(level.shape[1] for _, level, _ in grouped)
+        pad = lambda table: np.pad(table, ((0, 0), (0, width - table.shape[1])), constant_values=np.nan)
+        fitted = DetectorFit(self.model).fit(
+            np.concatenate([frequencies for frequencies, _, _ in grouped]),
+            np.concatenate([pad(level) for _, level, _ in grouped]),
+            np.concatenate([pad(volts) for _, _, volts in grouped]),
+        )
+
+        models, start = [], 0
+        for frequencies, _, _ in grouped:
+            rows = slice(start, start + len(frequencies))
+            start += len(frequencies)
+            models.append(DetectorModel(
+                fitted.model, frequencies, fitted.parameters[rows],
+                fitted.rms[rows], fitted.max_error[rows], fitted.level_range[rows],
+            ))
+        luts = self.compile_batch(models, [level for _, level, _ in grouped], [volts for _, _, volts in grouped], names)
+        for lut in luts:
+            logger.info(f"LUT {lut.name}: {lut.codes.shape}, {lut.nbytes} bytes, "
+                        f"max error {lut.report['MAX_ERROR_DB_TOTAL']:.3f} dB")
+        return luts
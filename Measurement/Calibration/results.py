@@ -0,0 +1,291 @@
+import importlib.util
+import json
+import os
+import re
+import numpy as np
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Columns of the results file (FileManager.save_results), the S21 columns only after the recalculation
+RESULT_COLUMNS = ("FREQUENCY", "GEN_LEVEL", "SA_LEVEL", "VOLTAGE", "S21_GEN_SA", "S21_GEN_DET", "DET_LEVEL")
+DETECTOR_COLUMNS = ("VOLTAGE", "S21_GEN_DET", "DET_LEVEL")  # one column per detector in the multi-channel results
+COLUMN_LABELS = {
+    "FREQUENCY": "Gen Frequency (Hz)",
+    "GEN_LEVEL": "Gen Level (dBm)",
+    "SA_LEVEL": "SA Level (dBm)",
+    "VOLTAGE": "Osc Voltage (V)",
+    "S21_GEN_SA": "S21 Gen-Sa (dB)",
+    "S21_GEN_DET": "S21 Gen-Det (dB)",
+    "DET_LEVEL": "Det Level (dBm)",
+}
+
+# Results file formats by the extension: CSV text and the binary column formats with the metadata,
+# HDF5 and Parquet need the optional packages of FORMAT_PACKAGES
+RESULT_FORMATS = {".csv": "CSV", ".npz": "NPZ", ".h5": "HDF5", ".hdf5": "HDF5", ".parquet": "PARQUET"}
+FORMAT_PACKAGES = {"HDF5": "h5py", "PARQUET": "pyarrow"}
+METADATA_KEY = "DETCAL_METADATA"
+CHUNK_ROWS = 65536
+
+
+def result_columns(channels: list = None) -> tuple:
+    """
+    Columns of the results of the detector channels.
+
+    One detector: RESULT_COLUMNS. Several detectors (multi-channel mode): FREQUENCY,
+    GEN_LEVEL, SA_LEVEL, VOLTAGE_CH<n> of every channel, S21_GEN_SA, S21_GEN_DET_CH<n>
+    and DET_LEVEL_CH<n> of every channel, the order of MeasurementModel.recalc_data.
+    """
+    if channels is None or len(channels) < 2:
+        return RESULT_COLUMNS
+    detector = {name: tuple(f"{name}_CH{channel}" for channel in channels) for name in DETECTOR_COLUMNS}
+    return (
+        "FREQUENCY", "GEN_LEVEL", "SA_LEVEL", *detector["VOLTAGE"],
+        "S21_GEN_SA", *detector["S21_GEN_DET"], *detector["DET_LEVEL"],
+    )
+
+
+def results_header(channels: list = None) -> str:
+    """Header line of the results file, e.g. 'Osc Voltage CH2 (V)' for the VOLTAGE_CH2 column"""
+    labels = []
+    for name in result_columns(channels):
+        base, _, channel = name.partition("_CH")
+        labels.append(COLUMN_LABELS[base].replace(" (", f" CH{channel} (", 1) if channel else COLUMN_LABELS[base])
+    return ", ".join(labels)
+
+
+def results_format(path: str) -> str:
+    """
+    Format of the results file by its extension (RESULT_FORMATS).
+
+    Raises:
+        ValueError: If the extension is not a results format.
+        ImportError: If the optional package of the format (FORMAT_PACKAGES) is not installed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in RESULT_FORMATS:
+        raise ValueError(f"Unsupported results format: {path}, expected {', '.join(RESULT_FORMATS)}")
+    file_format = RESULT_FORMATS[extension]
+    package = FORMAT_PACKAGES.get(file_format)
+    if package is not None and importlib.util.find_spec(package) is None:
+        raise ImportError(f"The {file_format} results format needs the {package} package")
+    return file_format
+
+
+def write_results(path: str, data: list, channels: list = None, metadata: dict = None) -> None:
+    """
+    Write the result rows (the columns of result_columns) in the format of the path.
+
+    CSV: text with the results_header line, without the metadata. The binary formats
+    store every column compressed (HDF5 and Parquet in chunks of CHUNK_ROWS rows) with
+    the metadata as JSON, see load_metadata.
+
+    Parameters:
+        path (str): The results file
+        data (list): The result rows
+        channels (list): The detector channels of the multi-channel results
+        metadata (dict): Settings, instruments, S21 files, timing... (JSON serializable)
+    """
+    file_format = results_format(path)
+    if file_format == "CSV":
+        np.savetxt(path, data, delimiter=",", header=results_header(channels))
+        return
+
+    width = len(data[0]) if len(data) else 3 + max(len(channels or ()), 1)
+    rows = np.array(data, dtype=float).reshape(len(data), width)
+    columns = {name: np.ascontiguousarray(rows[:, i]) for i, name in enumerate(result_columns(channels)[:width])}
+    text = json.dumps(metadata or {}, default=_json_value)
+
+    if file_format == "NPZ":
+        np.savez_compressed(path, **columns, **{METADATA_KEY: np.array(text)})
+    elif file_format == "HDF5":
+        import h5py
+
+        with h5py.File(path, "w") as f:
+            for name, column in columns.items():
+                f.create_dataset(
+                    name, data=column, chunks=(min(max(len(column), 1), CHUNK_ROWS),), maxshape=(None,),
+                    compression="gzip", shuffle=True,
+                )
+            f.attrs["COLUMNS"] = json.dumps(list(columns))
+            f.attrs[METADATA_KEY] = text
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table(columns).replace_schema_metadata({METADATA_KEY: text})
+        pq.write_table(table, path, compression="zstd", row_group_size=CHUNK_ROWS)
+
+
+def _json_value(value: object) -> object:
+    """JSON value of the NumPy scalars and arrays (and the text of other objects) in the metadata"""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return str(value)
+
+
+def results_file_columns(path: str) -> list:
+    """Names of the columns stored in the results file, without reading the rows of a binary file"""
+    file_format = results_format(path)
+    if file_format == "CSV":
+        header, first_row = "", ""
+        with open(path, "r") as f:
+            for line in f:
+                if line.startswith("#"):
+                    header = header or line
+                elif line.strip():
+                    first_row = line
+                    break
+        channels = [int(channel) for channel in re.findall(r"Osc Voltage CH(\d+)", header)]
+        width = first_row.count(",") + 1 if first_row else 3 + max(len(channels), 1)
+        return list(result_columns(channels)[:width])
+    if file_format == "NPZ":
+        with np.load(path, allow_pickle=False) as data:
+            return [name for name in data.files if name != METADATA_KEY]
+    if file_format == "HDF5":
+        import h5py
+
+        with h5py.File(path, "r") as f:
+            return json.loads(f.attrs["COLUMNS"])
+    import pyarrow.parquet as pq
+
+    return list(pq.read_schema(path).names)
+
+
+def load_results(path: str, channel: int = None, columns: list = None) -> dict:
+    """
+    Read a results file (FileManager.save_results, any of RESULT_FORMATS).
+
+    Only the columns are read, the other columns of a binary file are not loaded
+    (Parquet is read memory mapped). The columns missing in the file are left out,
+    e.g. the S21 columns of the results without the recalculation.
+
+    The detector channels of a multi-channel file are read from its columns. Then
+    VOLTAGE, S21_GEN_DET and DET_LEVEL are the columns of the detector on the channel
+    (the first detector by default), so the file is fitted like a single detector file.
+    The channel is not used for a single detector file.
+
+    Parameters:
+        path (str): The results file
+        channel (int): The detector of a multi-channel file
+        columns (list): The columns to read (result_columns names), all columns by default
+
+    Returns:
+        dict: Column name (result_columns): ndarray of the rows
+
+    Raises:
+        ValueError: If the file has too few columns or no detector on the channel.
+    """
+    file_format = results_format(path)
+    available = results_file_columns(path)
+    channels = result_channels(available)
+    if len(available) < 3 + max(len(channels), 1):
+        raise ValueError(f"{path}: {len(available)} columns, at least {3 + max(len(channels), 1)} expected")
+    if len(channels) > 1:
+        channel = channels[0] if channel is None else channel
+        if channel not in channels:
+            raise ValueError(f"{path}: no detector on channel {channel}")
+
+    def source(name: str) -> str:
+        return f"{name}_CH{channel}" if len(channels) > 1 and name in DETECTOR_COLUMNS else name
+
+    wanted = available if columns is None else [source(name) for name in columns if source(name) in available]
+    if not wanted:
+        return {}
+
+    if file_format == "CSV":
+        data = np.loadtxt(path, delimiter=",", comments="#", ndmin=2, usecols=[available.index(name) for name in wanted])
+        results = {name: data[:, i] for i, name in enumerate(wanted)}
+    elif file_format == "NPZ":
+        with np.load(path, allow_pickle=False) as data:
+            results = {name: data[name] for name in wanted}
+    elif file_format == "HDF5":
+        import h5py
+
+        with h5py.File(path, "r") as f:
+            results = {name: f[name][()] for name in wanted}
+    else:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=wanted, memory_map=True)
+        results = {name: table.column(name).to_numpy() for name in wanted}
+
+    if len(channels) > 1:
+        results.update({name: results[source(name)] for name in DETECTOR_COLUMNS if source(name) in results})
+    return results
+
+
+def load_metadata(path: str) -> dict:
+    """The metadata of a binary results file (write_results), empty for CSV"""
+    file_format = results_format(path)
+    if file_format == "NPZ":
+        with np.load(path, allow_pickle=False) as data:
+            text = str(data[METADATA_KEY]) if METADATA_KEY in data.files else "{}"
+    elif file_format == "HDF5":
+        import h5py
+
+        with h5py.File(path, "r") as f:
+            text = f.attrs.get(METADATA_KEY, "{}")
+    elif file_format == "PARQUET":
+        import pyarrow.parquet as pq
+
+        text = (pq.read_schema(path).metadata or {}).get(METADATA_KEY.encode(), b"{}")
+    else:
+        text = "{}"
+    return json.loads(text)
+
+
+def result_channels(results: dict) -> list:
+    """The detector channels of multi-channel results (or column names), empty for a single detector"""
+    return [int(name[len("VOLTAGE_CH"):]) for name in results if name.startswith("VOLTAGE_CH")]
+
+
+def detector_results(results: dict, channel: int) -> dict:
+    """
+    Columns of the detector on the channel of multi-channel results as VOLTAGE, S21_GEN_DET and DET_LEVEL.
+
+    Raises:
+        ValueError: If the results have no detector on the channel.
+    """
+    if f"VOLTAGE_CH{channel}" not in results:
+        raise ValueError(f"No detector on channel {channel} in the results")
+    return {
+        name: results[f"{name}_CH{channel}"] for name in DETECTOR_COLUMNS if f"{name}_CH{channel}" in results
+    }
+
+
+def detector_level(results: dict, s21_gen_sa: tuple = None, s21_gen_det: tuple = None) -> np.ndarray:
+    """
+    Detector input power (dBm) of the result rows.
+
+    With S21 data (frequency, magnitude_db) the power is recalculated from the
+    SA level as MeasurementModel.recalc_data does, otherwise the DET_LEVEL column
+    (the SA level for results without the S21 columns) is used.
+    """
+    if s21_gen_sa is not None and s21_gen_det is not None:
+        frequency = results["FREQUENCY"]
+        return results["SA_LEVEL"] + np.interp(frequency, *s21_gen_sa) - np.interp(frequency, *s21_gen_det)
+    return results.get("DET_LEVEL", results["SA_LEVEL"])
+
+
+def group_by_frequency(frequency: np.ndarray, *columns: np.ndarray) -> tuple:
+    """
+    Arrange the rows by frequency.
+
+    Returns:
+        tuple: (frequencies (F,), and every column as (F, L) array), L - the most points
+        of a frequency, the missing points of the other frequencies are NaN
+    """
+    frequencies, rows, counts = np.unique(frequency, return_inverse=True, return_counts=True)
+    order = np.argsort(rows, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.arange(len(frequency)) - np.repeat(starts, counts)  # point index within its frequency
+
+    grouped = []
+    for column in columns:
+        table = np.full((len(frequencies), counts.max()), np.nan)
+        table[rows[order], positions] = np.asarray(column, dtype=float)[order]
+        grouped.append(table)
+    return (frequencies, *grouped)
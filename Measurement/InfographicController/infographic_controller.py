@@ -1,15 +1,17 @@
 from PyQt6.QtCore import QObject
-import csv
 import json
-from Documentations.protocol_creator import MeasurementProtocol
+import numpy as np
 
 from Measurement.helper_functions import is_equal_frequencies
+from Measurement.Calibration.results import RESULT_COLUMNS, load_results
 
 
 from System.logger import get_logger
 logger = get_logger(__name__)
 
 class InfographicController(QObject):
+
+    results_file = "results.csv"  # results of the protocol, any format of Calibration.results
         
     def __init__(self,  model, view):
         super().__init__()
@@ -35,14 +37,12 @@ class InfographicController(QObject):
         selected_frequency = self.get_current_frequency()
         if selected_frequency is None:
             return
+        from Documentations.protocol_creator import MeasurementProtocol  # matplotlib and LaTeX tooling, loaded on first use
         
-        with open("results.csv", "r") as file:
-            next(file) # skip header
-            result_file = list(csv.reader(file))
-            data = []
-            for row in result_file:
-                if is_equal_frequencies(row[0], selected_frequency):
-                    data.append(row)
+        results = load_results(self.results_file, columns=RESULT_COLUMNS) # the first detector of multi-channel results
+        rows = np.column_stack([results[name] for name in RESULT_COLUMNS if name in results])
+        selected = [is_equal_frequencies(frequency, selected_frequency) for frequency in results["FREQUENCY"]]
+        data = rows[selected].tolist()
 
         with open("Settings/meas_settings.json", "r") as file:
             settings = json.load(file)
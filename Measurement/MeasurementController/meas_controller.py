@@ -27,6 +27,17 @@ class MeasurementController(Controller):
     :param view: The View.
     """
 
+    recalc_keys = (  # fields enabled by the recalc attenuation checkbox
+        "S21_GEN_SA_LABEL",
+        "S21_GEN_SA_FILE_LABEL",
+        "S21_GEN_DET_LABEL",
+        "S21_GEN_DET_FILE_LABEL",
+        "BTN_LOAD_S21_GEN_SA",
+        "BTN_LOAD_S21_GEN_DET",
+        "MAX_DET_LEVEL_LABEL",
+        "MAX_DET_LEVEL_VALUE_LABEL",
+    )
+
     def __init__(self, model: object, view: object) -> None:
         super().__init__()
 
@@ -41,7 +52,7 @@ class MeasurementController(Controller):
         self.init_view_controllers()
 
         self.model.instr_initialization()
-        self.model.load_settings()
+        self.model.load_settings_async()  # the settings and S21 files arrive via the model signals
 
     def init_signals_handlers(self) -> None:
         """
@@ -261,6 +272,7 @@ class MeasurementController(Controller):
             if not self.validate_settings():
                 return
             WriteSettings.view_to_model(self)
+            self.model.file_manager.update_s21_files(self.model.settings)  # S21 library for new frequencies
             self.ig_controller.clear_selector()
             self.model.settings_changed.emit(self.model.settings)
         except Exception as e:
@@ -328,19 +340,38 @@ class MeasurementController(Controller):
         """
         elem = self.view.elem
         elem["RECALC_ATT"].setChecked(state)
-        keys = (
-            "S21_GEN_SA_LABEL",
-            "S21_GEN_SA_FILE_LABEL",
-            "S21_GEN_DET_LABEL",
-            "S21_GEN_DET_FILE_LABEL",
-            "BTN_LOAD_S21_GEN_SA",
-            "BTN_LOAD_S21_GEN_DET",
-            "MAX_DET_LEVEL_LABEL",
-            "MAX_DET_LEVEL_VALUE_LABEL",
-        )
-        for key in keys:
+        for key in self.recalc_keys:
             elem[key].setEnabled(state)
 
+    def set_s21_loading(self, loading: bool) -> None:
+        """
+        Show the loading state of the settings and S21 files.
+
+        The S21 dependent fields and the start button are disabled until the
+        loaded data is stored in the model.
+
+        Args:
+            loading (bool): True while the files are loaded in the background.
+        """
+        elem = self.view.elem
+        elem["RECALC_ATT"].setEnabled(not loading)
+        if loading:
+            for key in self.recalc_keys:
+                elem[key].setEnabled(False)
+            elem["S21_GEN_SA_FILE_LABEL"].setText("Loading...")
+            elem["S21_GEN_DET_FILE_LABEL"].setText("Loading...")
+            elem["BTN_START"].setEnabled(False)
+            self.status_bar.warning("Loading settings...")
+            return
+
+        if self.model.s21_gen_sa is None:
+            elem["S21_GEN_SA_FILE_LABEL"].setText("Not loaded")
+        if self.model.s21_gen_det is None:
+            elem["S21_GEN_DET_FILE_LABEL"].setText("Not loaded")
+        self.enable_recalc(elem["RECALC_ATT"].isChecked())
+        if not self.model.settings:
+            self.status_bar.error("Failed to load settings")
+
     def check_recalc(self) -> bool:
         """
         Check if the recalc attenuation is enabled and if the S21 files are loaded.
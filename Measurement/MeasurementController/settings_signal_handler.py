@@ -78,11 +78,11 @@ class SettingsSignalHandler(SignalHandler):
             level_min, level_max, _ = message["RF_LEVELS"]
             ig_controller.clear_plot()
 
-            ig_controller.view.figure1.ax.set_xlim(level_min, level_max)
-            ig_controller.view.figure1.canvas.draw_idle()
+            ig_controller.view.figure1.set_xlim(level_min, level_max)
+            ig_controller.view.figure1.draw_idle()
 
-            # meas_controller.view.plot.figure2.ax.set_xlim(level_min, level_max)
-            ig_controller.view.figure2.canvas.draw_idle()
+            # meas_controller.view.plot.figure2.set_xlim(level_min, level_max)
+            ig_controller.view.figure2.draw_idle()
         if "RF_FREQUENCIES" in message:
             freq_min, freq_max, points = message["RF_FREQUENCIES"]
             if is_equal_frequencies(freq_min, freq_max):
@@ -13,6 +13,8 @@ class SparSignalHandler(SignalHandler):
 
     @staticmethod
     def handler(meas_controller, message):
+        if "S21_LOADING" in message:
+            meas_controller.set_s21_loading(message["S21_LOADING"])
         if "S21_GEN_SA_FILENAME" in message:
             elem = meas_controller.view.elem["S21_GEN_SA_FILE_LABEL"]
             elem.setText(message["S21_GEN_SA_FILENAME"])
@@ -1,12 +1,8 @@
 from PyQt6.QtCore import QThread, pyqtSignal
+import importlib
 import os
 import json
 
-from Instruments.rsa5065n import RSA5065N
-from Instruments.dsg830 import DSG830
-from Instruments.mdo34 import MDO34
-
-
 from System.logger import get_logger
 
 logger = get_logger(__name__)
@@ -18,12 +14,19 @@ class Initializer(QThread):
     finished = pyqtSignal(object, object, object, object)  # emits (gen, sa, osc, error)
     settings_folder = "Settings"
     ip_list = "instr_ip.json"
+    # model: (instrument name, driver module, driver class), imported by the initialization thread
+    drivers = {
+        "DSG830": ("gen", "Instruments.dsg830", "DSG830"),
+        "RSA5065N": ("sa", "Instruments.rsa5065n", "RSA5065N"),
+        "MDO34": ("osc", "Instruments.mdo34", "MDO34"),
+    }
 
     def __init__(self):
         super().__init__()
+        self.simulated = False  # True: create the instruments of the simulated bench
         self.load_instr_ip_settings()
 
-    def load_instr_ip_settings(self) -> None:
+    def load_instr_ip_settings(self, path: str = None) -> None:
         """
         Loads instrument IP settings from a JSON file.
 
@@ -32,8 +35,15 @@ class Initializer(QThread):
         and the value is the IP address of the instrument.
 
         If the file is not found, an error message is logged.
+
+        Parameters:
+            path (str): The IP settings file, Settings/instr_ip.json by default.
+                A file name without folder is looked up in the settings folder too.
         """
-        path = os.path.join(self.settings_folder, self.ip_list)
+        if path is None:
+            path = os.path.join(self.settings_folder, self.ip_list)
+        elif not os.path.exists(path) and os.path.exists(os.path.join(self.settings_folder, path)):
+            path = os.path.join(self.settings_folder, path)
         if not os.path.exists(path):
             error_msg = f"Instrument IP file not found: {path}"
             logger.error(error_msg)
@@ -67,6 +77,15 @@ class Initializer(QThread):
         """
         Initializes the instruments by creating their objects.
 
+        In the simulated mode the objects of the simulated bench instruments
+        (SIM:: VISA strings) are created instead of the IP settings.
+
+        The sessions of all instruments are opened in parallel (SessionPool) with
+        the timeouts timeout_<model> (ms) and the LAN transports transport_<model>
+        (VXI11, SOCKET or RAW) of the IP settings, so the connection of
+        the instrument objects reuses them and the startup takes the time of the
+        slowest instrument.
+
         This method attempts to create objects for the instruments specified
         in the instrument IP settings file. If any of the instruments fail
         to initialize, an error message is logged and the
@@ -79,16 +98,35 @@ class Initializer(QThread):
             Notifies that the initialization is complete.
         """
         try:
-            required_ips = ['ip_DSG830', 'ip_RSA5065N', 'ip_MDO34']
-            for ip_attr in required_ips:
-                if not hasattr(self, ip_attr):
-                    raise AttributeError(f"Missing IP address: {ip_attr}")
-
-            instr = {
-                "gen": DSG830(self.ip_DSG830),
-                "sa": RSA5065N(self.ip_RSA5065N),
-                "osc": MDO34(self.ip_MDO34),
+            # The instrument stack (pyvisa) is loaded here, not at the application startup
+            from Instruments.Simulator.sim_bench import SimBench
+            from Instruments.session_pool import SessionPool
+            from Instruments.visacom import VisaCom
+
+            if self.simulated:
+                ips = {model: SimBench.visa_string(model) for model in self.drivers}
+            else:
+                required_ips = ['ip_DSG830', 'ip_RSA5065N', 'ip_MDO34']
+                for ip_attr in required_ips:
+                    if not hasattr(self, ip_attr):
+                        raise AttributeError(f"Missing IP address: {ip_attr}")
+                ips = {model: getattr(self, f"ip_{model}") for model in self.drivers}
+
+            timeouts = {
+                model: int(getattr(self, f"timeout_{model}", SessionPool.default_timeout))
+                for model in self.drivers
             }
+            transports = {model: getattr(self, f"transport_{model}", "VXI11") for model in self.drivers}
+            SessionPool.open_all(
+                {model: VisaCom.get_visa_string_ip(ip, transports[model]) for model, ip in ips.items()}, timeouts
+            )
+
+            instr = {}
+            for model, (name, module, driver) in self.drivers.items():
+                driver = getattr(importlib.import_module(module), driver)
+                instr[name] = driver(ips[model])
+                instr[name].set_timeout(timeouts[model])
+                instr[name].set_transport(transports[model])
             self.finished.emit(instr["gen"], instr["sa"], instr["osc"], None)
         except Exception as e:
             self.finished.emit(None, None, None, e)
@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+import time
+import numpy as np
+
+from System.logger import get_logger
+from System.tracer import traced
+
+logger = get_logger(__name__)
+
+
+class LevelCapture(ABC):
+    """
+    Abstract class for measuring all levels of one frequency at once.
+
+    The maximum level is measured as a classic point: it sets the oscilloscope
+    vertical scale for the capture and is the first spectrum analyzer anchor.
+    The spectrum analyzer is measured only at the anchor levels, the levels in
+    between are referenced by interpolating the anchor offsets. The detector
+    voltages of all levels are captured by the subclass.
+    """
+
+    def __init__(self, meas_model: object) -> None:
+        self.model = meas_model
+
+    @property
+    def settings(self) -> dict:
+        return self.model.settings
+
+    @traced("level_capture")
+    def measure(self, frequency: float, levels: list) -> list | None:
+        """
+        Measure all levels of one frequency.
+
+        The generator must already be set to the frequency and the spectrum analyzer
+        must be tuned to the signal.
+
+        Parameters:
+            frequency (float): The generator frequency in Hz
+            levels (list): The generator output levels in dBm
+
+        Returns:
+            list: Measured points [frequency, level, sa_level, voltage] from the maximum
+            to the minimum level, or None if the levels were not captured.
+        """
+        model = self.model
+        capture_levels = np.sort(np.asarray(levels, dtype=float))[::-1]
+
+        model.gen.set_level(capture_levels[0])
+        sa_data, osc_data = model.single_measurement()
+        max_voltage = model.osc_voltage_refinement(osc_data)
+        anchors = {capture_levels[0]: model.sa_level_checking(sa_data)}
+
+        for level in self.anchor_levels(capture_levels)[1:]:
+            if model.is_stop():
+                return None
+            model.gen.set_level(level)
+            model.sa_start_measurement()
+            anchors[level] = model.sa_level_checking(model.sa.get_trace_data())
+
+        sa_levels = self.sa_from_anchors(capture_levels, anchors)
+        if sa_levels is None:
+            logger.warning(f"No valid SA anchor at {frequency} Hz")
+            return None
+
+        voltages = self.capture(frequency, capture_levels, max_voltage)
+        if voltages is None:
+            return None
+
+        return [
+            [frequency, level, sa_level, voltage]
+            for level, sa_level, voltage in zip(capture_levels, sa_levels, voltages)
+        ]
+
+    @abstractmethod
+    def capture(self, frequency: float, levels: np.ndarray, max_voltage: float) -> np.ndarray | None:
+        """
+        Capture the detector voltage of every level.
+
+        Parameters:
+            frequency (float): The generator frequency in Hz
+            levels (np.ndarray): The generator levels in dBm, from the maximum to the minimum
+            max_voltage (float): The detector voltage at the maximum level in V
+
+        Returns:
+            np.ndarray: Mean detector voltage of every level, or None on failure
+        """
+        pass
+
+    def anchor_levels(self, levels: np.ndarray) -> np.ndarray:
+        """
+        Select the levels where the spectrum analyzer is measured.
+
+        The anchors are evenly distributed over the levels and always include
+        the maximum and the minimum level.
+        """
+        anchors = max(int(self.settings.get("RAMP_ANCHORS", 2)), 1)
+        indexes = np.unique(np.linspace(0, len(levels) - 1, anchors).round().astype(int))
+        return levels[indexes]
+
+    @staticmethod
+    def sa_from_anchors(levels: np.ndarray, anchors: dict) -> np.ndarray | None:
+        """
+        Reference the spectrum analyzer level of every generator level.
+
+        The offset between the SA level and the generator level is constant for a
+        passive line, it is interpolated between the valid anchors.
+
+        Parameters:
+            levels (np.ndarray): Generator levels in dBm
+            anchors (dict): SA level (dBm) measured at the anchor generator levels,
+                0 if the signal was under the noise limit
+
+        Returns:
+            np.ndarray: SA levels in dBm, or None if no anchor is valid
+        """
+        valid = sorted((level, sa) for level, sa in anchors.items() if sa)
+        if not valid:
+            return None
+        anchor_levels = np.array([level for level, _ in valid])
+        offsets = np.array([sa - level for level, sa in valid])
+        return levels + np.interp(levels, anchor_levels, offsets)
+
+    def wait_acquisition(self, duration: float) -> bool:
+        """
+        Wait until the scope finished the acquisition.
+
+        Parameters:
+            duration (float): Expected duration of the acquisition in s
+
+        Returns:
+            bool: True if the acquisition finished, False on timeout or stop.
+        """
+        timeout = time.time() + duration * 3 + 2
+        while self.model.osc.is_acquiring():
+            if self.model.is_stop() or time.time() > timeout:
+                return False
+            time.sleep(0.05)
+        return True
@@ -1,4 +1,9 @@
 import time
+import numpy as np
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 class DevicesSetup:
@@ -9,6 +14,12 @@ class DevicesSetup:
     function to set up all devices at once.
     """
 
+    # Settings applied by setup(), the instruments set up with the same values need no new setup
+    SETUP_KEYS = (
+        "REF_LEVEL", "SWEEP_TIME", "SWEEP_POINTS", "CHANNEL", "CHANNELS", "IMPEDANCE_50OHM",
+        "COUPLING_DC", "HIGH_RES", "HOR_SCALE",
+    )
+
     @staticmethod
     def setup(gen: object, sa: object, osc: object, settings: dict) -> None:
         """
@@ -39,8 +50,85 @@ class DevicesSetup:
         """
 
         gen.factory_preset()
+        DevicesSetup.gen_sweep_setup(gen, settings)
+
+    @staticmethod
+    def gen_sweep_setup(gen: object, settings: dict) -> None:
+        """
+        Prepare the generator sweep of a measurement without the preset.
+
+        The output is set to the minimum level and in the list sweep mode
+        the sweep table is uploaded and started. A table larger than the list
+        of the generator is uploaded one frequency at a time by the measurement
+        (gen_frequency_sweep_setup).
+
+        Parameters:
+            gen (object): The generator device.
+            settings (dict): A dictionary containing the measurement settings.
+        """
         gen.set_min_level()
 
+        level_capture = settings.get("POWER_RAMP", False) or settings.get("FASTFRAME", False)
+        if settings.get("LIST_SWEEP", False) and not level_capture:
+            if not DevicesSetup.fits_sweep_list(gen, settings):
+                logger.warning(
+                    f"Sweep table larger than {gen.max_list_points} points, the table of every frequency is uploaded"
+                )
+                return
+            frequencies, levels = DevicesSetup.sweep_table(settings)
+            gen.setup_list_sweep(frequencies, levels, trigger="BUS")
+            gen.start_list_sweep()
+
+    @staticmethod
+    def fits_sweep_list(gen: object, settings: dict) -> bool:
+        """Check if the sweep table of all frequencies fits the list of the generator"""
+        _, _, freq_points = settings["RF_FREQUENCIES"]
+        _, _, level_points = settings["RF_LEVELS"]
+        return int(freq_points) * int(level_points) <= gen.max_list_points
+
+    @staticmethod
+    def gen_frequency_sweep_setup(gen: object, frequency: float, levels: list) -> None:
+        """
+        Upload and start the list sweep of one frequency, from the maximum to the minimum level.
+
+        If the levels do not fit the list of the generator either, the running sweep
+        is stopped and the points are set one by one (DSG830.step_to).
+
+        Parameters:
+            gen (object): The generator device.
+            frequency (float): The frequency in Hz.
+            levels (list): The levels of the frequency in dBm.
+        """
+        if gen.is_list_sweep_running():
+            gen.stop_list_sweep()
+        levels = np.asarray(levels, dtype=float)[::-1]
+        if len(levels) > gen.max_list_points:
+            logger.warning(f"{len(levels)} levels exceed the generator list, the points are set one by one")
+            return
+        gen.setup_list_sweep(np.full(len(levels), frequency), levels, trigger="BUS")
+        gen.start_list_sweep()
+
+    @staticmethod
+    def sweep_table(settings: dict) -> tuple:
+        """
+        Build the generator list sweep table in the order of the measurement loop.
+
+        Every frequency is swept from the maximum to the minimum level.
+
+        Parameters:
+            settings (dict): A dictionary containing the measurement settings.
+
+        Returns:
+            tuple: Frequency (Hz) and level (dBm) columns of the table.
+        """
+        freq_min, freq_max, freq_points = settings["RF_FREQUENCIES"]
+        level_min, level_max, level_points = settings["RF_LEVELS"]
+
+        frequencies = np.linspace(freq_min, freq_max, int(freq_points))
+        levels = np.linspace(level_min, level_max, int(level_points))[::-1]
+
+        return np.repeat(frequencies, len(levels)), np.tile(levels, len(frequencies))
+
     @staticmethod
     def sa_setup(sa: object, settings: dict) -> None:
         """
@@ -57,11 +145,36 @@ class DevicesSetup:
         sa.trace_clear_all()
         sa.set_format_trace_bin()
 
+    @staticmethod
+    def detector_channels(settings: dict) -> list:
+        """
+        Oscilloscope channels of the detectors.
+
+        CHANNELS lists the channels of the detectors measured together behind a
+        splitter, without it (or empty) the one detector is on CHANNEL.
+
+        Parameters:
+            settings (dict): A dictionary containing the measurement settings.
+
+        Returns:
+            list: The channel numbers, the first one is the trigger and measurement source.
+        """
+        channels = settings.get("CHANNELS") or [settings["CHANNEL"]]
+        return [int(channel) for channel in channels]
+
+    @staticmethod
+    def is_multi_channel(settings: dict) -> bool:
+        """Check if several detectors are measured at once (CHANNELS)"""
+        return len(DevicesSetup.detector_channels(settings)) > 1
+
     @staticmethod
     def osc_setup(osc: object, settings: dict) -> None:
         """
         Set up the oscilloscope device for measurement.
 
+        Every detector channel (detector_channels) is set up, in the multi-channel
+        mode all of them are the data sources of one CURVE? transfer.
+
         Parameters:
             osc (object): The oscilloscope device.
             settings (dict): A dictionary containing the settings for the oscilloscope device.
@@ -71,16 +184,18 @@ class DevicesSetup:
         osc.get_settings_from_device()
 
         osc.channel_off(1)  # CH1 is default channel
-        channel = settings["CHANNEL"]
-        osc.select_channel(channel)
-        if settings["IMPEDANCE_50OHM"]:
-            osc.set_50Ohm_termination()
-        if settings["COUPLING_DC"]:
-            osc.set_coupling("DC")
-        osc.set_vertical_scale(1)  # 1V/div
-        osc.set_vertical_position(0)
-        osc.channel_on(channel)
-        osc.set_bandwidth("FULL")
+        channels = DevicesSetup.detector_channels(settings)
+        for channel in reversed(channels):  # the first detector channel stays selected
+            osc.select_channel(channel)
+            if settings["IMPEDANCE_50OHM"]:
+                osc.set_50Ohm_termination()
+            if settings["COUPLING_DC"]:
+                osc.set_coupling("DC")
+            osc.set_vertical_scale(1)  # 1V/div
+            osc.set_vertical_position(0)
+            osc.channel_on(channel)
+            osc.set_bandwidth("FULL")
+        channel = channels[0]
         if settings["HIGH_RES"]:
             osc.set_high_res_mode()
         osc.set_horizontal_scale(settings["HOR_SCALE"])
@@ -94,11 +209,24 @@ class DevicesSetup:
         osc.set_trigger_level(0)
 
         osc.stop_after_sequence()
-        osc.set_data_source(channel)
+        if len(channels) > 1:
+            osc.set_data_sources(channels)
+        else:
+            osc.set_data_source(channel)
         osc.set_data_points(10000)
         osc.set_binary_data_format()
         time.sleep(0.1)
 
+    @staticmethod
+    def setup_key(gen: object, sa: object, osc: object, settings: dict) -> tuple:
+        """
+        Configuration of the instruments after setup(): the instruments and the SETUP_KEYS settings.
+
+        Returns:
+            tuple: Equal for the measurements that can share one setup
+        """
+        return (id(gen), id(sa), id(osc)) + tuple(repr(settings.get(key)) for key in DevicesSetup.SETUP_KEYS)
+
     @staticmethod
     def _validate_devices(gen: object, sa: object, osc: object) -> None:
         """Validate that all device instances are provided."""
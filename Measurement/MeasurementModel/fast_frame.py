@@ -0,0 +1,106 @@
+import time
+import numpy as np
+
+from Measurement.MeasurementModel.abstract_capture import LevelCapture
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class FastFrameCapture(LevelCapture):
+    """
+    A class to capture the detector voltages of one frequency by segmented acquisition.
+
+    The oscilloscope is armed once in FastFrame mode with one frame per level.
+    Every generator step of the list sweep triggers one frame: by a forced trigger
+    (FRAME_TRIGGER = "FORCE") or by the generator trigger output wired to the
+    scope AUX input (FRAME_TRIGGER = "AUX"). With the AUX trigger the list sweep is
+    started after the scope is armed, so the first row triggers the first frame.
+    All frames are transferred by one CURVE? query and reduced to per-frame means.
+    """
+
+    FRAME_POINTS = 1000  # Record length of one frame
+
+    def __init__(self, meas_model: object) -> None:
+        super().__init__(meas_model)
+        self._saved_points = None  # (record length, data points) before the segmented acquisition
+        self._saved_slope = None  # trigger slope before the AUX trigger
+
+    def capture(self, frequency: float, levels: np.ndarray, max_voltage: float) -> np.ndarray | None:
+        """
+        Capture one frame per level and reduce the frames to their mean voltage.
+        """
+        gen, osc = self.model.gen, self.model.osc
+        frames = len(levels)
+        hor_scale = float(self.settings.get("FRAME_HOR_SCALE", 1e-4))
+        settle = float(self.settings.get("FRAME_SETTLE", 0.005))
+        forced = self.settings.get("FRAME_TRIGGER", "FORCE") == "FORCE"
+
+        self.setup_frames(frames, hor_scale, forced)
+        try:
+            gen.setup_list_sweep(np.full(frames, frequency), levels, trigger="BUS")
+            if forced:
+                gen.start_list_sweep()
+            osc.ready_for_acquisition()
+            time.sleep(0.2)
+            if not forced:
+                gen.start_list_sweep()  # the trigger output of the first row fires the first frame
+
+            for frame in range(frames):
+                if self.model.is_stop():
+                    return None
+                if frame:
+                    gen.trigger_next_point()
+                time.sleep(settle)  # wait for the level and the detector to settle
+                if forced:
+                    osc.trigger_force()
+                time.sleep(hor_scale * 10)  # frame duration
+
+            if not self.wait_acquisition(frames * hor_scale * 10):
+                logger.warning(f"FastFrame acquisition at {frequency} Hz was not completed")
+                return None
+
+            _, voltage_data = osc.get_frames_data(frames)
+            return voltage_data.mean(axis=1)
+        except ValueError as e:
+            logger.warning(f"FastFrame acquisition at {frequency} Hz failed: {e}")
+            return None
+        finally:
+            gen.stop_list_sweep()
+            self.restore_frames()
+
+    def setup_frames(self, frames: int, hor_scale: float, forced: bool) -> None:
+        """
+        Set the oscilloscope to the segmented acquisition.
+
+        Parameters:
+            frames (int): Number of frames
+            hor_scale (float): Horizontal scale of a frame in s/div
+            forced (bool): True if the frames are forced, False for the AUX trigger input
+        """
+        osc = self.model.osc
+        self._saved_points = (osc.get_record_length(), osc.get_data_points())
+        osc.set_horizontal_scale(hor_scale)
+        osc.set_record_length(self.FRAME_POINTS)
+        osc.set_fastframe(frames)
+        osc.set_data_frames(1, frames)
+        osc.set_data_points(self.FRAME_POINTS)
+        if not forced:
+            self._saved_slope = osc.get_trigger_slope()
+            osc.set_trigger_source("AUX")
+            osc.set_trigger_slope("RISe")
+
+    def restore_frames(self) -> None:
+        """Restore the acquisition settings of the point measurement."""
+        osc = self.model.osc
+        osc.fastframe_off()
+        if self._saved_points is not None:
+            record_length, data_points = self._saved_points
+            osc.set_record_length(record_length)
+            osc.set_data_points(data_points)
+        osc.set_horizontal_scale(self.settings["HOR_SCALE"])
+        if self.settings.get("FRAME_TRIGGER", "FORCE") != "FORCE":
+            osc.set_trigger_source(f"CH{self.settings['CHANNEL']}")
+            if self._saved_slope is not None:
+                osc.set_trigger_slope(self._saved_slope)
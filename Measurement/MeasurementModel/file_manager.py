@@ -1,8 +1,12 @@
-from Instruments.rsa5000vna_parcer import RSA506N_S21_Parser
 from PyQt6.QtWidgets import QFileDialog
 from ..helper_functions import read_csv_file, open_file
+from .s21_library import S21Cache, S21Library
+from .devices_setup import DevicesSetup
+from Measurement.Calibration.results import RESULT_FORMATS, write_results as write_results_file
 import os
 import json
+import time
+import hashlib
 import numpy as np
 
 from System.logger import get_logger
@@ -18,8 +22,15 @@ class FileManager:
 
     """
 
+    s21_files = {"S21_GEN_SA": "s21_gen_sa.trs", "S21_GEN_DET": "s21_gen_det.trs"}  # loaded without settings
+    s21_channel_line = "s21_gen_det_ch{}"  # S21 library line of the detector on a channel (multi-channel mode)
+    s21_cache = S21Cache()  # parsed S21 files, shared by the GUI and the loader thread
+
     def __init__(self, meas_model: object) -> None:
         self.model = meas_model
+        self.library = S21Library(self.model.s21_folder, self.s21_cache)
+        self.s21_selection = None  # (setup, frequencies) of the S21 selected from the library
+        self.s21_sources = {}  # S21 key (s21_files, s21_channel_keys): the files of the loaded S21
 
     def load_settings_from_file(self) -> None:
         """
@@ -41,11 +52,38 @@ class FileManager:
         Parameters:
                 default (bool): If True, load the default settings file. If False, load the user settings file.
         """
+        settings, path = self.read_settings(default)
+        if settings:
+            self.model.settings = settings
+            logger.info(f"Settings loaded successfully from {path}")
+
+    def read_settings(self, default: bool = False, path: str = None) -> tuple[dict, str]:
+        """
+        Read the settings file without updating the measurement model.
+
+        Parameters:
+                default (bool): If True, read the default settings file. If False, read the user settings file.
+                path (str): The settings file to read instead of the user or default settings file.
+                    A file name without folder is looked up in the settings folder too.
+
+        Returns:
+            tuple[dict, str]: The settings and the path of the settings file.
+
+        Raises:
+            FileNotFoundError: If the settings file is not found.
+        """
         folder = self.model.settings_folder
         filename = self.model.settings_filename
-        settings = {}
 
-        if default:
+        if path is not None:
+            logger.debug(f"FileManager: load settings {path}")
+            if not os.path.exists(path) and os.path.exists(os.path.join(folder, path)):
+                path = os.path.join(folder, path)
+            if not os.path.exists(path):
+                error_msg = f"Settings file not found: {path}"
+                logger.error(error_msg)
+                raise FileNotFoundError(error_msg)
+        elif default:
             logger.debug("FileManager: load default settings")
             path = os.path.join(folder, f"{filename}_default.json")
             if not os.path.exists(path):
@@ -62,15 +100,11 @@ class FileManager:
 
         try:
             with open(path, "r") as f:
-                settings = json.load(f)
+                return json.load(f), path
         except Exception as e:
             logger.error(f"Failed to load settings from {path}: {e}")
             raise  # Re-raise the exception after logging
 
-        if settings:
-            self.model.settings = settings
-            logger.info(f"Settings loaded successfully from {path}")
-
     def load_default_settings(self) -> None:
         """
         Load default settings from a file.
@@ -150,9 +184,10 @@ class FileManager:
         """
         try:
             if filename is None:
-                path = open_file(self.model.s21_folder, "S21 files (*.trs)")
+                path = open_file(self.model.s21_folder, "S21 files (*.trs *.s2p)")
                 filename = os.path.basename(path)
             self.model.s21_gen_sa = self.parse_s21_file(filename)
+            self.set_s21_source("S21_GEN_SA", filename)
             self.model.s21_file_changed.emit({"S21_GEN_SA_FILENAME": filename})
             return True
         except Exception as e:
@@ -173,33 +208,146 @@ class FileManager:
         """
         try:
             if filename is None:
-                path = open_file(self.model.s21_folder, "S21 files (*.trs)")
+                path = open_file(self.model.s21_folder, "S21 files (*.trs *.s2p)")
                 filename = os.path.basename(path)
             self.model.s21_gen_det = self.parse_s21_file(filename)
+            self.set_s21_source("S21_GEN_DET", filename)
             self.model.s21_file_changed.emit({"S21_GEN_DET_FILENAME": filename})
             return True
         except Exception as e:
             logger.warning(f"Failed to load S21 file: {e}")
             return False
 
-    def load_s21_files(self) -> bool:
+    def load_s21_files(self, settings: dict = None) -> bool:
         """
         Load both S21 parameters files for the lines from generator to spectrum analyzer and generator to detector.
 
         This function will load both S21 parameters files and store them in the measurement model.
+        With settings, the S21 of the lines are selected from the S21 library for the
+        frequencies (RF_FREQUENCIES) and the setup (S21_SETUP) of the settings.
+
+        Parameters:
+            settings (dict): The measurement settings. If None, the default S21 files are loaded.
 
         Returns:
             bool: True if both S21 parameters files were loaded successfully, False otherwise.
         """
-        is_gen_sa_loaded = self.load_s21_gen_sa("s21_gen_sa.trs")
-        is_gen_det_loaded = self.load_s21_gen_det("s21_gen_det.trs")
+        if settings:
+            selected = self.select_s21_files(settings)
+            signals = {"S21_GEN_SA": "S21_GEN_SA_FILENAME", "S21_GEN_DET": "S21_GEN_DET_FILENAME"}
+            channels = self.s21_channel_keys(settings)
+            self.model.s21_gen_det_channels = {}
+            self.s21_sources = {key: files for key, files in self.s21_sources.items() if key in self.s21_files}
+            for key, (label, s21) in selected.items():
+                self.set_s21_source(key, label)
+                if key in channels:
+                    self.model.s21_gen_det_channels[channels[key]] = s21
+                    logger.info(f"S21 of the detector on CH{channels[key]} from {label}")
+                    continue
+                setattr(self.model, key.lower(), s21)
+                self.model.s21_file_changed.emit({signals[key]: label})
+            return all(key in selected for key in self.s21_files)
+
+        is_gen_sa_loaded = self.load_s21_gen_sa(self.s21_files["S21_GEN_SA"])
+        is_gen_det_loaded = self.load_s21_gen_det(self.s21_files["S21_GEN_DET"])
         return is_gen_sa_loaded and is_gen_det_loaded
 
+    def update_s21_files(self, settings: dict) -> bool:
+        """
+        Select the S21 from the library again if the frequencies or the setup of the settings changed.
+
+        A manually loaded S21 file is kept while they are unchanged.
+
+        Returns:
+            bool: True if the S21 were selected again, False otherwise.
+        """
+        if self.s21_selection_key(settings) == self.s21_selection:
+            return False
+        return self.load_s21_files(settings)
+
+    @staticmethod
+    def s21_selection_key(settings: dict) -> tuple:
+        return settings.get("S21_SETUP", ""), tuple(settings.get("RF_FREQUENCIES", ()))
+
+    def set_s21_source(self, key: str, label: str) -> None:
+        """Record the files of the loaded S21 of the key, label - the file name or the ' + ' joined stitched files"""
+        self.s21_sources[key] = label.split(" + ")
+
+    def s21_hashes(self) -> dict:
+        """
+        SHA-256 of the files of the loaded S21, to trace the results to the S21 files
+
+        Returns:
+            dict: {S21 key: {filename: sha256 hex digest, None if the file is not found}}
+        """
+        hashes = {}
+        for key, files in self.s21_sources.items():
+            hashes[key] = {}
+            for filename in files:
+                try:
+                    with open(os.path.join(self.model.s21_folder, filename), "rb") as f:
+                        hashes[key][filename] = hashlib.sha256(f.read()).hexdigest()
+                except OSError:
+                    hashes[key][filename] = None
+        return hashes
+
+    @classmethod
+    def s21_channel_keys(cls, settings: dict) -> dict:
+        """
+        Keys of the S21 of the detector channels in the multi-channel mode.
+
+        Returns:
+            dict: {"S21_GEN_DET_CH<n>": n}, empty for a single detector
+        """
+        if not settings.get("CHANNELS") or not DevicesSetup.is_multi_channel(settings):
+            return {}
+        return {f"S21_GEN_DET_CH{channel}": channel for channel in DevicesSetup.detector_channels(settings)}
+
+    def select_s21_files(self, settings: dict) -> dict:
+        """
+        Select the S21 of both lines from the S21 library.
+
+        The newest file of the line and setup covering the frequencies is used,
+        otherwise the covering files are stitched (see S21Library.select).
+        In the multi-channel mode the line of every detector behind the splitter
+        (s21_gen_det_ch<n>) is selected too, a detector without its line uses S21_GEN_DET.
+        Does not change the measurement model, can be called by the loader thread.
+
+        Parameters:
+            settings (dict): The measurement settings with RF_FREQUENCIES and the optional S21_SETUP.
+
+        Returns:
+            dict: {"S21_GEN_SA": (files label, s21), "S21_GEN_DET": ..., "S21_GEN_DET_CH<n>": ...}
+                of the selected lines.
+        """
+        setup = settings.get("S21_SETUP", "")
+        freq_min, freq_max, freq_points = settings["RF_FREQUENCIES"]
+        frequencies = np.linspace(freq_min, freq_max, int(freq_points))
+
+        lines = {key: S21Library.split_name(filename)[0] for key, filename in self.s21_files.items()}
+        for key, channel in self.s21_channel_keys(settings).items():
+            lines[key] = self.s21_channel_line.format(channel)
+
+        selected = {}
+        for key, line in lines.items():
+            try:
+                result = self.library.select(line, frequencies, setup)
+            except Exception as e:
+                logger.warning(f"Failed to select S21 of {line}: {e}")
+                continue
+            label = " + ".join(result["FILES"])
+            logger.debug(f"FileManager: S21 of {line} from {label}")
+            selected[key] = (label, (result["FREQUENCY"], result["MAGNITUDE_DB"]))
+        self.s21_selection = self.s21_selection_key(settings)
+        return selected
+
     def parse_s21_file(self, filename: str) -> tuple[list[float], list[float]]:
         """
-        Parse an S21 file and return the frequency and magnitude data.
+        Parse an S21 file (.trs of the RSA5000 VNA or Touchstone .s2p) and return the frequency and magnitude data.
 
         This function will parse an S21 file and return the frequency and magnitude data.
+        The parsed data is kept in the LRU cache (s21_cache) by the path, modification
+        time and size of the file, so an unchanged file is not parsed again.
 
         Parameters:
             filename (str): The filename of the S21 file to parse.
@@ -216,15 +364,15 @@ class FileManager:
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
 
-        parser = RSA506N_S21_Parser(path)
-        data = parser.parse_file()
-        return (data["FREQUENCY"], data["MAGNITUDE_DB"])
+        return self.s21_cache.load(path)  # .trs or Touchstone .s2p
 
     def save_results(self) -> None:
         """
-        Save the measurement results to a CSV file.
+        Save the measurement results to a results file.
 
-        This function will save the measurement results to a CSV file. The filename will be selected by the user through a file dialog.
+        This function will save the measurement results to a results file. The filename will be selected by the user through a file dialog.
+        The format is selected by the extension: CSV or the binary column formats with the metadata
+        (.npz, HDF5 .h5 and Parquet .parquet, see write_results).
 
         The CSV file will contain the following columns:
 
@@ -235,28 +383,76 @@ class FileManager:
         - S21 parameter from generator to spectrum analyzer (dB)
         - S21 parameter from generator to detector (dB)
         - Detector input power level (dBm) - Recalculated via S21 parameters
+
+        In the multi-channel mode (CHANNELS) the voltage, the S21 from generator to detector
+        and the detector level are columns of every detector channel (results_header).
         """
         try:
             filename, _ = QFileDialog.getSaveFileName(
                 caption="Save results",
                 directory=os.path.join("results.csv"),
-                filter="CSV files (*.csv)",
+                filter=self.results_file_filter(),
             )
         except Exception as e:
             logger.warning(f"Failed to open file dialog: {e}")
 
         if filename:
             try:
-                file_header = "Gen Frequency (Hz), Gen Level (dBm), SA Level (dBm), Osc Voltage (V), S21 Gen-Sa (dB), S21 Gen-Det (dB), Det Level (dBm)"
-                np.savetxt(
-                    filename, self.model.meas_data, delimiter=",", header=file_header
-                )
-                logger.info(f"Results saved to {filename}")
+                self.write_results(filename)
             except Exception as e:
                 logger.error(f"Failed to save results to {filename}: {e}")
         else:
             logger.warning(f"No file selected")
 
+    def write_results(self, path: str, data: list = None, metadata: dict = None) -> None:
+        """
+        Write the measurement results (the columns of save_results) to a results file.
+
+        The format is selected by the extension (Calibration.results.write_results),
+        the binary formats store results_metadata() too.
+
+        Parameters:
+            path (str): The results file
+            data (list): The result rows, the measurement data of the model by default
+            metadata (dict): Metadata added to (or replacing the keys of) results_metadata()
+
+        Raises:
+            ValueError: If the extension is not a results format.
+            ImportError: If the package of the results format is not installed.
+        """
+        write_results_file(
+            path, self.model.meas_data if data is None else data, self.model.settings.get("CHANNELS"),
+            {**self.results_metadata(), **(metadata or {})},
+        )
+        logger.info(f"Results saved to {path}")
+
+    def results_metadata(self) -> dict:
+        """
+        Metadata of the results: the settings, the *IDN? of the instruments,
+        the SHA-256 of the S21 files (s21_hashes) and the timing of the last measurement.
+        """
+        instruments = {
+            name: getattr(instr, "idn", None)
+            for name, instr in (("GEN", self.model.gen), ("SA", self.model.sa), ("OSC", self.model.osc))
+            if instr is not None
+        }
+        engine = getattr(self.model, "engine", None)
+        return {
+            "SAVED": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "SETTINGS": self.model.settings,
+            "INSTRUMENTS": instruments,
+            "S21_FILES": self.s21_hashes(),
+            "TIMING": dict(engine.timing) if engine is not None else {},
+        }
+
+    @staticmethod
+    def results_file_filter() -> str:
+        """File dialog filter of the results formats"""
+        extensions = {}
+        for extension, file_format in RESULT_FORMATS.items():
+            extensions.setdefault(file_format, []).append(f"*{extension}")
+        return ";;".join(f"{file_format} files ({' '.join(patterns)})" for file_format, patterns in extensions.items())
+
     @staticmethod
     def load_units(folder: str='Settings') -> dict:
         """
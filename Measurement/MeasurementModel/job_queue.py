@@ -0,0 +1,254 @@
+from Measurement.MeasurementModel.meas_engine import MeasurementEngine, MeasurementPlan
+
+import json
+import os
+import time
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class JobQueue:
+    """
+    Persistent queue of detector calibration jobs (JSON file).
+
+    A job is a dict:
+        ID (int), SERIAL (str) - the detector serial number
+        SETTINGS (str) - the settings profile file (FileManager.read_settings)
+        S21_SETUP (str | None) - the S21 library setup (S21Library), None: the setup of the settings
+        OUT (str) - the results file
+        STATUS - PENDING, RUNNING, DONE or FAILED
+        ADDED, STARTED, FINISHED (str) - local times
+        TIMING (dict) - LOAD, SETUP, MEASUREMENT, SAVE and TOTAL times in s, see JobWorker
+        SETUP_REUSED (bool), POINTS (int), ERROR (str | None)
+
+    The file is rewritten after every change (temporary file and os.replace),
+    so the queue survives an interrupted run: the RUNNING jobs are pending again
+    after recover().
+    """
+
+    STATUSES = ("PENDING", "RUNNING", "DONE", "FAILED")
+    default_path = os.path.join("Jobs", "job_queue.json")
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path or self.default_path
+        self.jobs = []
+        self.load()
+
+    def load(self) -> None:
+        """Read the jobs of the queue file, an empty queue if the file does not exist"""
+        if not os.path.exists(self.path):
+            self.jobs = []
+            return
+        with open(self.path, "r") as f:
+            self.jobs = json.load(f)
+
+    def save(self) -> None:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as f:
+            json.dump(self.jobs, f, indent=4)
+        os.replace(temp, self.path)
+
+    def add(self, serial: str, settings: str, out: str, s21_setup: str = None) -> dict:
+        """
+        Append a pending job to the queue.
+
+        Parameters:
+            serial (str): The detector serial number
+            settings (str): The settings profile file
+            out (str): The results file
+            s21_setup (str): The S21 library setup, None: the S21_SETUP of the settings
+
+        Returns:
+            dict: The new job
+        """
+        job = {
+            "ID": max((job["ID"] for job in self.jobs), default=0) + 1,
+            "SERIAL": serial,
+            "SETTINGS": settings,
+            "S21_SETUP": s21_setup,
+            "OUT": out,
+            "STATUS": "PENDING",
+            "ADDED": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "STARTED": None,
+            "FINISHED": None,
+            "TIMING": {},
+            "SETUP_REUSED": False,
+            "POINTS": 0,
+            "ERROR": None,
+        }
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def update(self, job: dict, **fields) -> None:
+        """Change the fields of a job and save the queue"""
+        job.update(fields)
+        self.save()
+
+    def pending(self) -> list:
+        return [job for job in self.jobs if job["STATUS"] == "PENDING"]
+
+    def next_job(self) -> dict | None:
+        """The first pending job"""
+        pending = self.pending()
+        return pending[0] if pending else None
+
+    def recover(self) -> int:
+        """Return the RUNNING jobs of an interrupted run to the queue, returns their number"""
+        running = [job for job in self.jobs if job["STATUS"] == "RUNNING"]
+        for job in running:
+            job["STATUS"] = "PENDING"
+        if running:
+            logger.warning(f"JobQueue: {len(running)} interrupted jobs are pending again")
+            self.save()
+        return len(running)
+
+    def retry(self, status: str = "FAILED") -> int:
+        """Return the jobs of the status to the queue, returns their number"""
+        jobs = [job for job in self.jobs if job["STATUS"] == status]
+        for job in jobs:
+            job.update(STATUS="PENDING", ERROR=None)
+        if jobs:
+            self.save()
+        return len(jobs)
+
+
+class JobWorker:
+    """
+    Runs the pending jobs of a JobQueue back to back on one bench.
+
+    The model provides the connected instruments, the settings and S21 files
+    (FileManager), the S21 recalculation and the results file. One MeasurementEngine
+    measures all jobs with reuse_setup, so the instrument presets and setup are
+    skipped when consecutive jobs share the setup configuration.
+
+    TIMING of every job: LOAD (settings and S21), SETUP (instruments), MEASUREMENT,
+    SAVE (recalculation and results file) and TOTAL, in s.
+    """
+
+    def __init__(self, queue: JobQueue, model: object, on_event: callable = None) -> None:
+        """
+        Parameters:
+            queue (JobQueue): The jobs
+            model (MeasurementModel): The model with the connected instruments
+            on_event (callable): Called with (job, event) for every MeasurementEngine event
+        """
+        self.queue = queue
+        self.model = model
+        self.on_event = on_event
+        self.engine = MeasurementEngine(model.gen, model.sa, model.osc)
+        self.engine.reuse_setup = True
+        self._stop_requested = False
+
+    def stop(self) -> None:
+        """Stop the running job, it stays pending, and the run"""
+        self._stop_requested = True
+        self.engine.stop()
+
+    def run(self) -> int:
+        """
+        Run the pending jobs until the queue is empty or stop() is requested.
+
+        Returns:
+            int: The number of failed jobs
+        """
+        self._stop_requested = False
+        self.queue.recover()
+        failed = 0
+        while not self._stop_requested:
+            job = self.queue.next_job()
+            if job is None:
+                break
+            if not self.run_job(job):
+                failed += 1
+        return failed
+
+    def run_job(self, job: dict) -> bool:
+        """
+        Measure one job and save its results.
+
+        Returns:
+            bool: True if the job is done, False if it failed or was stopped
+        """
+        logger.info(f"Job {job['ID']}: detector {job['SERIAL']}, settings {job['SETTINGS']}")
+        self.queue.update(job, STATUS="RUNNING", STARTED=time.strftime("%Y-%m-%d %H:%M:%S"), ERROR=None)
+        timing = {}
+        start = time.perf_counter()
+        try:
+            settings = self.load(job)
+            timing["LOAD"] = time.perf_counter() - start
+
+            points, error = [], None
+            for event in self.engine.run(MeasurementPlan.from_settings(settings)):
+                if self.on_event is not None:
+                    self.on_event(job, event)
+                if "POINT" in event:
+                    points.append(event["POINT"])
+                if "ERROR" in event:
+                    error = event["ERROR"]
+            timing["SETUP"] = self.engine.timing.get("SETUP")
+            timing["MEASUREMENT"] = self.engine.timing.get("MEASUREMENT")
+            job["SETUP_REUSED"] = self.engine.timing.get("SETUP_REUSED", False)
+            if self._stop_requested:
+                self.queue.update(job, STATUS="PENDING", ERROR="stopped", TIMING=timing)
+                return False
+            if error is not None:
+                raise RuntimeError(error)
+
+            save_start = time.perf_counter()
+            self.save(job, settings, points, timing)
+            timing["SAVE"] = time.perf_counter() - save_start
+            timing["TOTAL"] = time.perf_counter() - start
+            self.queue.update(
+                job, STATUS="DONE", POINTS=len(points), TIMING=timing,
+                FINISHED=time.strftime("%Y-%m-%d %H:%M:%S"),
+            )
+            logger.info(f"Job {job['ID']} done: {len(points)} points in {timing['TOTAL']:.1f} s")
+            return True
+        except Exception as e:
+            timing["TOTAL"] = time.perf_counter() - start
+            logger.error(f"Job {job['ID']} failed: {e}")
+            self.queue.update(
+                job, STATUS="FAILED", ERROR=str(e), TIMING=timing,
+                FINISHED=time.strftime("%Y-%m-%d %H:%M:%S"),
+            )
+            return False
+
+    def load(self, job: dict) -> dict:
+        """
+        Read the settings profile of the job and load its S21 into the model.
+
+        Raises:
+            FileNotFoundError: If the S21 of the setup cannot be loaded, the results
+                would not be corrected by the S21 of the job.
+        """
+        file_manager = self.model.file_manager
+        settings, _ = file_manager.read_settings(path=job["SETTINGS"])
+        if job.get("S21_SETUP") is not None:
+            settings = dict(settings, S21_SETUP=job["S21_SETUP"])
+        self.model.s21_gen_sa = self.model.s21_gen_det = None  # not the S21 of the previous job
+        if not file_manager.load_s21_files(settings):
+            raise FileNotFoundError(f"S21 of the setup {settings.get('S21_SETUP')!r} not loaded")
+        self.model.settings = settings
+        return settings
+
+    def save(self, job: dict, settings: dict, points: list, timing: dict = None) -> None:
+        """
+        Recalculate the detector levels (S21) and write the results file of the job.
+
+        The metadata of a binary results file has the job, its serial number and the timing so far.
+        """
+        self.model.meas_data = points
+        if (settings.get("RECALC_ATTEN", False) or job.get("S21_SETUP") is not None) and self.model.is_spar():
+            self.model.recalc_data()
+        folder = os.path.dirname(job["OUT"])
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.model.file_manager.write_results(
+            job["OUT"], metadata={"JOB": job["ID"], "SERIAL": job["SERIAL"], "TIMING": dict(timing or {})}
+        )
@@ -0,0 +1,608 @@
+from Measurement.MeasurementModel.devices_setup import DevicesSetup
+from Measurement.MeasurementModel.power_ramp import PowerRamp
+from Measurement.MeasurementModel.fast_frame import FastFrameCapture
+
+from collections.abc import Iterator
+import numpy as np
+import time
+import os
+
+from System.logger import get_logger, scpi_history
+from System.tracer import tracer, traced
+
+logger = get_logger(__name__)
+
+
+class MeasurementPlan:
+    """
+    Frequencies and generator levels of a measurement with its settings.
+
+    Args:
+        frequencies (list): Frequencies in Hz
+        levels (list): Generator levels in dBm
+        settings (dict): Measurement settings (Settings/meas_settings.json)
+    """
+
+    def __init__(self, frequencies: list, levels: list, settings: dict) -> None:
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.levels = np.asarray(levels, dtype=float)
+        self.settings = settings
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "MeasurementPlan":
+        """The sweep of the RF_FREQUENCIES and RF_LEVELS settings"""
+        freq_min, freq_max, freq_points = settings["RF_FREQUENCIES"]
+        level_min, level_max, level_points = settings["RF_LEVELS"]
+        return cls(
+            np.linspace(freq_min, freq_max, int(freq_points)),
+            np.linspace(level_min, level_max, int(level_points)),
+            settings,
+        )
+
+    def __len__(self) -> int:
+        return len(self.frequencies) * len(self.levels)
+
+
+class MeasurementEngine:
+    """
+    Measurement process without Qt.
+
+    run() is a generator of the measurement events, the same messages the
+    MeasurementModel emits to the GUI:
+        {"FREQUENCY": frequency} - a new frequency is measured
+        {"PROGRESS": percent} - before every point
+        {"POINT": [frequency, level, sa_level, voltage]} - a measured point,
+            in the multi-channel mode (CHANNELS) a voltage of every detector channel
+        {"STOP": True} - the measurement was stopped
+        {"ERROR": message} - the measurement failed
+
+    The next point is measured only when the consumer asks for the next event,
+    so a slow consumer holds the bench instead of buffering points. Closing the
+    generator early turns the generator output off as a finished run does.
+
+        engine = MeasurementEngine(gen, sa, osc)
+        for point in engine.points(MeasurementPlan.from_settings(settings)):
+            ...
+
+    Args:
+        gen, sa, osc: The connected generator, spectrum analyzer and oscilloscope
+        settings (dict): Measurement settings, replaced by the settings of the plan in run()
+    """
+
+    SA_TOLERANCE = 6  # SA measured level greater than noise level
+    trace_folder = "Traces"
+
+    def __init__(self, gen: object = None, sa: object = None, osc: object = None, settings: dict = None) -> None:
+        self.gen = gen  # Microwave generator
+        self.sa = sa  # Spectrum analyzer
+        self.osc = osc  # Oscilloscope
+        self.settings = settings or {}
+        self.reuse_setup = False  # skip the instrument setup if the configuration is unchanged (setup_devices)
+        self.timing = {}  # SETUP, MEASUREMENT (s) and SETUP_REUSED of the last run
+        self._stop_requested = False
+        self._setup_key = None  # DevicesSetup.setup_key of the current instrument setup
+        self.level_captures = {
+            "POWER_RAMP": PowerRamp(self),
+            "FASTFRAME": FastFrameCapture(self),
+        }
+
+    def stop(self) -> None:
+        """Request the stop of the running measurement, from any thread."""
+        self._stop_requested = True
+
+    def is_stop(self) -> bool:
+        """Check if stop is requested."""
+        return self._stop_requested
+
+    def points(self, plan: MeasurementPlan) -> Iterator[list]:
+        """The measured points [frequency, level, sa_level, voltage, ...] of run()"""
+        for event in self.run(plan):
+            if "POINT" in event:
+                yield event["POINT"]
+
+    def run(self, plan: MeasurementPlan) -> Iterator[dict]:
+        """
+        General measurement process.
+
+        The measurement process consists of the following steps:
+        1. Setup the instruments according to the measurement settings
+        2. Loop over the frequencies and the power levels of the plan (measurement_loop)
+        3. Turn the generator off
+
+        A setup error ends the run with the ERROR event as an error of the loop does.
+
+        The process can be stopped by stop() until the measurement is finished.
+
+        :param plan: The frequencies, levels and settings of the measurement
+        :return: Generator of the measurement events
+        """
+        self.settings = plan.settings
+        self._stop_requested = False
+        if self.is_multi_channel() and any(self.settings.get(key, False) for key in ("POWER_RAMP", "FASTFRAME", "CURVE_STREAM")):
+            logger.warning("Multi-channel mode: POWER_RAMP, FASTFRAME and CURVE_STREAM are not used, measuring level by level")
+
+        tracing = self.settings.get("TRACE", False)
+        if tracing:
+            tracer.enable()
+        self.timing = {}
+        try:
+            start = time.perf_counter()
+            try:
+                with tracer.span("setup"):
+                    reused = self.setup_devices()
+            except Exception as e:
+                logger.error(f"Instrument setup error: {e}")
+                scpi_history.dump(logger, "instrument setup error")
+                self._setup_key = None  # the instrument state is unknown
+                try:
+                    self.gen_off()
+                except Exception as off_error:
+                    logger.error(f"Failed to turn the generator off: {off_error}")
+                yield {"ERROR": str(e)}
+                yield {"PROGRESS": 100}
+                return
+            self.timing = {"SETUP": time.perf_counter() - start, "SETUP_REUSED": reused}
+
+            start = time.perf_counter()
+            yield from self.measurement_loop(plan.frequencies, plan.levels)
+            self.timing["MEASUREMENT"] = time.perf_counter() - start
+        finally:
+            if tracing:
+                self.save_trace()
+
+    def setup_devices(self) -> bool:
+        """
+        Set up the instruments for the settings (DevicesSetup).
+
+        With reuse_setup the presets and the setup are skipped if the previous run
+        set the instruments up with the same configuration (DevicesSetup.setup_key),
+        only the generator sweep is prepared.
+
+        :return: True if the previous setup was reused
+        """
+        key = DevicesSetup.setup_key(self.gen, self.sa, self.osc, self.settings)
+        if self.reuse_setup and key == self._setup_key:
+            logger.info("Instrument setup unchanged, the setup is skipped")
+            DevicesSetup.gen_sweep_setup(self.gen, self.settings)
+            return True
+
+        self._setup_key = None
+        DevicesSetup.setup(self.gen, self.sa, self.osc, self.settings)
+        self._setup_key = key
+        return False
+
+    def save_trace(self) -> None:
+        """
+        Save the SCPI command trace of the measurement in the Chrome trace format
+        (chrome://tracing, ui.perfetto.dev) and log the command latency summary.
+        """
+        tracer.disable()
+        filename = f"trace_{time.strftime('%Y%m%d_%H%M%S')}.json"
+        try:
+            path = tracer.export_chrome(os.path.join(self.trace_folder, filename))
+            logger.info(f"Measurement trace saved to {path}\n{tracer.format_summary()}")
+        except OSError as e:
+            logger.error(f"Failed to save the measurement trace: {e}")
+
+    def measurement_loop(self, frequencies: list, levels: list) -> Iterator[dict]:
+        """
+        Main measurement loop.
+
+        This method  will loop over all frequencies and power levels and start the measurement for each combination.
+
+        The method can be break out of the loop and stop the measurement.
+
+        :param frequencies: List of frequencies
+        :param levels: List of power levels
+        :return: Generator of the measurement events
+        """
+        meas_points = len(frequencies) * len(levels)
+        point_number = iter(range(0, meas_points))
+        try:
+            self.gen_on()
+            if self.is_curve_stream():
+                self.osc.start_curve_stream()
+
+            # Main measurement loop
+            for frequency in frequencies:
+                if self.is_stop():
+                    break
+                with tracer.span("frequency", frequency=frequency):
+                    yield {"FREQUENCY": frequency}
+
+                    self.set_sa_wide_band()
+                    if not self.is_list_sweep():
+                        self.gen.set_frequency(frequency)
+                    elif not DevicesSetup.fits_sweep_list(self.gen, self.settings):
+                        DevicesSetup.gen_frequency_sweep_setup(self.gen, frequency, levels)
+                    self.sa_set_center_freq(frequency)
+                    self.gen_set_max_level(levels, frequency)
+                    self.sa_start_measurement()
+
+                    if self.settings["PRECISE"]:
+                        if self.is_stop():
+                            break
+                        self.sa_set_precise_mode()
+                        self.sa_start_measurement()
+
+                    level_capture = self.level_capture()
+                    if level_capture is not None:
+                        capture_points = level_capture.measure(frequency, levels)
+                        if capture_points is not None:
+                            for point in capture_points:
+                                yield self.progress(point_number, meas_points)
+                                yield {"POINT": point}
+                            continue
+                        logger.info("Level capture failed, measuring level by level")
+
+                    for level in reversed(levels):
+                        if self.is_stop():
+                            break
+                        logger.debug(
+                            "Frequency: %.2f MHz; Level: %.2f dBm", frequency / 1e6, level
+                        )
+                        yield self.progress(point_number, meas_points)
+
+                        with tracer.span("point", frequency=frequency, level=level):
+                            self.gen_set_level(frequency, level)
+
+                            sa_data, osc_data = self.single_measurement()
+                            mean_osc_value = self.osc_voltage_refinement(osc_data)
+                            max_sa_value = self.sa_level_checking(sa_data)
+
+                        if max_sa_value:
+                            if self.is_multi_channel():
+                                yield {"POINT": [frequency, level, max_sa_value, *mean_osc_value]}
+                            else:
+                                yield {"POINT": [frequency, level, max_sa_value, mean_osc_value]}
+                        else:
+                            logger.warning(
+                                f"Measured signal at ({frequency} Hz, {level} dBm) is less than limit ({self.SA_TOLERANCE} dBm)"
+                            )
+        except Exception as e:
+            logger.error(f"Measurement loop error: {e}")
+            scpi_history.dump(logger, "measurement loop error")
+            self._setup_key = None  # the instrument state is unknown
+            yield {"ERROR": str(e)}
+        finally:
+            self.osc.stop_curve_stream()
+            self.gen_off()
+        if self.is_stop():
+            yield {"STOP": True}
+        yield {"PROGRESS": 100}
+
+    @staticmethod
+    def progress(point_number: Iterator[int], max_len: int) -> dict:
+        """
+        The progress event of the next point in %.
+
+        :param point_number: The iterator of the point numbers
+        :param max_len: The number of points
+        """
+        try:
+            return {"PROGRESS": int((next(point_number) / max_len) * 100)}
+        except StopIteration:
+            return {"PROGRESS": 100}
+
+    @traced("single_measurement")
+    def single_measurement(self) -> tuple:
+        """
+        This method is used to perform a single measurement.
+
+        In curve stream mode the oscilloscope is not armed, the latest settled
+        frame of the stream is taken after the spectrum analyzer measurement.
+
+        :return: Spectrum Analyzer data and Oscilloscope data
+        """
+        if self.osc.is_streaming():
+            since = time.time()
+            self.sa_start_measurement()
+            spectrum_data = self.sa.get_trace_data()
+            return spectrum_data, self.osc_acquire(since)
+
+        # Start measurement
+        self.osc.ready_for_acquisition()
+        time.sleep(0.2)
+
+        self.sa_start_measurement()
+        self.osc.trigger_force()
+
+        while self.osc.is_acquiring():
+            if self.is_stop():
+                break  # Waiting for finish measurement
+            time.sleep(0.1)
+
+        spectrum_data = self.sa.get_trace_data()
+        return spectrum_data, self.osc_read()
+
+    @traced("osc_acquire")
+    def osc_acquire(self, since: float = None) -> list:
+        """
+        Acquire a new Oscilloscope waveform.
+
+        In curve stream mode the latest frame acquired after the time since is taken
+        from the stream, otherwise a single sequence is armed and forced.
+        If the stream does not deliver a frame, it is stopped and a single sequence is used.
+
+        :param since: The time (time.time()) of the last change of the measured signal
+        :return: The measured Oscilloscope data
+        """
+        if self.osc.is_streaming():
+            osc_data = self.osc.get_stream_frame(since)
+            if osc_data is not None:
+                return osc_data
+            logger.warning("Curve stream stopped, using single sequence acquisition")
+            if not self.osc.stop_curve_stream():
+                raise RuntimeError("Curve stream cannot be stopped")
+
+        self.osc.ready_for_acquisition()
+        time.sleep(0.2)
+        self.osc.trigger_force()  # Start measurement
+
+        while self.osc.is_acquiring():  # Waiting for finish measurement
+            if self.is_stop():
+                break
+            time.sleep(0.1)
+
+        return self.osc_read()
+
+    def osc_read(self) -> np.ndarray:
+        """
+        Read the acquired Oscilloscope waveform.
+
+        In the multi-channel mode the waveforms of all detector channels are read
+        with one transfer as (channels, points) array.
+
+        :return: The measured Oscilloscope data
+        """
+        if self.is_multi_channel():
+            _, osc_data = self.osc.get_channels_data(self.detector_channels())
+        else:
+            _, osc_data = self.osc.get_waveform_data()
+        return osc_data
+
+    @traced("autorange")
+    def osc_voltage_refinement(self, osc_data: list) -> float | list:
+        """
+        Method for refining the Oscilloscope voltage range (Y-scale)
+        to ensure the measured voltage is within the optimal range of the Oscilloscope.
+
+        In the multi-channel mode the scale of every channel is refined and all
+        channels are acquired again until no scale changes.
+
+        :param osc_data: The measured Oscilloscope data
+        :return: The refined mean Oscilloscope voltage, a list of the channel voltages in the multi-channel mode
+        """
+        if self.is_multi_channel():
+            channels = self.detector_channels()
+            mean_osc_values = np.mean(osc_data, axis=1)
+            while any([self.check_osc_range(value, channel) for value, channel in zip(mean_osc_values, channels)]):
+                if self.is_stop():
+                    break
+                mean_osc_values = np.mean(self.osc_acquire(time.time()), axis=1)
+            return mean_osc_values.tolist()
+
+        mean_osc_value = np.mean(osc_data)
+
+        while self.check_osc_range(mean_osc_value):
+            if self.is_stop():
+                break
+
+            osc_data = self.osc_acquire(time.time())
+            mean_osc_value = np.mean(osc_data)
+
+        return mean_osc_value
+
+    def sa_level_checking(self, spectrum_data: list) -> float:
+        """
+        Method for checking the level of the measured Spectrum Analyzer data.
+
+        If the maximum measured value is greater than the mean value plus the tolerance,
+        the maximum value is returned. Otherwise, 0 is returned.
+
+        :param spectrum_data: The measured Spectrum Analyzer data
+        :return: The maximum measured value or 0 if within tolerance
+        """
+        max_value = np.max(spectrum_data)
+        mean_value = np.mean(spectrum_data)
+        limit = mean_value + self.SA_TOLERANCE  # +6 dBm
+
+        if max_value > limit:
+            return max_value
+        else:
+            return 0
+
+    def gen_on(self) -> None:
+        """
+        Turns the generator output power on.
+
+        This method is used to turn the generator on before starting a measurement.
+        """
+        self.gen.rf_on()
+        time.sleep(0.1)
+
+    def gen_off(self) -> None:
+        """
+        Turns the generator output power off.
+
+        This method is used to turn the generator off after a measurement is finished.
+        """
+        self.gen.rf_off()
+        if self.gen.is_list_sweep_running():
+            self.gen.stop_list_sweep()
+        self.gen.set_min_level()
+
+    def level_capture(self) -> object | None:
+        """
+        Get the enabled capture of all levels of a frequency at once.
+
+        POWER_RAMP: all levels are measured with one oscilloscope record (see PowerRamp).
+        FASTFRAME: every level is measured with one frame of a segmented acquisition
+        (see FastFrameCapture).
+
+        :return: The enabled LevelCapture, or None for level by level measurement
+        """
+        if self.is_multi_channel():
+            return None  # the captures read one data source
+        for key, capture in self.level_captures.items():
+            if self.settings.get(key, False):
+                return capture
+        return None
+
+    def detector_channels(self) -> list:
+        """The oscilloscope channels of the detectors (DevicesSetup.detector_channels)"""
+        return DevicesSetup.detector_channels(self.settings)
+
+    def is_multi_channel(self) -> bool:
+        """
+        Check if several detectors behind a splitter are measured at once (CHANNELS).
+
+        Every point has the voltage of every detector channel, the channels
+        are autoranged separately and read by one CURVE? transfer.
+        """
+        return DevicesSetup.is_multi_channel(self.settings)
+
+    def is_curve_stream(self) -> bool:
+        """
+        Check if the oscilloscope waveforms are taken from the continuous curve stream.
+
+        The curve stream is not used together with a level capture, which needs
+        its own acquisition mode.
+        """
+        return (
+            bool(self.settings.get("CURVE_STREAM", False)) and self.level_capture() is None and not self.is_multi_channel()
+        )
+
+    def is_list_sweep(self) -> bool:
+        """
+        Check if the generator is stepped through the uploaded list sweep.
+
+        In list sweep mode the frequency/level table is uploaded to the generator
+        by DevicesSetup and every measurement point is reached by a trigger.
+        """
+        return bool(self.settings.get("LIST_SWEEP", False)) and self.level_capture() is None
+
+    def gen_set_max_level(self, levels: list, frequency: float = None) -> None:
+        """
+        Sets the output level of the generator to the maximum value in the given list.
+
+        :param levels: A list of output levels in dBm
+        :param frequency: The current frequency in Hz (used in list sweep mode)
+        """
+        if self.is_list_sweep():
+            self.gen.step_to(frequency, max(levels))
+        else:
+            self.gen.set_level(max(levels))
+        time.sleep(0.1)  # wait for frequency to be set
+
+    @traced("gen_set_level")
+    def gen_set_level(self, frequency: float, level: float) -> None:
+        """
+        Sets the output level of the generator for the next measurement point.
+
+        In list sweep mode the generator is advanced to the next row of the table.
+
+        :param frequency: The current frequency in Hz
+        :param level: The output level in dBm
+        """
+        if self.is_list_sweep():
+            self.gen.step_to(frequency, level)
+        else:
+            self.gen.set_level(level)
+
+    def sa_set_center_freq(self, frequency: float) -> None:
+        """
+        Sets the center frequency of the Spectrum Analyzer to the given value.
+
+        :param frequency: The center frequency in Hz
+        """
+        self.sa.set_center_freq(frequency)
+        time.sleep(0.1)  # wait for frequency to be set
+
+    @traced("sa_sweep")
+    def sa_start_measurement(self) -> None:
+        """
+        Starts a single measurement on the Spectrum Analyzer.
+
+        If the measurement process is stopped externally, this method will do nothing.
+        """
+        if self.is_stop():
+            return
+        self.sa.start_single_measurement()
+        self.sa.delay_after_start()
+
+    @traced("sa_precise_mode")
+    def sa_set_precise_mode(self) -> None:
+        """
+        Sets the Spectrum Analyzer to precise mode.
+
+        In precise mode, the Spectrum Analyzer is set to the peak frequency of the previous measurement.
+        The narrow band settings are used in this mode.
+
+        If the measurement process is stopped externally, this method will do nothing.
+        """
+        if self.is_stop():
+            return
+        self.sa.find_peak_max()
+        self.sa.set_center_freq(self.sa.get_peak_freq())
+        self.set_sa_narrow_band()
+        time.sleep(0.1)  # wait for frequency to be set
+
+    @traced("sa_wide_band")
+    def set_sa_wide_band(self) -> None:
+        """
+        Sets the Spectrum Analyzer to wide band mode.
+
+        The span, resolution bandwidth (RBW), and video bandwidth (VBW) are set to the values
+        specified in the measurement settings.
+
+        :return: None
+        """
+        self.sa.set_span(self.settings["SPAN_WIDE"])
+        self.sa.set_rbw(self.settings["RBW_WIDE"])
+        self.sa.set_vbw(self.settings["VBW_WIDE"])
+
+    def set_sa_narrow_band(self) -> None:
+        """
+        Sets the Spectrum Analyzer to narrow band mode.
+
+        The span, resolution bandwidth (RBW), and video bandwidth (VBW) are set to the values
+        specified in the measurement settings.
+
+        :return: None
+        """
+        self.sa.set_span(self.settings["SPAN_NARROW"])
+        self.sa.set_rbw(self.settings["RBW_NARROW"])
+        self.sa.set_vbw(self.settings["VBW_NARROW"])
+
+    def check_osc_range(self, value: float, channel: int = None) -> bool:
+        """
+        Check if oscilloscope vertical scale needs adjustment based on measured value.
+        The channel is the selected one by default.
+        Returns True if scale was changed, False otherwise.
+        """
+        current_scale = self.osc.get_vertical_scale(channel)
+        vertical_map = self.osc.vertical_map
+        current_idx = vertical_map.index(current_scale)
+
+        if value > 3 * current_scale:
+            # Move to next higher scale if available
+            if current_idx < len(vertical_map) - 1:  # Not already at the highest scale
+                new_scale = vertical_map[current_idx + 1]
+                self.osc.set_vertical_scale(new_scale, channel)
+                logger.debug(
+                    "Scale increased: %s -> %s (value: %.3fV)", current_scale, new_scale, value
+                )
+                return True
+        elif value < 1 * current_scale:
+            # Move to next lower scale if available
+            if current_idx > 0:
+                new_scale = vertical_map[current_idx - 1]
+                self.osc.set_vertical_scale(new_scale, channel)
+                logger.debug(
+                    "Scale decreased: %s -> %s (value: %.3fV)", current_scale, new_scale, value
+                )
+                return True
+
+        return False
+
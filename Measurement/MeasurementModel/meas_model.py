@@ -1,13 +1,13 @@
 from PyQt6.QtCore import QObject, pyqtSignal
 from Measurement.MeasurementModel.Initializer import Initializer
+from Measurement.MeasurementModel.settings_loader import SettingsLoader
 from .file_manager import FileManager
 from ..helper_functions import get_s21, is_equal_frequencies
 from Measurement.MeasurementModel.measurement_thread import MeasurementThread
+from Measurement.MeasurementModel.meas_engine import MeasurementEngine, MeasurementPlan
 from Measurement.MeasurementModel.devices_setup import DevicesSetup
 
-from multipledispatch import dispatch
 import numpy as np
-import time
 
 from System.logger import get_logger
 
@@ -43,8 +43,6 @@ class MeasurementModel(QObject):
     _s21_gen_det = None
     _s21_gen_sa = None
 
-    SA_TOLERANCE = 6  # SA measured level greater than noise level
-
     _meas_data = []
 
     def __init__(self) -> None:
@@ -55,12 +53,15 @@ class MeasurementModel(QObject):
         self.osc = None  # Oscilloscope
 
         self._offline_debug = False  # Set to True to simulate offline mode
-        self._stop_requested = False
         self._meas_thread = None
+        self.engine = None  # MeasurementEngine of the last measurement
+        self.s21_gen_det_channels = {}  # channel: S21 from generator to the detector (multi-channel mode)
 
         self.initializer = Initializer()
         self.initializer.finished.connect(self.init_instruments)
         self.file_manager = FileManager(self)
+        self.settings_loader = SettingsLoader(self.file_manager)
+        self.settings_loader.finished.connect(self.apply_loaded_settings)
 
     @property
     def settings(self) -> dict:
@@ -82,7 +83,7 @@ class MeasurementModel(QObject):
     def meas_data(self, value: list) -> None:
         """Setter for measurement data."""
         self._meas_data = value
-        self.data_changed.emit(self._meas_data)
+        self.data_changed.emit({"DATA": self._meas_data})
 
     @property
     def s21_gen_det(self) -> dict:
@@ -104,37 +105,30 @@ class MeasurementModel(QObject):
         """Setter for S21 parameters from generator to spectrum analyzer."""
         self._s21_gen_sa = value
 
-    def stop_decorator(func):  # TODO: use this
-        def wrapper(self, *args, **kwargs):
-            if self.is_stop():
-                return
-            return func(self, *args, **kwargs)
-
-        return wrapper
+    def detector_s21(self, channel: int = None) -> tuple:
+        """S21 from generator to the detector on the channel, the S21_GEN_DET line by default"""
+        return self.s21_gen_det_channels.get(channel, self._s21_gen_det)
 
-    def is_stop(self) -> bool:
-        """Check if stop is requested.
-
-        If stop is requested, emit 'STOP' status and return True.
-        """
-        if self._stop_requested:
-            self.progress_status.emit({"STOP": True})
-            return True
-        return False
+    def detector_channels(self) -> list:
+        """The detector channels of the multi-channel mode (DevicesSetup.detector_channels), [None] for one detector"""
+        if not self._settings.get("CHANNELS") or not DevicesSetup.is_multi_channel(self._settings):
+            return [None]
+        return DevicesSetup.detector_channels(self._settings)
 
     def offline_mode(self, mode: bool) -> bool:
-        "Offline mode: Instruments are not initialized"
+        "Offline mode: the simulated instruments are initialized"
         if mode:
             self._offline_debug = True
             self.progress_status.emit({"OFFLINE": True})
         else:
             self._offline_debug = False
+        self.initializer.simulated = self._offline_debug
 
     def is_offline(self) -> bool:
         """
         Check if offline mode is enabled.
 
-        Offline mode: Instruments are not initialized.
+        Offline mode: the simulated bench (Instruments/Simulator) is used instead of the instruments.
 
         Returns:
             bool: True if offline mode is enabled, False otherwise.
@@ -147,8 +141,7 @@ class MeasurementModel(QObject):
         This method will start the instrument initialization process from Initializer.
         """
         if self.is_offline():
-            logger.info("MeasModel init: Offline debug mode")
-            return
+            logger.info("MeasModel init: Offline mode, simulated instruments")
 
         if not self.initializer.isRunning():
             self.initializer.start()
@@ -158,7 +151,7 @@ class MeasurementModel(QObject):
     ) -> None:
         """Handle completion of instrument initialization process"""
         if error:
-            logger.debug("MeasModel_init_complete with error:", error)
+            logger.debug("MeasModel_init_complete with error: %s", error)
             return
 
         instruments = {
@@ -172,14 +165,56 @@ class MeasurementModel(QObject):
                 logger.debug(f"MeasModel: init {self.__getattribute__(name)}")
                 self.equipment_changed.emit({name: instr})
 
-    def load_settings(self) -> None:
+    def load_settings(self, path: str = None) -> None:
         """
         Load the main settings and the S21 parameters from the settings
         files and store them in the MeasurementModel.
+
+        :param path: The settings file, the user settings file by default
+        """
+        settings, path = self.file_manager.read_settings(path=path)
+        if not self.file_manager.load_s21_files(settings): # must be first fo calculation detector power level
+            self.file_manager.load_s21_files()
+        self.settings = settings
+        logger.info(f"Settings loaded successfully from {path}")
+
+    def load_settings_async(self) -> None:
         """
-        self.file_manager.load_s21_files() # must be first fo calculation detector power level
-        self.file_manager.load_settings()
-        
+        Start loading the main settings and the S21 parameters in SettingsLoader.
+
+        s21_file_changed emits {"S21_LOADING": True} now and {"S21_LOADING": False}
+        when the loaded data is stored in the MeasurementModel.
+        """
+        if self.settings_loader.isRunning():
+            return
+        self.s21_file_changed.emit({"S21_LOADING": True})
+        self.settings_loader.start()
+
+    def apply_loaded_settings(self, result: dict) -> None:
+        """Store the settings and the S21 parameters loaded by SettingsLoader"""
+        s21_params = (
+            ("S21_GEN_SA", "s21_gen_sa", "S21_GEN_SA_FILENAME"),
+            ("S21_GEN_DET", "s21_gen_det", "S21_GEN_DET_FILENAME"),
+        )
+        for key, attribute, message_key in s21_params: # must be first fo calculation detector power level
+            if key in result:
+                filename, s21 = result[key]
+                setattr(self, attribute, s21)
+                self.file_manager.set_s21_source(key, filename)
+                self.s21_file_changed.emit({message_key: filename})
+        if result.get("SETTINGS"):
+            channels = self.file_manager.s21_channel_keys(result["SETTINGS"])
+            self.s21_gen_det_channels = {channel: result[key][1] for key, channel in channels.items() if key in result}
+            sources = self.file_manager.s21_sources
+            self.file_manager.s21_sources = {key: files for key, files in sources.items() if not key.startswith("S21_GEN_DET_CH")}
+            for key in channels:
+                if key in result:
+                    self.file_manager.set_s21_source(key, result[key][0])
+        if result.get("SETTINGS"):
+            self.settings = result["SETTINGS"]
+        for error in result["ERRORS"]:
+            logger.error("MeasModel: settings loading: %s", error)
+        self.s21_file_changed.emit({"S21_LOADING": False})
 
 
     def get_data_from_frequency(self, frequency):
@@ -193,14 +228,7 @@ class MeasurementModel(QObject):
         """
         Measurement Initializations and preparations
         """
-        abort = False
-        equipment = [self.gen, self.sa, self.osc]
-        for instr in equipment:
-            if not instr.is_initialized():
-                logger.warning(f"Instrument {instr.__class__.__name__} not initialized")
-                abort = True
-
-        if abort:
+        if not self.instruments_ready():
             logger.warning("Measurement aborted")
             return False
 
@@ -209,255 +237,47 @@ class MeasurementModel(QObject):
         self._meas_thread.start()
         return True
 
+    def instruments_ready(self) -> bool:
+        """Check if all instruments are initialized, the not initialized ones are logged"""
+        ready = True
+        for role, instr in (("gen", self.gen), ("sa", self.sa), ("osc", self.osc)):
+            if instr is None or not instr.is_initialized():
+                logger.warning(f"Instrument {role} not initialized")
+                ready = False
+        return ready
+
     def start_measurement_thread(self) -> None:
         """
-        General measurement process.
+        General measurement process (MeasurementEngine.run) with the settings of the model.
 
         This method must be called from another thread.
 
-        The measurement process consists of the following steps:
-        1. Setup the instruments according to the measurement settings
-        2. Set the frequency sweep
-        3. Set the power level sweep
-        4. Start the measurement
-        5. Wait for the measurement to finish
-        6. Stop the measurement
-        7. Save the measurement data
-
-        This method can be interrupted until the measurement is finished.
+        The events of the engine are emitted by data_changed (FREQUENCY, POINT)
+        and progress_status (PROGRESS, STOP, ERROR), the points are stored in meas_data.
+        The measurement can be interrupted by stop_measurement_process().
         """
         logger.info("Starting measurement")
         self.progress_status.emit({"START": True})
 
         self._meas_data = []
-        self._stop_requested = False
-
-        freq_min, freq_max, freq_points = self._settings["RF_FREQUENCIES"]
-        level_min, level_max, level_points = self._settings["RF_LEVELS"]
-
-        frequencies = np.linspace(freq_min, freq_max, freq_points)
-        levels = np.linspace(level_min, level_max, level_points)
-
-        devices = self.gen, self.sa, self.osc, self._settings
-        DevicesSetup.setup(*devices)
-        self.measurement_loop(frequencies, levels)
+        self.engine = MeasurementEngine(self.gen, self.sa, self.osc, self._settings)
+        for event in self.engine.run(MeasurementPlan.from_settings(self._settings)):
+            if "POINT" in event:
+                self._meas_data.append(event["POINT"])
+            if "FREQUENCY" in event or "POINT" in event:
+                self.data_changed.emit(event)
+            else:
+                self.progress_status.emit(event)
         self.data_changed.emit({"DATA": self._meas_data})
 
-    def measurement_loop(self, frequencies: list, levels: list) -> None:
-        """
-        Main measurement loop.
-
-        This method  will loop over all frequencies and power levels and start the measurement for each combination.
-
-        The method can be break out of the loop and stop the measurement.
-
-        :param frequencies: List of frequencies
-        :param levels: List of power levels
-        """
-        try:
-            meas_points = len(frequencies) * len(levels)
-            iter_obj = iter(range(0, meas_points))
-
-            self.gen_on()
-
-            # Main measurement loop
-            for frequency in frequencies:
-                if self.is_stop():
-                    break
-                self.data_changed.emit({"FREQUENCY": frequency})
-
-                self.set_sa_wide_band()
-                self.gen.set_frequency(frequency)
-                self.sa_set_center_freq(frequency)
-                self.gen_set_max_level(levels)
-                self.sa_start_measurement()
-
-                if self._settings["PRECISE"]:
-                    if self.is_stop():
-                        break
-                    self.sa_set_precise_mode()
-                    self.sa_start_measurement()
-
-                for level in reversed(levels):
-                    if self.is_stop():
-                        break
-                    logger.debug(
-                        f"Frequency: {frequency/1e6:.2f} MHz; Level: {level:.2f} dBm"
-                    )
-                    self.emit_progress(iter_obj, meas_points)
-
-                    self.gen.set_level(level)
-
-                    sa_data, osc_data = self.single_measurement()
-                    mean_osc_value = self.osc_voltage_refinement(osc_data)
-                    max_sa_value = self.sa_level_checking(sa_data)
-
-                    if max_sa_value:
-                        point = [frequency, level, max_sa_value, mean_osc_value]
-                        self._meas_data.append(point)
-                        self.data_changed.emit({"POINT": point})
-                    else:
-                        logger.warning(
-                            f"Measured signal at ({frequency} Hz, {level} dBm) is less than limit ({self.SA_TOLERANCE} dBm)"
-                        )
-        except Exception as e:
-            logger.error(f"Measurement loop error: {e}")
-            self.progress_status.emit({"ERROR": True})
-        finally:
-            self.gen_off()
-            self.emit_progress(100)
-
-    @dispatch(int)
-    def emit_progress(self, value)  -> None: # TODO: add doc
-        self.progress_status.emit({"PROGRESS": value})
-
-    @dispatch(object, int)
-    def emit_progress(self, iter_obj, max_len) -> None: # TODO: add doc
-        try:
-            value = int((next(iter_obj) / max_len) * 100)
-            self.progress_status.emit({"PROGRESS": value})
-        except StopIteration:
-            self.progress_status.emit({"PROGRESS": 100})
-
     def stop_measurement_process(self) -> None:
         """
         External interruption of the measurement process.
 
         This method is used to stop the measurement process from outside the measurement loop.
         """
-        self._stop_requested = True
-
-    def single_measurement(self) -> tuple:
-        """
-        This method is used to perform a single measurement.
-
-        :return: Spectrum Analyzer data and Oscilloscope data
-        """
-        # Start measurement
-        self.osc.ready_for_acquisition()
-        time.sleep(0.2)
-
-        self.sa_start_measurement()
-        self.osc.trigger_force()
-
-        while self.osc.is_acquiring():
-            if self.is_stop():
-                break  # Waiting for finish measurement
-            time.sleep(0.1)
-
-        spectrum_data = self.sa.get_trace_data()
-        _, osc_data = self.osc.get_waveform_data()
-        return spectrum_data, osc_data
-
-    def osc_voltage_refinement(self, osc_data: list) -> float:
-        """
-        Method for refining the Oscilloscope voltage range (Y-scale)
-        to ensure the measured voltage is within the optimal range of the Oscilloscope.
-
-        :param osc_data: The measured Oscilloscope data
-        :return: The refined mean Oscilloscope voltage
-        """
-        mean_osc_value = np.mean(osc_data)
-
-        while self.check_osc_range(mean_osc_value):
-            if self.is_stop():
-                break
-
-            self.osc.ready_for_acquisition()
-            time.sleep(0.2)
-            self.osc.trigger_force()  # Start measurement
-
-            while self.osc.is_acquiring():  # Waiting for finish measurement
-                if self.is_stop():
-                    break
-                time.sleep(0.1)
-
-            _, osc_data = self.osc.get_waveform_data()
-            mean_osc_value = np.mean(osc_data)
-
-        return mean_osc_value
-
-    def sa_level_checking(self, spectrum_data: list) -> float:
-        """
-        Method for checking the level of the measured Spectrum Analyzer data.
-
-        If the maximum measured value is greater than the mean value plus the tolerance,
-        the maximum value is returned. Otherwise, 0 is returned.
-
-        :param spectrum_data: The measured Spectrum Analyzer data
-        :return: The maximum measured value or 0 if within tolerance
-        """
-        max_value = max(spectrum_data)
-        mean_value = np.mean(spectrum_data)
-        limit = mean_value + self.SA_TOLERANCE  # +6 dBm
-
-        if max_value > limit:
-            return max_value
-        else:
-            return 0
-
-    def gen_on(self) -> None:
-        """
-        Turns the generator output power on.
-
-        This method is used to turn the generator on before starting a measurement.
-        """
-        self.gen.rf_on()
-        time.sleep(0.1)
-
-    def gen_off(self) -> None:
-        """
-        Turns the generator output power off.
-
-        This method is used to turn the generator off after a measurement is finished.
-        """
-        self.gen.rf_off()
-        self.gen.set_min_level()
-
-    def gen_set_max_level(self, levels: list) -> None:
-        """
-        Sets the output level of the generator to the maximum value in the given list.
-
-        :param levels: A list of output levels in dBm
-        """
-        self.gen.set_level(max(levels))
-        time.sleep(0.1)  # wait for frequency to be set
-
-    def sa_set_center_freq(self, frequency: float) -> None:
-        """
-        Sets the center frequency of the Spectrum Analyzer to the given value.
-
-        :param frequency: The center frequency in Hz
-        """
-        self.sa.set_center_freq(frequency)
-        time.sleep(0.1)  # wait for frequency to be set
-
-    def sa_start_measurement(self) -> None:
-        """
-        Starts a single measurement on the Spectrum Analyzer.
-
-        If the measurement process is stopped externally, this method will do nothing.
-        """
-        if self.is_stop():
-            return
-        self.sa.start_single_measurement()
-        self.sa.delay_after_start()
-
-    def sa_set_precise_mode(self) -> None:
-        """
-        Sets the Spectrum Analyzer to precise mode.
-
-        In precise mode, the Spectrum Analyzer is set to the peak frequency of the previous measurement.
-        The narrow band settings are used in this mode.
-
-        If the measurement process is stopped externally, this method will do nothing.
-        """
-        if self.is_stop():
-            return
-        self.sa.find_peak_max()
-        self.sa.set_center_freq(self.sa.get_peak_freq())
-        self.set_sa_narrow_band()
-        time.sleep(0.1)  # wait for frequency to be set
+        if self.engine is not None:
+            self.engine.stop()
 
     def recalc_data(self) -> list:
         """
@@ -468,24 +288,29 @@ class MeasurementModel(QObject):
         contains the frequency (Hz), the output power level (dBm), the level (dBm) measured by the Spectrum Analyzer,
         and the voltage measured by the oscilloscope.
 
+        In the multi-channel mode every detector has its voltage, S21 (detector_s21) and
+        detector level columns (Calibration.results.result_columns).
+
         :return: A list of tuples containing the recalculated data
         :rtype: list
         """
+        channels = self.detector_channels()
         recalc_data = []
         for point in self._meas_data:
-            frequency, level, sa_level, osc_voltage = point
+            frequency, level, sa_level = point[:3]
+            osc_voltages = point[3:3 + len(channels)]
             s21_gen_sa = get_s21(frequency, self._s21_gen_sa)
-            s21_gen_det = get_s21(frequency, self._s21_gen_det)
-            det_level = (sa_level + s21_gen_sa) - s21_gen_det
+            s21_gen_det = [get_s21(frequency, self.detector_s21(channel)) for channel in channels]
+            det_levels = [(sa_level + s21_gen_sa) - s21 for s21 in s21_gen_det]
 
             recalc_point = [
                 frequency,
                 level,
                 sa_level,
-                osc_voltage,
+                *osc_voltages,
                 s21_gen_sa,
-                s21_gen_det,
-                det_level,
+                *s21_gen_det,
+                *det_levels,
             ]
             recalc_data.append(recalc_point)
 
@@ -510,69 +335,13 @@ class MeasurementModel(QObject):
         return max(levels)
     
     def is_spar(self) -> bool:
-        if self._s21_gen_sa is None or self._s21_gen_det is None:
+        if self._s21_gen_sa is None or any(self.detector_s21(channel) is None for channel in self.detector_channels()):
             return False
         else:
             return True
             
 
 
-    def set_sa_wide_band(self) -> None:
-        """
-        Sets the Spectrum Analyzer to wide band mode.
-
-        The span, resolution bandwidth (RBW), and video bandwidth (VBW) are set to the values
-        specified in the measurement settings.
-
-        :return: None
-        """
-        self.sa.set_span(self._settings["SPAN_WIDE"])
-        self.sa.set_rbw(self._settings["RBW_WIDE"])
-        self.sa.set_vbw(self._settings["VBW_WIDE"])
-
-    def set_sa_narrow_band(self) -> None:
-        """
-        Sets the Spectrum Analyzer to narrow band mode.
-
-        The span, resolution bandwidth (RBW), and video bandwidth (VBW) are set to the values
-        specified in the measurement settings.
-
-        :return: None
-        """
-        self.sa.set_span(self._settings["SPAN_NARROW"])
-        self.sa.set_rbw(self._settings["RBW_NARROW"])
-        self.sa.set_vbw(self._settings["VBW_NARROW"])
-
-    def check_osc_range(self, value: float) -> bool:
-        """
-        Check if oscilloscope vertical scale needs adjustment based on measured value.
-        Returns True if scale was changed, False otherwise.
-        """
-        current_scale = self.osc.get_vertical_scale()
-        vertical_map = self.osc.vertical_map
-        current_idx = vertical_map.index(current_scale)
-
-        if value > 3 * current_scale:
-            # Move to next higher scale if available
-            if current_idx < len(vertical_map) - 1:  # Not already at the highest scale
-                new_scale = vertical_map[current_idx + 1]
-                self.osc.set_vertical_scale(new_scale)
-                logger.debug(
-                    f"Scale increased: {current_scale} -> {new_scale} (value: {value:.3f}V)"
-                )
-                return True
-        elif value < 1 * current_scale:
-            # Move to next lower scale if available
-            if current_idx > 0:
-                new_scale = vertical_map[current_idx - 1]
-                self.osc.set_vertical_scale(new_scale)
-                logger.debug(
-                    f"Scale decreased: {current_scale} -> {new_scale} (value: {value:.3f}V)"
-                )
-                return True
-
-        return False
-
     def meas_finish_handler(self):
         """
         Handles the finish of a measurement.
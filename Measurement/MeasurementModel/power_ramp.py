@@ -0,0 +1,108 @@
+import time
+import numpy as np
+
+from Measurement.MeasurementModel.abstract_capture import LevelCapture
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PowerRamp(LevelCapture):
+    """
+    A class to capture the whole detector curve of one frequency in a single scope record.
+
+    The generator steps through the level list by its own list sweep (AUTO point trigger,
+    fixed dwell time) while the oscilloscope acquires one long record. The record is
+    triggered by the rising edge of the first (maximum) level and segmented against the
+    known step timing.
+    """
+
+    PRE_TRIGGER = 5  # Horizontal position of the trigger, % of the record
+    RECORD_MARGIN = 1.2  # Record length relative to the ramp duration
+    SETTLE_FRACTION = 0.3  # Part of each step skipped for the detector settling
+    GUARD_FRACTION = 0.05  # Part of each step skipped before the next step
+
+    def capture(self, frequency: float, levels: np.ndarray, max_voltage: float) -> np.ndarray | None:
+        """
+        Capture the ramp record and reduce it to the mean voltage of every step.
+        """
+        gen, osc = self.model.gen, self.model.osc
+        dwell = float(self.settings.get("RAMP_DWELL", 0.02))
+
+        gen.set_min_level()
+        self.setup_record(len(levels) * dwell, trigger_level=max_voltage / 2)
+        try:
+            gen.setup_list_sweep(
+                np.full(len(levels), frequency), levels, trigger="AUTO", dwell=dwell
+            )
+            osc.ready_for_acquisition()
+            time.sleep(0.2)
+            gen.start_list_sweep()
+
+            if not self.wait_acquisition(len(levels) * dwell):
+                logger.warning(f"Power ramp at {frequency} Hz was not captured")
+                return None
+
+            time_data, osc_data = osc.get_waveform_data()
+            return self.segment_record(time_data, osc_data, len(levels), dwell)
+        except ValueError as e:
+            logger.warning(f"Power ramp at {frequency} Hz failed: {e}")
+            return None
+        finally:
+            gen.stop_list_sweep()
+            self.restore_record()
+
+    @staticmethod
+    def segment_record(
+        time_data: np.ndarray, voltage_data: np.ndarray, steps: int, dwell: float
+    ) -> np.ndarray:
+        """
+        Reduce the ramp record to the mean voltage of every step.
+
+        The first step starts at the trigger (t = 0). The settling part at the
+        beginning and a guard interval at the end of each step are excluded.
+
+        Parameters:
+            time_data (np.ndarray): Time of the record samples in s
+            voltage_data (np.ndarray): Voltage of the record samples in V
+            steps (int): Number of generator steps
+            dwell (float): Dwell time of every step in s
+
+        Returns:
+            np.ndarray: Mean voltage of every step
+
+        Raises:
+            ValueError: If the record does not cover all steps.
+        """
+        step_start = np.arange(steps) * dwell
+        start = np.searchsorted(time_data, step_start + PowerRamp.SETTLE_FRACTION * dwell)
+        stop = np.searchsorted(time_data, step_start + (1 - PowerRamp.GUARD_FRACTION) * dwell)
+        if np.any(stop <= start) or time_data[-1] < step_start[-1] + dwell / 2:
+            raise ValueError("record does not cover the ramp")
+
+        cumulative = np.concatenate(([0.0], np.cumsum(voltage_data, dtype=float)))
+        return (cumulative[stop] - cumulative[start]) / (stop - start)
+
+    def setup_record(self, duration: float, trigger_level: float) -> None:
+        """
+        Set the horizontal scale and the edge trigger for the ramp record.
+
+        Parameters:
+            duration (float): Duration of the ramp in s
+            trigger_level (float): Edge trigger level in V
+        """
+        osc = self.model.osc
+        record = duration * self.RECORD_MARGIN / (1 - self.PRE_TRIGGER / 100)
+        osc.set_horizontal_scale(record / 10)  # 10 divisions
+        osc.set_horizontal_position(self.PRE_TRIGGER)
+        osc.set_trigger_source(f"CH{self.settings['CHANNEL']}")
+        osc.set_trigger_slope("RISe")
+        osc.set_trigger_level(trigger_level)
+
+    def restore_record(self) -> None:
+        """Restore the horizontal and trigger settings of the point measurement."""
+        osc = self.model.osc
+        osc.set_horizontal_scale(self.settings["HOR_SCALE"])
+        osc.set_horizontal_position(0)
+        osc.set_trigger_level(0)
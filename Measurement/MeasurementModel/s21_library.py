@@ -0,0 +1,237 @@
+import datetime
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from Instruments.touchstone import is_touchstone, s21_parser
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class S21Cache:
+    """
+    LRU memory cache of the parsed S21 files
+
+    The entries are keyed by the path, modification time and size of the
+    file, so a changed file is parsed again. The least recently used entries
+    are dropped when the arrays exceed max_bytes. Thread safe: the files are
+    loaded by the GUI thread and by SettingsLoader.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key: (s21, nbytes)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def file_key(path: str) -> tuple[str, int, int]:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def load(self, path: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        S21 of the file as (frequency, magnitude_db) arrays, parsed on the first use
+
+        Raises:
+            FileNotFoundError: If the S21 file is not found.
+        """
+        key = self.file_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        data = s21_parser(path).parse_file()
+        s21 = (np.asarray(data["FREQUENCY"], dtype=float), np.asarray(data["MAGNITUDE_DB"], dtype=float))
+        nbytes = s21[0].nbytes + s21[1].nbytes
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (s21, nbytes)
+                self.nbytes += nbytes
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self.nbytes -= dropped
+        return s21
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class S21Library:
+    """
+    Index of the S21 files of a folder
+
+    The file names are <line>[__<setup>[__<note>]].trs (or .s2p): the line is
+    the measured path (e.g. s21_gen_sa), the setup names the cables and
+    adapters of the line (no setup: ""). The index stores the frequency range
+    and the measurement date (file modification time) of every file in
+    s21_index.json, only new or changed files are parsed on refresh().
+
+    select() returns the S21 of a line for a frequency grid: the newest file
+    covering the whole grid, otherwise the files are stitched, every frequency
+    taken from the newest file covering it.
+    """
+
+    index_file = "s21_index.json"
+    setup_separator = "__"
+
+    def __init__(self, folder: str, cache: S21Cache) -> None:
+        self.folder = folder
+        self.cache = cache
+        self.index = {}  # filename: entry
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_s21_file(filename: str) -> bool:
+        return filename.lower().endswith(".trs") or is_touchstone(filename)
+
+    @classmethod
+    def split_name(cls, filename: str) -> tuple[str, str]:
+        """Line and setup of the file name"""
+        parts = os.path.splitext(os.path.basename(filename))[0].split(cls.setup_separator)
+        return parts[0], parts[1] if len(parts) > 1 else ""
+
+    def refresh(self) -> dict:
+        """
+        Update the index with the S21 files of the folder
+
+        Returns:
+            dict: The index, filename: {"LINE", "SETUP", "DATE", "START", "STOP", "POINTS", "MTIME", "SIZE"}
+        """
+        with self._lock:
+            if not self.index:
+                self.index = self._read_index()
+            try:
+                filenames = sorted(name for name in os.listdir(self.folder) if self.is_s21_file(name))
+            except FileNotFoundError:
+                filenames = []
+
+            index, changed = {}, len(filenames) != len(self.index)
+            for filename in filenames:
+                path = os.path.join(self.folder, filename)
+                stat = os.stat(path)
+                entry = self.index.get(filename)
+                if entry is None or entry["MTIME"] != stat.st_mtime_ns or entry["SIZE"] != stat.st_size:
+                    try:
+                        entry = self._index_file(filename, path, stat)
+                    except Exception as e:
+                        logger.warning(f"S21 library: {filename} is not indexed: {e}")
+                        continue
+                    changed = True
+                index[filename] = entry
+            self.index = index
+            if changed:
+                self._write_index()
+            return dict(self.index)
+
+    def _index_file(self, filename: str, path: str, stat: os.stat_result) -> dict:
+        frequency, _ = self.cache.load(path)
+        line, setup = self.split_name(filename)
+        return {
+            "LINE": line,
+            "SETUP": setup,
+            "DATE": datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+            "START": float(frequency.min()),
+            "STOP": float(frequency.max()),
+            "POINTS": int(frequency.size),
+            "MTIME": stat.st_mtime_ns,
+            "SIZE": stat.st_size,
+        }
+
+    def _read_index(self) -> dict:
+        path = os.path.join(self.folder, self.index_file)
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"S21 library: index {path} is not used: {e}")
+            return {}
+
+    def _write_index(self) -> None:
+        path = os.path.join(self.folder, self.index_file)
+        try:
+            with open(path, "w") as f:
+                json.dump(self.index, f, indent=4)
+        except OSError as e:
+            logger.debug(f"S21 library: index {path} is not saved: {e}")
+
+    def entries(self, line: str, setup: str = "") -> list[tuple[str, dict]]:
+        """Indexed files of the line and setup, the newest first"""
+        entries = [
+            (filename, entry) for filename, entry in self.refresh().items()
+            if entry["LINE"] == line and entry["SETUP"] == setup
+        ]
+        return sorted(entries, key=lambda item: item[1]["DATE"], reverse=True)
+
+    def select(self, line: str, frequencies, setup: str = "") -> dict:
+        """
+        S21 of the line for the frequency grid
+
+        Parameters:
+            line (str): The line, e.g. s21_gen_sa
+            frequencies (array_like): The requested frequencies (Hz)
+            setup (str): The setup of the line ("" - the files without setup)
+
+        Returns:
+            dict: {"FREQUENCY", "MAGNITUDE_DB", "FILES": used file names, "COVERED": all frequencies covered}
+
+        Raises:
+            FileNotFoundError: If the library has no file of the line and setup.
+        """
+        entries = self.entries(line, setup)
+        if not entries:
+            raise FileNotFoundError(f"No S21 files of {line} (setup '{setup}') in {self.folder}")
+        frequencies = np.unique(np.asarray(frequencies, dtype=float))
+        f_min, f_max = frequencies[0], frequencies[-1]
+
+        for filename, entry in entries:
+            if entry["START"] <= f_min and entry["STOP"] >= f_max:
+                frequency, magnitude = self.cache.load(os.path.join(self.folder, filename))
+                return {"FREQUENCY": frequency, "MAGNITUDE_DB": magnitude, "FILES": [filename], "COVERED": True}
+
+        return self._stitch(entries, frequencies)
+
+    def _stitch(self, entries: list, frequencies: np.ndarray) -> dict:
+        starts = np.array([entry["START"] for _, entry in entries])
+        stops = np.array([entry["STOP"] for _, entry in entries])
+        inside = (frequencies[:, None] >= starts) & (frequencies[:, None] <= stops)
+        covered = inside.any(axis=1)
+        # the newest covering file, the nearest file for the uncovered frequencies
+        distance = np.maximum(starts - frequencies[:, None], frequencies[:, None] - stops)
+        owner = np.where(covered, inside.argmax(axis=1), distance.argmin(axis=1))
+        if not covered.all():
+            logger.warning(
+                f"S21 library: {np.count_nonzero(~covered)} frequencies of "
+                f"{entries[0][1]['LINE']} are not covered, the nearest files are extrapolated"
+            )
+
+        bounds = np.flatnonzero(np.diff(owner)) + 1
+        segment_frequency, segment_magnitude, files = [], [], []
+        for run in np.split(np.arange(len(frequencies)), bounds):
+            filename = entries[owner[run[0]]][0]
+            frequency, magnitude = self.cache.load(os.path.join(self.folder, filename))
+            low, high = frequencies[run[0]], frequencies[run[-1]]
+            inner = (frequency > low) & (frequency < high)
+            segment_frequency.append(np.concatenate(([low], frequency[inner], [high])))
+            segment_magnitude.append(np.concatenate(
+                ([np.interp(low, frequency, magnitude)], magnitude[inner], [np.interp(high, frequency, magnitude)])
+            ))
+            if filename not in files:
+                files.append(filename)
+
+        frequency, unique = np.unique(np.concatenate(segment_frequency), return_index=True)
+        magnitude = np.concatenate(segment_magnitude)[unique]
+        return {"FREQUENCY": frequency, "MAGNITUDE_DB": magnitude, "FILES": files, "COVERED": bool(covered.all())}
@@ -0,0 +1,41 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from System.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SettingsLoader(QThread):
+    """
+    Class for loading the settings and the S21 files in the background
+
+    The files are only read and parsed by the thread, the results are stored
+    in the MeasurementModel by the receiver of the finished signal (GUI thread).
+    """
+
+    # emits {"S21_GEN_SA": (files, s21), "S21_GEN_DET": (files, s21), "SETTINGS": dict, "ERRORS": list}
+    # and "S21_GEN_DET_CH<n>": (files, s21) of the detector channels in the multi-channel mode
+    finished = pyqtSignal(dict)
+
+    def __init__(self, file_manager: object) -> None:
+        super().__init__()
+        self.file_manager = file_manager
+
+    def run(self) -> None:
+        result = {"ERRORS": []}
+        try:
+            result["SETTINGS"], _ = self.file_manager.read_settings()
+        except Exception as e:
+            result["ERRORS"].append(str(e))
+
+        if result.get("SETTINGS"):  # the S21 library files for the frequencies of the settings
+            result.update(self.file_manager.select_s21_files(result["SETTINGS"]))
+        for key, filename in self.file_manager.s21_files.items():
+            if key in result:
+                continue
+            try:
+                result[key] = (filename, self.file_manager.parse_s21_file(filename))
+            except Exception as e:
+                logger.warning(f"Failed to load S21 file: {e}")
+                result["ERRORS"].append(f"{filename}: {e}")
+        self.finished.emit(result)
@@ -1,6 +1,27 @@
+import atexit
+import json
 import logging
-import colorlog
 import os
+import queue
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+import colorlog
+
+
+settings_folder = "Settings"
+settings_file = "log_settings.json"
+
+# LEVEL - level of the subsystems (top-level packages), LEVELS - levels of the
+# subsystems or modules by logger name, SCPI_HISTORY - size of the SCPI traffic ring buffer
+default_settings = {
+    "LEVEL": "DEBUG",
+    "LEVELS": {"Instruments.scpi": "WARNING"},
+    "SCPI_HISTORY": 200,
+}
+
 
 def setup_logging():
     formatter = colorlog.ColoredFormatter(
@@ -21,18 +42,126 @@ def setup_logging():
     # Create handler
     handler = logging.StreamHandler()
     handler.setFormatter(formatter)
-    
+
     return handler
 
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler passing the records unformatted
+
+    The message (msg % args) is formatted by the listener thread, so a log call
+    in the instrument or measurement threads only enqueues the record.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class ScpiHistory:
+    """
+    Ring buffer of the recent SCPI traffic
+
+    The commands are stored as tuples without formatting and written to the
+    log only by dump(), e.g. on a communication error.
+    """
+
+    def __init__(self, size=200):
+        self._records = deque(maxlen=size)
+
+    def resize(self, size):
+        self._records = deque(self._records, maxlen=size)
+
+    def record(self, instrument, kind, command, response):
+        self._records.append((time.time(), instrument, kind, command, response))
+
+    def clear(self):
+        self._records.clear()
+
+    def lines(self):
+        lines = []
+        for timestamp, instrument, kind, command, response in list(self._records):
+            clock = time.strftime('%H:%M:%S', time.localtime(timestamp))
+            lines.append(f"{clock}.{int(timestamp % 1 * 1000):03d} {instrument} {kind} {command} -> {response}")
+        return lines
+
+    def dump(self, logger, reason=""):
+        """Write the buffered traffic to the logger as one ERROR record"""
+        lines = self.lines()
+        logger.error("Last %d SCPI commands%s:\n%s", len(lines), f" ({reason})" if reason else "", "\n".join(lines))
+
+
+scpi_history = ScpiHistory()  # process-wide SCPI traffic
+
+_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+_default_level = logging.DEBUG
+_subsystems = set()
+
+
+def load_log_settings():
+    path = os.path.join(settings_folder, settings_file)
+    settings = dict(default_settings)
+    try:
+        with open(path, "r") as f:
+            settings.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Failed to load log settings from {path}: {e}")
+    return settings
+
+
+def _start_logging():
+    global _queue_handler, _listener, _default_level
+
+    settings = load_log_settings()
+    _default_level = logging.getLevelName(settings["LEVEL"])
+    for name, level in settings["LEVELS"].items():
+        logging.getLogger(name).setLevel(level)
+    scpi_history.resize(int(settings["SCPI_HISTORY"]))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, setup_logging(), respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write the queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def set_level(name, level):
+    """Level of a subsystem (e.g. Instruments) or of a module logger"""
+    logging.getLogger(name).setLevel(level)
+
+
 def get_logger(name):
-    """Factory function to get a configured logger"""
-    handler = setup_logging()
-    logger = colorlog.getLogger(name)
-    
-    # Only add handler if it doesn't have one already
-    if not logger.handlers:
-        logger.addHandler(handler)
-        logger.setLevel(logging.DEBUG)
-        logger.propagate = False  # Prevent duplicate logs from parent loggers
-    
-    return logger
\ No newline at end of file
+    """
+    Factory function to get a configured logger
+
+    The records of all loggers go through one queue to the console handler
+    of the listener thread. The handler is attached to the subsystem logger
+    (top-level package, e.g. Instruments), the module loggers propagate to it,
+    so the levels can be set per subsystem or per module.
+    """
+    with _lock:
+        if _queue_handler is None:
+            _start_logging()
+        subsystem = name.split('.')[0]
+        if subsystem not in _subsystems:
+            subsystem_logger = logging.getLogger(subsystem)
+            subsystem_logger.addHandler(_queue_handler)
+            subsystem_logger.propagate = False  # Prevent duplicate logs from parent loggers
+            if subsystem_logger.level == logging.NOTSET:
+                subsystem_logger.setLevel(_default_level)
+            _subsystems.add(subsystem)
+
+    return logging.getLogger(name)
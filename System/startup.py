@@ -0,0 +1,51 @@
+import importlib
+import threading
+import time
+
+from System.logger import get_logger
+logger = get_logger(__name__)
+
+
+# Modules loaded on first use, imported in the background after the window is created
+WARM_UP_MODULES = (
+    "matplotlib.figure",
+    "matplotlib.backends.backend_qtagg",
+    "pyvisa",
+    "Instruments.visacom",
+    "Documentations.protocol_creator",
+)
+
+_t0 = time.perf_counter()  # the application startup (first import of this module)
+_marks = []
+
+
+def mark(name):
+    """Record a startup milestone (time since the application startup)"""
+    _marks.append((name, time.perf_counter() - _t0))
+
+
+def marks():
+    return list(_marks)
+
+
+def format_marks():
+    return "\n".join(f"{elapsed * 1e3:8.1f} ms  {name}" for name, elapsed in _marks)
+
+
+def warm_up(modules=WARM_UP_MODULES):
+    """
+    Import the modules in a background thread, so their first use does not wait for the import
+
+    Returns: the warm-up thread
+    """
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                logger.warning(f"Warm-up import of {module} failed: {e}")
+        mark("warm-up finished")
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
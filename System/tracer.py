@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+import numpy as np
+
+
+class Tracer:
+    """
+    Timing trace of the SCPI traffic and of the measurement steps.
+
+    Every write, query and binary transfer is recorded with the instrument,
+    the command, the byte count and the duration. Spans (measurement steps)
+    group the commands sent inside them. The trace is exported in the Chrome
+    trace event format (chrome://tracing, ui.perfetto.dev) with a per-command
+    latency summary.
+    """
+
+    histogram_bins = np.array([0, 1e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 0.1, 0.2, 0.5, 1, 2, 5, np.inf])
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._events = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._threads = {}
+
+    def enable(self) -> None:
+        """Start a new trace"""
+        with self._lock:
+            self._events = []
+            self._threads = {}
+            self._t0 = time.perf_counter()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def _thread_id(self) -> int:
+        ident = threading.get_ident()
+        if ident not in self._threads:
+            self._threads[ident] = (len(self._threads) + 1, threading.current_thread().name)
+        return self._threads[ident][0]
+
+    def command(self, instrument: str, kind: str, command: str, size: int, start: float, duration: float) -> None:
+        """
+        Record one instrument command.
+
+        Parameters:
+            instrument (str): Instrument name
+            kind (str): WRITE, QUERY, BINARY or READ
+            command (str): The SCPI command
+            size (int): Number of bytes written or received
+            start (float): time.perf_counter() at the start of the command
+            duration (float): Duration of the command in s
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._events.append(
+                {
+                    "name": command,
+                    "cat": f"scpi,{kind.lower()}",
+                    "ph": "X",
+                    "ts": (start - self._t0) * 1e6,
+                    "dur": duration * 1e6,
+                    "tid": self._thread_id(),
+                    "args": {"instrument": instrument, "kind": kind, "bytes": size},
+                }
+            )
+
+    @contextmanager
+    def _span(self, name: str, args: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self._events.append(
+                    {
+                        "name": name,
+                        "cat": "step",
+                        "ph": "X",
+                        "ts": (start - self._t0) * 1e6,
+                        "dur": (end - start) * 1e6,
+                        "tid": self._thread_id(),
+                        "args": args,
+                    }
+                )
+
+    def span(self, name: str, **args) -> object:
+        """Context manager of a measurement step, no-op if the tracer is disabled"""
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, {key: self._json_value(value) for key, value in args.items()})
+
+    @staticmethod
+    def _json_value(value: object) -> object:
+        return value.item() if isinstance(value, np.generic) else value
+
+    def events(self) -> list:
+        with self._lock:
+            return list(self._events)
+
+    def summary(self) -> dict:
+        """
+        Latency summary of every instrument command header.
+
+        Returns:
+            dict: {"<instrument> <header>": {count, total, mean, p50, p90, p99, max, histogram}},
+            durations in s, histogram counts per histogram_bins interval
+        """
+        durations = defaultdict(list)
+        for event in self.events():
+            if event["cat"].startswith("scpi"):
+                header = event["name"].split(" ")[0]
+                durations[f"{event['args']['instrument']} {header}"].append(event["dur"] / 1e6)
+
+        summary = {}
+        for key, values in sorted(durations.items()):
+            values = np.array(values)
+            summary[key] = {
+                "count": len(values),
+                "total": float(values.sum()),
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p90": float(np.percentile(values, 90)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(values.max()),
+                "histogram": np.histogram(values, self.histogram_bins)[0].tolist(),
+            }
+        return summary
+
+    def format_summary(self, limit: int = 20) -> str:
+        """Text table of the commands with the largest total time"""
+        summary = sorted(self.summary().items(), key=lambda item: item[1]["total"], reverse=True)
+        lines = [f"{'command':<48}{'count':>7}{'total,s':>10}{'mean,ms':>10}{'p90,ms':>10}{'max,ms':>10}"]
+        for key, stats in summary[:limit]:
+            lines.append(
+                f"{key[:47]:<48}{stats['count']:>7}{stats['total']:>10.3f}"
+                f"{stats['mean'] * 1e3:>10.2f}{stats['p90'] * 1e3:>10.2f}{stats['max'] * 1e3:>10.2f}"
+            )
+        return "\n".join(lines)
+
+    def export_chrome(self, path: str) -> str:
+        """
+        Save the trace in the Chrome trace event JSON format.
+
+        Returns:
+            str: The path of the saved file
+        """
+        pid = os.getpid()
+        events = [dict(event, pid=pid) for event in self.events()]
+        for ident, (tid, name) in list(self._threads.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {
+                        "latency_summary": self.summary(),
+                        "histogram_bins": [str(edge) for edge in self.histogram_bins],
+                    },
+                },
+                f,
+            )
+        return path
+
+
+tracer = Tracer()  # process-wide tracer
+
+
+def get_tracer() -> Tracer:
+    return tracer
+
+
+def traced(name: str) -> object:
+    """Decorator recording every call of the function as a span of the process-wide tracer"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
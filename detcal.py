@@ -0,0 +1,223 @@
+"""
+Headless detector calibration runner, the measurement engine of the GUI without QApplication.
+
+Usage (from the project folder):
+    python detcal.py run --settings meas_settings.json --ips instr_ip.json --out results.csv
+    python detcal.py run --sim --out results.csv
+    python detcal.py run --sim --out results.h5
+    python detcal.py queue add --serial SN0001 --settings meas_settings.json --out Results/SN0001.csv
+    python detcal.py queue run
+    python detcal.py queue list
+
+The settings and IP files are looked up in the Settings folder too. The progress
+and the measured points are printed to stdout, one line per event.
+
+The results format is selected by the extension of --out: .csv, or the binary
+column formats with the settings, instrument IDNs, S21 file hashes and timing
+as metadata: .npz, .h5/.hdf5 (h5py) and .parquet (pyarrow).
+
+The queue (Jobs/job_queue.json) keeps the jobs between the runs: queue run
+measures the pending jobs back to back and records the timing of every job.
+
+Exit codes: 0 - finished, 1 - measurement (or a queued job) failed or stopped,
+2 - settings, instruments or output file errors.
+"""
+import argparse
+import signal
+import sys
+
+from Measurement.MeasurementModel.meas_model import MeasurementModel
+from Measurement.MeasurementModel.meas_engine import MeasurementEngine, MeasurementPlan
+from Measurement.MeasurementModel.job_queue import JobQueue, JobWorker
+from Measurement.Calibration.results import results_format
+
+from System.logger import get_logger
+logger = get_logger(__name__)
+
+EXIT_OK = 0
+EXIT_MEASUREMENT = 1
+EXIT_SETUP = 2
+
+
+class ConsoleReporter:
+    """Prints the events of the MeasurementEngine to stdout"""
+
+    def __init__(self, points: bool = True, stream=None) -> None:
+        self.points = points  # print every measured point
+        self.stream = stream or sys.stdout
+        self.failed = False
+        self.stopped = False
+        self._progress = None
+
+    def handle(self, message: dict) -> None:
+        if "FREQUENCY" in message:
+            self.write(f"FREQUENCY {message['FREQUENCY']:.6g} Hz")
+        if "POINT" in message and self.points:
+            frequency, level, sa_level, *voltages = message["POINT"]  # a voltage of every detector channel
+            volts = " ".join(f"{voltage:.6g} V" for voltage in voltages)
+            self.write(f"POINT {frequency:.6g} Hz {level:.3f} dBm SA {sa_level:.3f} dBm {volts}")
+        if "PROGRESS" in message and message["PROGRESS"] != self._progress:
+            self._progress = message["PROGRESS"]
+            self.write(f"PROGRESS {self._progress}%")
+        if message.get("ERROR"):
+            self.failed = True
+            self.write(f"ERROR {message['ERROR']}")
+        if message.get("STOP") and not self.stopped:
+            self.stopped = True
+            self.write("STOPPED")
+
+    def write(self, line: str) -> None:
+        print(line, file=self.stream, flush=True)
+
+
+def check_results_path(path: str) -> bool:
+    """Check the results format of the path, its optional package must be installed"""
+    try:
+        results_format(path)
+    except (ValueError, ImportError) as e:
+        logger.error(f"detcal: {e}")
+        return False
+    return True
+
+
+def connect_instruments(model: MeasurementModel, args: argparse.Namespace) -> bool:
+    """Create and connect the instruments of the model (--ips, --sim) in this thread"""
+    try:
+        if args.ips:
+            model.initializer.load_instr_ip_settings(args.ips)
+    except Exception as e:
+        logger.error(f"detcal: {e}")
+        return False
+
+    # the finished signal of the initializer is delivered directly, without the event loop
+    errors = []
+    model.initializer.finished.connect(lambda gen, sa, osc, error: error and errors.append(error))
+    model.offline_mode(args.sim)
+    model.initializer.run()
+    for instr in (model.gen, model.sa, model.osc):
+        if not errors and instr is not None:
+            instr.connect_blocking()  # the GUI connects in the instrument controllers
+    if errors or not model.instruments_ready():
+        logger.error(f"detcal: instruments not initialized {errors[0] if errors else ''}")
+        return False
+    return True
+
+
+def run(args: argparse.Namespace) -> int:
+    """Run one measurement with the settings and save the results"""
+    if not check_results_path(args.out):
+        return EXIT_SETUP
+
+    model = MeasurementModel()  # settings, S21 files, instruments and results
+    reporter = ConsoleReporter(points=not args.quiet)
+
+    try:
+        model.load_settings(args.settings)
+    except Exception as e:
+        logger.error(f"detcal: {e}")
+        return EXIT_SETUP
+    if not connect_instruments(model, args):
+        return EXIT_SETUP
+
+    engine = MeasurementEngine(model.gen, model.sa, model.osc)
+    model.engine = engine  # the timing of the results metadata
+    signal.signal(signal.SIGINT, lambda *_: engine.stop())
+    points = []
+    for event in engine.run(MeasurementPlan.from_settings(model.settings)):
+        reporter.handle(event)
+        if "POINT" in event:
+            points.append(event["POINT"])
+    if reporter.failed or reporter.stopped:
+        return EXIT_MEASUREMENT
+
+    model.meas_data = points
+
+    if model.settings.get("RECALC_ATTEN", False) and model.is_spar():
+        model.recalc_data()
+    try:
+        model.file_manager.write_results(args.out)
+    except (OSError, ImportError) as e:
+        logger.error(f"detcal: failed to save results to {args.out}: {e}")
+        return EXIT_SETUP
+    reporter.write(f"FINISHED {len(model.meas_data)} points, results {args.out}")
+    return EXIT_OK
+
+
+def queue(args: argparse.Namespace) -> int:
+    """Add, list, retry or run the jobs of the calibration job queue"""
+    jobs = JobQueue(args.queue)
+
+    if args.action == "add":
+        if not check_results_path(args.out):
+            return EXIT_SETUP
+        job = jobs.add(args.serial, args.settings, args.out, args.s21)
+        print(f"JOB {job['ID']} added: {job['SERIAL']}")
+        return EXIT_OK
+
+    if args.action == "retry":
+        print(f"{jobs.retry()} failed jobs pending again")
+        return EXIT_OK
+
+    if args.action == "list":
+        for job in jobs.jobs:
+            timing = job["TIMING"]
+            total = f"{timing['TOTAL']:.1f} s" if timing.get("TOTAL") is not None else "-"
+            print(f"{job['ID']:>4} {job['STATUS']:<8} {job['SERIAL']:<16} {job['SETTINGS']:<24} "
+                  f"{job['OUT']:<24} {total:>9}{'  ' + job['ERROR'] if job['ERROR'] else ''}")
+        return EXIT_OK
+
+    # run
+    if not jobs.pending() and not any(job["STATUS"] == "RUNNING" for job in jobs.jobs):
+        print("No pending jobs")
+        return EXIT_OK
+    model = MeasurementModel()
+    if not connect_instruments(model, args):
+        return EXIT_SETUP
+
+    reporter = ConsoleReporter(points=not args.quiet)
+    worker = JobWorker(jobs, model, lambda job, event: reporter.handle(event))
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    failed = worker.run()
+    for job in jobs.jobs:
+        if job["STARTED"] is None or job["STATUS"] == "PENDING":
+            continue
+        timing = ", ".join(f"{key} {value:.1f} s" for key, value in job["TIMING"].items() if value is not None)
+        reporter.write(f"JOB {job['ID']} {job['SERIAL']} {job['STATUS']}: {timing}"
+                       f"{' (setup reused)' if job['SETUP_REUSED'] else ''}")
+    return EXIT_MEASUREMENT if failed or jobs.pending() else EXIT_OK
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="detcal", description="Headless detector calibration")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a measurement and save the results")
+    run_parser.add_argument("--settings", help="settings file (default: Settings/meas_settings.json)")
+    run_parser.add_argument("--ips", help="instrument IP file (default: Settings/instr_ip.json)")
+    run_parser.add_argument("--out", required=True, help="results file (.csv, .npz, .h5, .parquet)")
+    run_parser.add_argument("--sim", action="store_true", help="simulated instruments")
+    run_parser.add_argument("--quiet", action="store_true", help="do not print the measured points")
+    run_parser.set_defaults(handler=run)
+
+    queue_parser = commands.add_parser("queue", help="calibration job queue")
+    queue_parser.add_argument("--queue", help=f"queue file (default: {JobQueue.default_path})")
+    actions = queue_parser.add_subparsers(dest="action", required=True)
+    add_parser = actions.add_parser("add", help="add a job")
+    add_parser.add_argument("--serial", required=True, help="detector serial number")
+    add_parser.add_argument("--settings", required=True, help="settings profile file")
+    add_parser.add_argument("--s21", help="S21 library setup (default: S21_SETUP of the settings)")
+    add_parser.add_argument("--out", required=True, help="results file (.csv, .npz, .h5, .parquet)")
+    actions.add_parser("list", help="list the jobs")
+    actions.add_parser("retry", help="queue the failed jobs again")
+    worker_parser = actions.add_parser("run", help="run the pending jobs")
+    worker_parser.add_argument("--ips", help="instrument IP file (default: Settings/instr_ip.json)")
+    worker_parser.add_argument("--sim", action="store_true", help="simulated instruments")
+    worker_parser.add_argument("--quiet", action="store_true", help="do not print the measured points")
+    queue_parser.set_defaults(handler=queue)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
-import os
 import sys
+from System import startup
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
 
 from main_controller import MainController
@@ -9,17 +10,22 @@ from System.logger import get_logger
 logger = get_logger(__name__)
 
 def main():
-    os.system('cls')
+    startup.mark("imports")
 
     app = QApplication(sys.argv)
     with open("GUI/CSS/styles.css","r") as file:
         app.setStyleSheet(file.read())
-    
-    controller = MainController()
-    
+
+    controller = MainController(offline='--sim' in sys.argv) # --sim: simulated instruments
+    startup.mark("window created")
+    startup.warm_up()
+
+    QTimer.singleShot(0, lambda: startup.mark("first window"))  # the first event loop iteration shows the window
+    if '--startup-report' in sys.argv: # print the startup milestones and exit
+        QTimer.singleShot(0, lambda: (print(startup.format_marks(), flush=True), app.quit()))
+
     sys.exit(app.exec())
 
 if __name__ == "__main__":
     main()
-  
 
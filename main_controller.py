@@ -6,11 +6,11 @@ from System.logger import get_logger
 logger = get_logger(__name__)
 
 class MainController:
-    def __init__(self):
+    def __init__(self, offline=False):
         self.model = MeasurementModel()
         self.view = MainWindow()
 
-        self.model.offline_mode(0)
+        self.model.offline_mode(offline)
         self.meas_controller = MeasurementController(self.model, self.view)
         self.view.show()
        
\ No newline at end of file